@@ -1,33 +1,70 @@
 
 import asyncio
 import aiohttp
-import aiofiles
 import os
 import json
 import time
-import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set, Tuple
 from datetime import datetime
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response
 from pydantic import BaseModel
 
 import pathlib
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler()
-    ]
+from broadcast_hub import BroadcastHub
+from cluster import (
+    CLUSTER_DISPATCH_BATCH, CLUSTER_SOCKET_ENV, CLUSTER_SOCKET_NAME, CLUSTER_WORKERS, ClusterCallError, ClusterClient,
+    cluster_socket, start_coordinator
+)
+from content_encoding import (
+    COMPRESSION_MODES, DEFAULT_COMPRESSION, StreamDecoder, accept_encoding, cache_variant, response_encoding
+)
+from concurrency import ADAPTIVE_CONCURRENCY, ADAPTIVE_HTTP1_CEILING, THROTTLE_STATUSES, ConcurrencyController, RequestSample
+from content_cache import CACHE_DIR_NAME, CACHE_HASH_ALGORITHM, CacheEntry, ContentCache, InflightTransfer
+from integrity import (
+    DEFAULT_HASH_ALGORITHM, HASH_ALGORITHMS, ChecksumMismatch, ChecksumSpec, StreamingDigest, digest_file, parse_checksum
+)
+from http_pool import POOL_LIMIT_PER_HOST, SessionPool
+from h2_transport import h2_available
+from transport import TRANSPORTS, TransportRouter
+from manifest import ManifestError, ManifestParser, detect_format, iter_lines, validate_file_item
+from scheduler import DownloadScheduler, RetryLater, ScheduledJob
+from file_server import (
+    FILE_TAIL_POLL_SECONDS, FILE_TAIL_STATUSES, FILE_TAIL_WAIT_SECONDS, ArtifactResponse, FileTail, TailResponse,
+    etag_matches, parse_range, segments_prefix, tail_file
+)
+from file_table import merge_summaries
+from file_writer import CHUNK_SIZE_MAX, CHUNK_SIZE_MIN, BufferedFileWriter, iter_adaptive_chunks
+from rate_limit import BandwidthLimiter
+from metrics import (
+    BYTES_DOWNLOADED, BYTES_STORED, DOWNLOADS_IN_FLIGHT, METRICS_CONTENT_TYPE, QUEUE_PENDING, REGISTRY, WS_CLIENTS,
+    LoopLagMonitor, observe_transfer
+)
+from report_engine import ReportEngine, write_atomic
+from resume_journal import ResumeJournal
+from retry_policy import BreakerRegistry, CircuitOpenError, RetryPolicy, TransientDownloadError, parse_retry_after
+from structured_logging import (
+    get_logger, levels as log_levels, set_level as set_log_level, setup_logging,
+    shutdown_logging
+)
+from stall_watchdog import STALL_ACTIONS, DownloadWatchdog, FileWatch, WatchdogPolicy
+from state_store import REPORT_PAGE_MAX, STATE_DB_NAME, STATE_HOT_SESSIONS, SQLiteStateStore, StateStore
+from segmented import (
+    MIN_SEGMENT_SIZE, SegmentError, download_segmented, plan_segments, probe_range_support
 )
 
-import sys
+setup_logging()
+logger = get_logger("manager")
+report_logger = get_logger("report")
 
 DOWNLOAD_DIR = pathlib.Path(__file__).parent / "downloads"
-CHECK_INTERVAL_SECONDS = 60
+CHECK_INTERVAL_SECONDS = 1
+SESSION_ACTIONS = ("pause", "resume", "cancel")
 
 URL_LIST = [
     {'id': 'dosya_1', 'url': 'https://jsonplaceholder.typicode.com/posts/1'},
@@ -38,7 +75,19 @@ URL_LIST = [
     {'id': 'dosya_6', 'url': 'https://httpbin.org/bytes/512'},
 ]
 
-app = FastAPI(title="URL Downloader API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # ayni surecte uygulama yeniden baslatilirsa onceki kapanista durdurulan log dinleyicisi yeniden kurulur
+    setup_logging()
+    await download_manager.start()
+    try:
+        yield
+    finally:
+        await download_manager.close()
+        # uvicorn worker surecleri atexit calistirmadan cikar, kuyruktaki kayitlar burada bosaltilir
+        shutdown_logging()
+
+app = FastAPI(title="URL Downloader API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -51,252 +100,892 @@ app.add_middleware(
 class FileItem(BaseModel):
     id: str
     url: str
+    priority: int = 0
+    segments: Optional[int] = None
+    min_segment_size: Optional[int] = None
+    checksum: Optional[str] = None
+    compression: Optional[str] = None
+
+class StallPolicy(BaseModel):
+    stall_timeout: float = 20.0
+    min_bytes_per_second: int = 0
+    grace_seconds: float = 15.0
+    action: str = "resume"
+    max_restarts: int = 2
 
 class DownloadRequest(BaseModel):
     files: Optional[List[FileItem]] = None
+    segments: int = 1
+    min_segment_size: int = MIN_SEGMENT_SIZE
+    hash_algorithm: str = DEFAULT_HASH_ALGORITHM
+    compression: str = DEFAULT_COMPRESSION
+    bandwidth_limit: Optional[int] = None
+    stall_policy: Optional[StallPolicy] = None
+
+class BandwidthConfig(BaseModel):
+    global_rate: Optional[int] = None
+    default_host_rate: Optional[int] = None
+    default_session_rate: Optional[int] = None
+
+class RateLimit(BaseModel):
+    rate: Optional[int] = None
+
+class TransportConfig(BaseModel):
+    default: Optional[str] = None
+
+class HostTransport(BaseModel):
+    transport: Optional[str] = None
+
+class ConcurrencyConfig(BaseModel):
+    enabled: Optional[bool] = None
+
+class LogLevel(BaseModel):
+    level: str
+    logger: Optional[str] = None
+
+def merge_call_results(name: str, results: List[Any]) -> Any:
+    # kume modunda oturumun parcalarini tutan worker'larin yanitlari tek yanita indirilir
+    found = [result for result in results if result is not None]
+    if not found:
+        return None
+    if name == "status":
+        files, breakers = {}, {}
+        for result in found:
+            files.update(result["files"])
+            breakers.update(result["circuit_breakers"])
+        return {
+            "session_id": found[0]["session_id"],
+            "summary": merge_summaries([result["summary"] for result in found]),
+            "files": files,
+            "circuit_breakers": breakers
+        }
+    if name in SESSION_ACTIONS:
+        return {
+            **found[0],
+            "files": [file_id for result in found for file_id in result["files"]],
+            "paused": sum(result["paused"] for result in found),
+            "running": sum(result["running"] for result in found)
+        }
+    return found[0]
 
 class DownloadManager:
-    def __init__(self):
-        self.active_downloads: Dict[str, Dict] = {}
-        self.websocket_connections: List[WebSocket] = []
+    def __init__(self, http_pool: Optional[SessionPool] = None, scheduler: Optional[DownloadScheduler] = None,
+                 state_store: Optional[StateStore] = None):
+        self.broadcast_hub = BroadcastHub()
         self.download_dir = DOWNLOAD_DIR
-        
-        print("=" * 60)
-        print("DOWNLOAD_DIR YONETIMI")
-        print("=" * 60)
-        print(f"Hedef dizin: {self.download_dir.absolute()}")
-        print(f"Dizin var mi: {self.download_dir.exists()}")
+        # uyarlamali sinir host basina baglanti havuzunun izin verdigi kadar cikabilir; icerik kodlamasi
+        # indirme hattinda cozulur, kayit modu ham byte'lari diske yazabilsin diye aiohttp acmaz
+        self.http_pool = http_pool or SessionPool(
+            limit_per_host=ADAPTIVE_HTTP1_CEILING if ADAPTIVE_CONCURRENCY else POOL_LIMIT_PER_HOST,
+            auto_decompress=False)
+        self.transports = TransportRouter(self.http_pool)
+        self.scheduler = scheduler or DownloadScheduler(host_limit=self.host_limit)
+        self.concurrency = ConcurrencyController(self.concurrency_bounds, self.scheduler.host_demand)
+        self.resume_journal = ResumeJournal()
+        self.watchdog = DownloadWatchdog(self.handle_stall, tick_seconds=CHECK_INTERVAL_SECONDS)
+        self.retry_policy = RetryPolicy()
+        self.breakers = BreakerRegistry()
+        self.bandwidth = BandwidthLimiter()
+        self.loop_monitor = LoopLagMonitor()
+        QUEUE_PENDING.set_function(lambda: self.scheduler.pending)
+        DOWNLOADS_IN_FLIGHT.set_function(lambda: self.scheduler.in_flight)
+        WS_CLIENTS.set_function(lambda: len(self.broadcast_hub.channels))
+        self.cluster: Optional[ClusterClient] = None
+        self.background_tasks = set()
+        # iptal/duraklatma icin calisan dosya gorevleri ve kuyruktan cikarilip bekletilen isler
+        self.running_files: Dict[Tuple[str, str], asyncio.Task] = {}
+        self.file_controls: Dict[Tuple[str, str], str] = {}
+        self.paused_files: Dict[str, Dict[str, ScheduledJob]] = {}
+        self.paused_sessions: Set[str] = set()
+        self.resume_events: Dict[str, asyncio.Event] = {}
+        # inmekte olan dosyalarin okunabilir on eki; /api/files akislari bunu takip eder
+        self.tails: Dict[Tuple[str, str], FileTail] = {}
+        # kume modunda baska worker'larda calisan oturum parcalarinin sonuclari; final rapor bunlari bekler
+        self.session_parts: Dict[str, asyncio.Queue] = {}
+        self._session_stamp = 0
+        self._session_seq = 0
         
         try:
             self.download_dir.mkdir(parents=True, exist_ok=True)
-            print(f"Downloads klasoru hazir: {self.download_dir.absolute()}")
-            
-            if self.download_dir.exists():
-                file_count = len([f for f in self.download_dir.iterdir() if f.is_file()])
-                print(f"Klasordeki dosya sayisi: {file_count}")
+            file_count = len([f for f in self.download_dir.iterdir() if f.is_file()])
+            logger.info("Downloads klasoru hazir",
+                        extra={"download_dir": str(self.download_dir.absolute()), "file_count": file_count})
             
         except Exception as e:
-            print(f"Downloads klasoru olusturulamadi: {e}")
-            print("Fallback dizini deneniyor...")
+            logger.warning("Downloads klasoru olusturulamadi, fallback dizini deneniyor",
+                           extra={"download_dir": str(self.download_dir.absolute()), "error": str(e)})
             
             self.download_dir = pathlib.Path.cwd() / "downloads"
             try:
                 self.download_dir.mkdir(parents=True, exist_ok=True)
-                print(f"Fallback downloads klasoru: {self.download_dir.absolute()}")
+                logger.info("Fallback downloads klasoru kullaniliyor",
+                            extra={"download_dir": str(self.download_dir.absolute())})
             except Exception as fallback_e:
-                print(f"Fallback klasoru de olusturulamadi: {fallback_e}")
-                print("Sistem temp dizini kullaniliyor...")
+                logger.warning("Fallback klasoru de olusturulamadi, sistem temp dizini kullaniliyor",
+                               extra={"error": str(fallback_e)})
                 
                 import tempfile
                 self.download_dir = pathlib.Path(tempfile.gettempdir()) / "url_downloader"
                 self.download_dir.mkdir(parents=True, exist_ok=True)
-                print(f"Temp dizini kullaniliyor: {self.download_dir.absolute()}")
+                logger.info("Temp dizini kullaniliyor", extra={"download_dir": str(self.download_dir.absolute())})
         
-        print("=" * 60)
+        # kume modunda yarida kalan indirmelerin kurtarilmasi ana surecte bir kez yapilir; biten oturumlar
+        # bellekte tutulmaz, oturumun parcalari farkli worker'larda oldugundan tam hali yalnizca veritabanindadir
+        self.state_store = state_store or SQLiteStateStore(
+            self.download_dir / STATE_DB_NAME, hot_sessions=0 if cluster_socket() else STATE_HOT_SESSIONS,
+            recover=cluster_socket() is None
+        )
+        self.report_engine = ReportEngine(self.download_dir, index=self.state_store)
+        self.content_cache = ContentCache(self.download_dir / CACHE_DIR_NAME, shared=cluster_socket() is not None)
+    
+    async def start(self):
+        await self.state_store.open()
+        if not await self.state_store.report_count():
+            summaries = await asyncio.to_thread(self.report_engine.scan_reports)
+            for summary in summaries:
+                self.state_store.index_report(summary)
+            if summaries:
+                logger.info("Rapor katalogu olusturuldu", extra={"reports": len(summaries)})
+        await self.content_cache.open()
+        await self.transports.start()
+        logger.info("HTTP baglanti havuzu hazir",
+                    extra={"limit": self.http_pool.limit, "limit_per_host": self.http_pool.limit_per_host,
+                           "transport": self.transports.default})
+        await self.scheduler.start()
+        logger.info("Indirme zamanlayicisi hazir", extra={"workers": self.scheduler.worker_count})
+        await self.broadcast_hub.start()
+        socket_path = cluster_socket()
+        if socket_path:
+            self.cluster = ClusterClient(
+                socket_path, str(os.getpid()), self.run_dispatched,
+                lambda message: self.broadcast_hub.publish(message, local=True),
+                self.handle_call, lambda: self.scheduler.pending + self.scheduler.in_flight,
+                on_orphaned=self.interrupt_sessions, on_session=self.session_message
+            )
+            await self.cluster.start()
+            self.broadcast_hub.relay = self.cluster.relay
+        await self.watchdog.start()
+        await self.loop_monitor.start()
+    
+    async def close(self):
+        if self.cluster is not None:
+            self.broadcast_hub.relay = None
+            await self.cluster.stop()
+        await self.loop_monitor.stop()
+        await self.watchdog.stop()
+        await self.scheduler.stop()
+        await self.broadcast_hub.stop()
+        await self.report_engine.close()
+        await self.state_store.close()
+        await self.content_cache.close()
+        await self.transports.close()
+        logger.info("HTTP baglanti havuzu kapatildi")
+    
+    def spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return task
+    
+    def new_session_id(self) -> str:
+        # ayni saniyede acilan oturumlar sira ekiyle ayrilir; biten oturum bellekten atilsa da id tekrar kullanilmaz
+        stamp = int(time.time())
+        self._session_seq = self._session_seq + 1 if stamp == self._session_stamp else 1
+        self._session_stamp = stamp
+        session_id = f"session_{stamp}" if self._session_seq == 1 else f"session_{stamp}_{self._session_seq}"
+        if self.cluster is not None:
+            # oturum sahibi koordinatorce secilir; id'ler worker'lar arasinda cakismasin diye worker eki alir
+            return f"{session_id}_w{self.cluster.worker_id}"
+        self.state_store.create_session(session_id)
+        return session_id
+    
+    def register_file(self, session_id: str, file_item: Dict[str, Any]):
+        self.state_store.put_file(session_id, {
+            "file_id": file_item['id'],
+            "url": file_item['url'],
+            "status": "queued",
+            "progress": 0,
+            "size": 0,
+            "error": None,
+            "attempts": 0,
+            "start_time": None
+        })
+    
+    async def submit_file(self, session_id: str, file_item: Dict[str, Any]):
+        if session_id in self.paused_sessions:
+            await self.hold_file(self.file_job(session_id, file_item))
+            return
+        await self.scheduler.submit(
+            session_id,
+            file_item['id'],
+            file_item['url'],
+            lambda item=file_item: self.run_file(session_id, item),
+            priority=file_item.get('priority', 0)
+        )
+    
+    def file_job(self, session_id: str, file_item: Dict[str, Any]) -> ScheduledJob:
+        return ScheduledJob(file_item.get('priority', 0), 0, session_id, file_item['id'], file_item['url'],
+                            lambda item=file_item: self.run_file(session_id, item))
+    
+    async def run_file(self, session_id: str, file_item: Dict[str, Any], retry: Optional[Dict[str, int]] = None):
+        # dosya kendi gorevinde calisir; iptal edilince zamanlayici worker'i degil yalnizca bu gorev durur
+        key = (session_id, file_item['id'])
+        retry = retry if retry is not None else {"attempts": 0, "restarts": 0}
+        deferred = False
+        task = self.running_files[key] = asyncio.create_task(self.download_file(
+            session_id, file_item['id'], file_item['url'],
+            segments=file_item.get('segments') or 1,
+            min_segment_size=file_item.get('min_segment_size') or MIN_SEGMENT_SIZE,
+            checksum=ChecksumSpec.from_item(file_item.get('checksum'), file_item.get('hash_algorithm')),
+            compression=file_item.get('compression') or DEFAULT_COMPRESSION,
+            retry=retry
+        ))
+        try:
+            await task
+        except RetryLater as later:
+            # bekleme suresince yuva tutulmaz; zamanlayici isi ayni deneme sayaciyla yeniden calistirir
+            deferred = True
+            later.run = lambda: self.run_file(session_id, file_item, retry)
+            raise
+        except asyncio.CancelledError:
+            action = self.file_controls.pop(key, None)
+            if action is None:
+                task.cancel()
+                raise
+            if action == "cancel":
+                await self.discard_file(session_id, file_item['id'])
+            else:
+                await self.hold_file(self.file_job(session_id, file_item))
+                if action == "resume":
+                    # duraklatma sonuclanmadan devam istendi; dosya hemen kuyruga geri doner
+                    self.spawn(self.resume_files(session_id, {file_item['id']}))
+        finally:
+            self.running_files.pop(key, None)
+            self.file_controls.pop(key, None)
+            if not deferred and file_item['id'] not in self.paused_files.get(session_id, ()):
+                self.close_tail(session_id, file_item['id'])
+    
+    async def set_file_status(self, session_id: str, file_id: str, status: str, message: str):
+        info = self.state_store.file(session_id, file_id)
+        if info is None:
+            return
+        info["status"] = status
+        info.pop("next_retry_in", None)
         
-    async def broadcast_message(self, message: Dict):
-        disconnected = []
-        for ws in self.websocket_connections:
-            try:
-                await ws.send_json(message)
-            except:
-                disconnected.append(ws)
+        await self.broadcast_message({
+            "type": "progress",
+            "session_id": session_id,
+            "file_id": file_id,
+            "status": status,
+            "progress": info.get("progress", 0),
+            "size": info.get("size", 0),
+            "message": message
+        })
+        await self.update_report(session_id, file_id)
+    
+    async def hold_file(self, job: ScheduledJob):
+        # yazilan kisim ve journal yerinde kalir; devam edince indirme kaldigi offset'ten surer
+        self.paused_files.setdefault(job.session_id, {})[job.file_id] = job
+        await self.set_file_status(job.session_id, job.file_id, "paused", "Dosya duraklatildi")
+    
+    def artifact_path(self, session_id: str, file_id: str) -> pathlib.Path:
+        # dosya id'leri yalnizca oturum icinde tekildir; ayni id'li iki oturum birbirinin dosyasini ezmesin
+        return self.download_dir / session_id / f"{file_id}.tmp"
+    
+    async def discard_file(self, session_id: str, file_id: str):
+        file_path = self.artifact_path(session_id, file_id)
+        await asyncio.to_thread(file_path.unlink, missing_ok=True)
+        await self.resume_journal.finish(file_path)
+        await self.set_file_status(session_id, file_id, "cancelled", "Dosya iptal edildi")
+        self.close_tail(session_id, file_id)
+    
+    def tail(self, session_id: str, file_id: str) -> FileTail:
+        tail = self.tails.get((session_id, file_id))
+        if tail is None:
+            tail = self.tails[(session_id, file_id)] = FileTail()
+        return tail
+    
+    def close_tail(self, session_id: str, file_id: str):
+        tail = self.tails.pop((session_id, file_id), None)
+        if tail is not None:
+            tail.close()
+    
+    def matching_running(self, session_id: str, file_ids: Optional[Set[str]]) -> List[Tuple[str, str]]:
+        return [key for key, task in self.running_files.items()
+                if key[0] == session_id and (file_ids is None or key[1] in file_ids) and not task.done()]
+    
+    def wake_session(self, session_id: str):
+        event = self.resume_events.pop(session_id, None)
+        if event is not None:
+            event.set()
+    
+    async def pause_files(self, session_id: str, file_ids: Optional[Set[str]] = None) -> List[str]:
+        if file_ids is None:
+            self.paused_sessions.add(session_id)
+        affected = []
+        for job in await self.scheduler.cancel(session_id, file_ids):
+            await self.hold_file(job)
+            affected.append(job.file_id)
+        for key in self.matching_running(session_id, file_ids):
+            if key not in self.file_controls:
+                self.file_controls[key] = "pause"
+                self.running_files[key].cancel()
+                affected.append(key[1])
+        return affected
+    
+    async def resume_files(self, session_id: str, file_ids: Optional[Set[str]] = None) -> List[str]:
+        if file_ids is None:
+            self.paused_sessions.discard(session_id)
+        affected = []
+        for key in self.matching_running(session_id, file_ids):
+            if self.file_controls.get(key) == "pause":
+                self.file_controls[key] = "resume"
+                affected.append(key[1])
         
-        for ws in disconnected:
-            if ws in self.websocket_connections:
-                self.websocket_connections.remove(ws)
+        paused = self.paused_files.get(session_id, {})
+        waiting = [file_id for file_id in (list(paused) if file_ids is None else file_ids) if file_id in paused]
+        for file_id in waiting:
+            job = paused.pop(file_id)
+            await self.set_file_status(session_id, file_id, "queued", "Dosya devam ettiriliyor")
+            await self.scheduler.submit(session_id, file_id, job.url, job.run, priority=job.priority)
+            affected.append(file_id)
+        if not paused:
+            self.paused_files.pop(session_id, None)
+        self.wake_session(session_id)
+        return affected
     
-    async def create_initial_report(self, session_id: str):
-        if session_id not in self.active_downloads:
+    async def cancel_files(self, session_id: str, file_ids: Optional[Set[str]] = None) -> List[str]:
+        if file_ids is None:
+            self.paused_sessions.discard(session_id)
+        affected = []
+        for job in await self.scheduler.cancel(session_id, file_ids):
+            await self.discard_file(session_id, job.file_id)
+            affected.append(job.file_id)
+        
+        paused = self.paused_files.get(session_id, {})
+        for file_id in [file_id for file_id in (list(paused) if file_ids is None else file_ids) if file_id in paused]:
+            del paused[file_id]
+            await self.discard_file(session_id, file_id)
+            affected.append(file_id)
+        if not paused:
+            self.paused_files.pop(session_id, None)
+        
+        for key in self.matching_running(session_id, file_ids):
+            self.file_controls[key] = "cancel"
+            self.running_files[key].cancel()
+            affected.append(key[1])
+        self.wake_session(session_id)
+        return affected
+    
+    async def wait_session(self, session_id: str):
+        # duraklatilan dosyalar kuyruktan cikar; oturum ancak hepsi devam ettirilip bitince ya da iptal edilince biter
+        while True:
+            await self.scheduler.wait_session(session_id)
+            if not self.paused_files.get(session_id):
+                return
+            event = self.resume_events.setdefault(session_id, asyncio.Event())
+            await event.wait()
+    
+    async def enqueue_file(self, session_id: str, file_item: Dict[str, Any]):
+        self.register_file(session_id, file_item)
+        await self.create_initial_report(session_id, [file_item['id']])
+        await self.submit_file(session_id, file_item)
+    
+    async def enqueue_session(self, session_id: str, files: List[Dict[str, Any]]):
+        for file_item in files:
+            self.register_file(session_id, file_item)
+        await self.create_initial_report(session_id, [file_item['id'] for file_item in files])
+        
+        for file_item in files:
+            await self.submit_file(session_id, file_item)
+    
+    async def run_session(self, session_id: str, files: List[Dict[str, Any]]):
+        await self.enqueue_session(session_id, files)
+        await self.finalize_session_report(session_id)
+    
+    def configure_session(self, session_id: str, options: Dict[str, Any]):
+        if options.get("stall_policy") is not None:
+            self.watchdog.set_policy(session_id, WatchdogPolicy(**options["stall_policy"]))
+        if options.get("bandwidth_limit") is not None:
+            self.bandwidth.set_session_rate(session_id, options["bandwidth_limit"])
+    
+    async def submit_session(self, session_id: str, files: List[Dict[str, Any]],
+                             options: Optional[Dict[str, Any]] = None, finalize: bool = True):
+        # tek surecte oturum burada calisir; kume modunda koordinator en az yuklu worker'a gonderir
+        if self.cluster is not None:
+            await self.cluster.dispatch(session_id, files, finalize, options)
             return
-            
-        report = {
-            "deleted_files": [],
-            "completed_files": [],
-            "pending_files": list(self.active_downloads[session_id].keys()),
-            "timestamp": datetime.now().isoformat()
+        if options:
+            self.configure_session(session_id, options)
+        if finalize:
+            self.spawn(self.run_session(session_id, files))
+        else:
+            for file_item in files:
+                await self.enqueue_file(session_id, file_item)
+    
+    async def run_dispatched(self, session_id: str, files: List[Dict[str, Any]], finalize: bool,
+                             options: Dict[str, Any], primary: bool, parts: int):
+        self.state_store.create_session(session_id)
+        if not primary:
+            self.report_engine.parts.add(session_id)
+        if options:
+            self.configure_session(session_id, options)
+        await self.enqueue_session(session_id, files)
+        if finalize:
+            self.spawn(self.finalize_session_report(session_id, parts) if primary else self.finish_part(session_id))
+    
+    def session_message(self, op: str, message: Dict[str, Any]):
+        session_id = message["session_id"]
+        if op == "register":
+            self.report_engine.register(session_id, message["file_ids"])
+        elif op == "part":
+            self.session_parts.setdefault(session_id, asyncio.Queue()).put_nowait(message)
+        elif op == "release":
+            self.spawn(self.close_session(session_id))
+    
+    async def finish_part(self, session_id: str):
+        # oturumun bu worker'daki parcasi bitti; sonuc primary'ye gider, kapatma primary bitince gelir
+        await self.wait_session(session_id)
+        report = self.report_engine.session(session_id)
+        files = self.state_store.files(session_id)
+        summary = files.summary()
+        part = {
+            "statuses": dict(report.statuses),
+            "checksums": dict(report.checksums),
+            "transfer": {"wire_bytes": summary["wire_bytes"], "stored_bytes": summary["bytes"]},
+            "deleted_urls": {file_id: files.get(file_id)["url"] for file_id in report.buckets["deleted_files"]},
         }
+        await self.state_store.flush()
+        await self.cluster.send_part(session_id, part)
+    
+    async def collect_parts(self, session_id: str, parts: int) -> Tuple[Dict[str, int], Dict[str, str]]:
+        transfer = {"wire_bytes": 0, "stored_bytes": 0}
+        deleted_urls = {}
+        queue = self.session_parts.setdefault(session_id, asyncio.Queue())
+        for _ in range(parts):
+            part = await queue.get()
+            for file_id, status in part["statuses"].items():
+                self.report_engine.transition(session_id, file_id, status, part["checksums"].get(file_id))
+            for key, value in part["transfer"].items():
+                transfer[key] += value
+            deleted_urls.update(part["deleted_urls"])
+        self.session_parts.pop(session_id, None)
+        return transfer, deleted_urls
+    
+    async def interrupt_sessions(self, session_ids: List[str], files: Dict[str, List[str]]):
+        # sahibi olan worker oldu; oturumlar ve oturum parcalari bitmemis gibi kalmasin
+        interrupted = await self.state_store.interrupt_sessions(session_ids)
+        interrupted += await self.state_store.interrupt_files(files)
+        logger.warning("Ayrilan worker'in oturumlari kesildi",
+                       extra={"sessions": len(session_ids), "parts": len(files), "files": interrupted})
+    
+    async def call_session(self, session_id: str, name: str, **args) -> Any:
+        # kume modunda istek oturumun dosyalarini tutan tum worker'lara gider; bitmis oturum veritabanindan okunur
+        if self.cluster is not None:
+            owned, results = await self.cluster.call(session_id, name, args)
+            if owned:
+                return merge_call_results(name, results)
+        return await self.handle_call(session_id, name, args)
+    
+    async def handle_call(self, session_id: str, name: str, args: Dict[str, Any]) -> Any:
+        if name == "status":
+            state = await self.state_store.load_session(session_id)
+            if state is None:
+                return None
+            hosts = {urlsplit(url).netloc.lower() for url in set(state.files.urls)}
+            return {
+                "session_id": session_id,
+                "summary": state.files.summary(),
+                "files": state.files.to_dict(),
+                "circuit_breakers": self.breakers.stats(hosts)
+            }
+        if name == "file":
+            state = await self.state_store.load_session(session_id)
+            info = state.files.get(args["file_id"]) if state is not None else None
+            if info is None:
+                return None
+            tail = self.tails.get((session_id, args["file_id"]))
+            offset = args.get("offset")
+            if offset is not None and info["status"] in FILE_TAIL_STATUSES:
+                # uzun yoklama: okuyucu yazilan on eki gecmisse buyumesi sahibi olan worker'da beklenir
+                if tail is not None:
+                    await tail.wait(offset, FILE_TAIL_WAIT_SECONDS)
+                else:
+                    await asyncio.sleep(FILE_TAIL_POLL_SECONDS)
+                tail = self.tails.get((session_id, args["file_id"]))
+            result = info.to_dict()
+            if tail is not None:
+                result["readable"] = tail.readable
+                result["total_size"] = tail.total_size
+            return result
+        if name == "bandwidth":
+            if session_id not in self.state_store:
+                return None
+            # oturum birden fazla worker'a dagilmissa sinir aralarinda paylastirilir
+            self.bandwidth.set_session_rate(session_id, max(1, args["rate"] // args.get("holders", 1)))
+            return self.bandwidth.stats()
+        if name in SESSION_ACTIONS:
+            file_id = args.get("file_id")
+            if session_id not in self.state_store or \
+                    (file_id is not None and self.state_store.file(session_id, file_id) is None):
+                return None
+            handler = {"pause": self.pause_files, "resume": self.resume_files, "cancel": self.cancel_files}[name]
+            affected = await handler(session_id, {file_id} if file_id is not None else None)
+            logger.info("Oturum kontrol istegi uygulandi",
+                        extra={"session_id": session_id, "action": name, "file_id": file_id, "files": len(affected)})
+            return {
+                "session_id": session_id,
+                "action": name,
+                "files": affected,
+                "paused": len(self.paused_files.get(session_id, ())),
+                "running": len(self.matching_running(session_id, None))
+            }
+        raise ValueError(f"unknown session call: {name}")
         
-        report_path = self.download_dir / f"download_report_{session_id}.json"
-        with open(report_path, 'w', encoding='utf-8') as f:
-            json.dump(report, f, indent=4, ensure_ascii=False)
-        
-        print("=" * 80)
-        print(f"INDIRME RAPORU - Session ID: {session_id}")
-        print("=" * 80)
-        print(json.dumps(report, indent=4, ensure_ascii=False))
-        print("=" * 80)
-        print(f"DEBUG: create_initial_report tamamlandi - {datetime.now()}")
-        
-        print("=" * 80)
-        logging.info(f"INDIRME RAPORU - Session ID: {session_id}")
-        print("=" * 80)
-        logging.info(json.dumps(report, indent=4, ensure_ascii=False))
-        print("=" * 80)
-        logging.info(f"DEBUG: create_initial_report tamamlandi - {datetime.now()}")
-        
-        print("=" * 80)
-        print(f"JSON DOSYASI ICERIGI - {report_path.name}")
-        print("=" * 80)
-        try:
-            with open(report_path, 'r', encoding='utf-8') as f:
-                file_content = f.read()
-                print(file_content)
-        except Exception as e:
-            print(f"JSON dosyasi okunamadi: {e}")
-        print("=" * 80)
+    async def broadcast_message(self, message: Dict):
+        self.broadcast_hub.publish(message)
     
-    async def update_report(self, session_id: str):
-        if session_id not in self.active_downloads:
+    async def create_initial_report(self, session_id: str, file_ids: Optional[List[str]] = None):
+        files = self.state_store.files(session_id)
+        if files is None:
             return
-            
-        deleted_files = []
-        completed_files = []
-        pending_files = []
-        
-        for file_id, info in self.active_downloads[session_id].items():
-            if info["status"] == "failed":
-                pending_files.append(file_id)
-            elif info["status"] == "completed":
-                completed_files.append(file_id)
-            elif info["status"] == "stalled":
-                deleted_files.append(file_id)
-            else:
-                pending_files.append(file_id)
         
-        report = {
-            "deleted_files": deleted_files,
-            "completed_files": completed_files,
-            "pending_files": pending_files,
-            "timestamp": datetime.now().isoformat()
-        }
+        is_new = session_id not in self.report_engine.sessions
+        if file_ids is None:
+            file_ids = list(files.keys())
+        self.report_engine.register(session_id, file_ids)
         
-        report_path = self.download_dir / f"download_report_{session_id}.json"
-        with open(report_path, 'w', encoding='utf-8') as f:
-            json.dump(report, f, indent=4, ensure_ascii=False)
-        
-        print("=" * 80)
-        print(f"RAPOR GUNCELLENDI - Session ID: {session_id}")
-        print("=" * 80)
-        print(json.dumps(report, indent=4, ensure_ascii=False))
-        print("=" * 80)
+        if is_new:
+            logger.info("Indirme raporu olusturuldu", extra={"session_id": session_id, "files": len(file_ids)})
+    
+    async def update_report(self, session_id: str, file_id: Optional[str] = None):
+        files = self.state_store.files(session_id)
+        if files is None:
+            return
         
-        print("=" * 80)
-        print(f"JSON DOSYASI ICERIGI - {report_path.name}")
-        print("=" * 80)
-        try:
-            with open(report_path, 'r', encoding='utf-8') as f:
-                file_content = f.read()
-                print(file_content)
-        except Exception as e:
-            print(f"JSON dosyasi okunamadi: {e}")
-        print("=" * 80)
+        if file_id is not None:
+            info = files.get(file_id)
+            if info is not None:
+                self.report_engine.transition(session_id, file_id, info["status"], info.get("checksum"))
+                self.state_store.touch(session_id, file_id)
+        else:
+            for file_id, info in files.items():
+                self.report_engine.transition(session_id, file_id, info["status"], info.get("checksum"))
+                self.state_store.touch(session_id, file_id)
     
-    async def create_deleted_urls_file(self, session_id: str, deleted_files: List[str]):
+    async def create_deleted_urls_file(self, session_id: str, deleted_files: List[str],
+                                       remote_urls: Optional[Dict[str, str]] = None):
         if not deleted_files:
             return
             
+        session_downloads = self.state_store.files(session_id) or {}
+        remote_urls = remote_urls or {}
         deleted_urls = []
-        for file_item in URL_LIST:
-            if file_item['id'] in deleted_files:
+        for file_id in deleted_files:
+            url = session_downloads[file_id]['url'] if file_id in session_downloads else remote_urls.get(file_id)
+            if url is not None:
                 deleted_urls.append({
-                    'id': file_item['id'],
-                    'url': file_item['url'],
+                    'id': file_id,
+                    'url': url,
                     'reason': 'Duraklama nedeniyle silindi',
                     'timestamp': datetime.now().isoformat()
                 })
         
+        lines = [
+            "DURAKLAMA NEDENİYLE SİLİNEN DOSYALARIN URL'LERİ\n",
+            "=" * 50 + "\n\n",
+            f"Session ID: {session_id}\n",
+            f"Tarih: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}\n",
+            f"Silinen Dosya Sayısı: {len(deleted_urls)}\n\n",
+        ]
+        for i, item in enumerate(deleted_urls, 1):
+            lines.append(f"{i}. {item['id']}\n")
+            lines.append(f"   URL: {item['url']}\n")
+            lines.append(f"   Sebep: {item['reason']}\n")
+            lines.append(f"   Zaman: {item['timestamp']}\n\n")
+        
         urls_file_path = self.download_dir / f"deleted_urls_{session_id}.txt"
-        with open(urls_file_path, 'w', encoding='utf-8') as f:
-            f.write("DURAKLAMA NEDENİYLE SİLİNEN DOSYALARIN URL'LERİ\n")
-            f.write("=" * 50 + "\n\n")
-            f.write(f"Session ID: {session_id}\n")
-            f.write(f"Tarih: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}\n")
-            f.write(f"Silinen Dosya Sayısı: {len(deleted_urls)}\n\n")
+        # rapor gibi atomik yazilir; event loop disk yazimini beklemez
+        await asyncio.to_thread(write_atomic, urls_file_path, "".join(lines))
+        
+        logger.info("Deleted URLs dosyasi olusturuldu", extra={"session_id": session_id, "path": str(urls_file_path)})
+    
+    async def download_segmented_file(self, session_id: str, file_id: str, url: str, file_path,
+                                      download_info: Dict, probe, ranges, watch: FileWatch,
+                                      transfer: InflightTransfer, checksum: ChecksumSpec,
+                                      sample: RequestSample) -> Optional[CacheEntry]:
+        total_size = probe.content_length
+        offsets = None
+        
+        journal = await self.resume_journal.load(file_path, url)
+        if journal is not None and journal.segments \
+                and journal.total_size == total_size and journal.validator == probe.validator:
+            ranges = [(start, end) for start, end, _offset in journal.segments]
+            offsets = [offset for _start, _end, offset in journal.segments]
+            logger.info("Parcali indirme kaldigi yerden devam ediyor",
+                        extra={"session_id": session_id, "file_id": file_id, "bytes": journal.bytes_committed})
+        else:
+            journal = self.resume_journal.begin(
+                file_path, url, probe.etag, probe.last_modified, total_size,
+                segments=[[start, end, start] for start, end in ranges]
+            )
+        
+        downloaded_size = journal.bytes_committed
+        tail = self.tail(session_id, file_id)
+        tail.begin(total_size, segments_prefix(journal.segments))
+        
+        await self.broadcast_message({
+            "type": "progress",
+            "session_id": session_id,
+            "file_id": file_id,
+            "status": "downloading",
+            "progress": 0,
+            "size": downloaded_size,
+            "wire_size": downloaded_size,
+            "total_size": total_size,
+            "segments": len(ranges)
+        })
+        
+        host = urlsplit(url).netloc.lower()
+        
+        async def on_progress(n: int):
+            nonlocal downloaded_size
+            downloaded_size += n
+            watch.feed(n)
+            sample.feed(n)
+            transfer.feed(n)
+            BYTES_DOWNLOADED.inc(n)
+            BYTES_STORED.inc(n)
+            await self.bandwidth.acquire(session_id, host, n)
+            progress = int((downloaded_size / total_size) * 100)
+            download_info["progress"] = progress
+            download_info["size"] = downloaded_size
+            download_info["wire_size"] = downloaded_size
             
-            for i, item in enumerate(deleted_urls, 1):
-                f.write(f"{i}. {item['id']}\n")
-                f.write(f"   URL: {item['url']}\n")
-                f.write(f"   Sebep: {item['reason']}\n")
-                f.write(f"   Zaman: {item['timestamp']}\n\n")
+            await self.broadcast_message({
+                "type": "progress",
+                "session_id": session_id,
+                "file_id": file_id,
+                "status": "downloading",
+                "progress": progress,
+                "size": downloaded_size,
+                "wire_size": downloaded_size,
+                "total_size": total_size
+            })
         
+        async def on_checkpoint(index: int, offset: int):
+            journal.segments[index][2] = offset
+            tail.advance(segments_prefix(journal.segments))
+            await self.resume_journal.checkpoint(journal, downloaded_size)
+        
+        resumed_size = downloaded_size
+        transfer_started = time.monotonic()
+        sample.start()
         try:
-            print(f"Deleted URLs dosyası oluşturuldu: {urls_file_path}")
-        except Exception:
-            pass
+            await download_segmented(
+                self.transports.session_for(url), url, file_path, probe, ranges, on_progress,
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60),
+                offsets=offsets,
+                on_checkpoint=on_checkpoint,
+                max_chunk_size=self.bandwidth.chunk_limit(session_id, host, CHUNK_SIZE_MAX)
+            )
+        except asyncio.CancelledError:
+            await self.resume_journal.checkpoint(journal, downloaded_size, force=True)
+            raise
+        observe_transfer(total_size - resumed_size, time.monotonic() - transfer_started)
+        await self.resume_journal.finish(file_path)
+        # parcalar sirasiz yazildigi icin akista ozetlenemez, dosya bir kez okunur
+        digest = await asyncio.to_thread(digest_file, file_path, (CACHE_HASH_ALGORITHM, checksum.algorithm))
+        download_info["checksum"] = checksum.verify(digest.hexdigest(checksum.algorithm))
+        sample.completed = True
+        entry = await self.cache_download(url, probe.etag, probe.last_modified, file_path,
+                                          digest.hexdigest(CACHE_HASH_ALGORITHM), total_size)
+        
+        download_info["status"] = "completed"
+        download_info["progress"] = 100
+        download_info["size"] = total_size
+        download_info["wire_size"] = downloaded_size
+        
+        await self.broadcast_message({
+            "type": "progress",
+            "session_id": session_id,
+            "file_id": file_id,
+            "status": "completed",
+            "progress": 100,
+            "size": total_size,
+            "wire_size": downloaded_size,
+            "total_size": total_size,
+            "checksum": download_info["checksum"]
+        })
+        
+        await self.update_report(session_id, file_id)
+        return entry
     
-    async def simulate_slow_download(self, session_id: str, file_id: str, url: str, file_path: str):
+    async def cache_download(self, url: str, etag: Optional[str], last_modified: Optional[str], file_path,
+                             digest: str, size: int, encoding: Optional[str] = None,
+                             variant: Optional[str] = None) -> Optional[CacheEntry]:
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                    if response.status == 200:
-                        data = await response.read(100)
-                        
-                        async with aiofiles.open(file_path, 'wb') as f:
-                            await f.write(data)
-                        
-                        self.active_downloads[session_id][file_id]["size"] = 100
-                        self.active_downloads[session_id][file_id]["progress"] = 20
-                        
-                        await self.broadcast_message({
-                            "type": "progress",
-                            "session_id": session_id,
-                            "file_id": file_id,
-                            "status": "downloading",
-                            "progress": 20,
-                            "size": 100,
-                            "total_size": 512
-                        })
-                        
-                        await asyncio.sleep(30)
-                        
-                        self.active_downloads[session_id][file_id]["status"] = "downloading"
-                        self.active_downloads[session_id][file_id]["size"] = 100
-                        
-                        try:
-                            if file_path.exists() and file_path.stat().st_size == 100:
-                                file_path.unlink()
-                                self.active_downloads[session_id][file_id]["status"] = "stalled"
-                                await self.broadcast_message({
-                                    "type": "progress",
-                                    "session_id": session_id,
-                                    "file_id": file_id,
-                                    "status": "stalled",
-                                    "message": "Dosya duraklamış ve silindi (hemen)"
-                                })
-                                await self.update_report(session_id)
-                                await self.create_deleted_urls_file(session_id, [file_id])
-                        except Exception as del_err:
-                            print(f"dosya_6 silme/raporlama hatası: {del_err}")
-                        
-                        print(f"dosya_6 yavaş indirme simülasyonu tamamlandı - durakladı ve silindi")
-                    else:
-                        self.active_downloads[session_id][file_id]["status"] = "failed"
-                        self.active_downloads[session_id][file_id]["error"] = f"HTTP {response.status}"
-                        
-                        await self.broadcast_message({
-                            "type": "progress",
-                            "session_id": session_id,
-                            "file_id": file_id,
-                            "status": "failed",
-                            "error": f"HTTP {response.status}"
-                        })
-        except Exception as e:
-            self.active_downloads[session_id][file_id]["status"] = "failed"
-            self.active_downloads[session_id][file_id]["error"] = str(e)
+            return await self.content_cache.store(url, etag, last_modified, file_path, digest, size,
+                                                  encoding=encoding, variant=variant)
+        except OSError as e:
+            logger.warning("Onbellege alinamadi", extra={"url": url, "error": str(e)})
+            return None
+    
+    async def handle_stall(self, watch: FileWatch, reason: str):
+        logger.warning("Dosya duraksadi" if reason == "stalled" else "Dosya cok yavas",
+                       extra={"session_id": watch.session_id, "file_id": watch.file_id,
+                              "rate": round(watch.rate), "action": watch.policy.action})
+        if watch.task is not None and not watch.task.done():
+            watch.task.cancel()
+    
+    def host_limit(self, host: str) -> Optional[int]:
+        limit = self.concurrency.limit_for(host)
+        return limit if limit is not None else self.transports.host_limit(host)
+    
+    def concurrency_bounds(self, host: str) -> Tuple[int, int]:
+        ceiling = self.transports.host_limit(host)
+        if ceiling is None:
+            ceiling = min(ADAPTIVE_HTTP1_CEILING, self.http_pool.limit_per_host or ADAPTIVE_HTTP1_CEILING)
+        return min(self.scheduler.per_host_limit, ceiling), ceiling
+    
+    def record_concurrency(self, host: str, sample: RequestSample, outcome: str):
+        # onbellekten ya da baska oturumun transferinden tamamlanan denemeler sunucu hakkinda bir sey soylemez
+        if sample.started is None:
+            return
+        # hata yanitlari is yapilmadan hemen doner; ilk byte suresinin en iyi degerini asagi cekmesin
+        ttfb = sample.ttfb if outcome == "ok" else None
+        self.concurrency.record(host, outcome, sample.started, sample.wire_bytes, ttfb)
+    
+    async def mark_failed(self, session_id: str, file_id: str, error: str):
+        info = self.state_store.file(session_id, file_id)
+        info["status"] = "failed"
+        info["error"] = error
+        info.pop("next_retry_in", None)
+        
+        await self.broadcast_message({
+            "type": "progress",
+            "session_id": session_id,
+            "file_id": file_id,
+            "status": "failed",
+            "error": error
+        })
+        await self.update_report(session_id, file_id)
+    
+    async def download_file(self, session_id: str, file_id: str, url: str,
+                            segments: int = 1, min_segment_size: int = MIN_SEGMENT_SIZE,
+                            checksum: Optional[ChecksumSpec] = None, compression: str = DEFAULT_COMPRESSION,
+                            retry: Optional[Dict[str, int]] = None):
+        file_path = self.artifact_path(session_id, file_id)
+        host = urlsplit(url).netloc.lower()
+        breaker = self.breakers.get(host)
+        # deneme sayaclari RetryLater ile yeniden kuyruga alinan calismalar arasinda korunur
+        retry = retry if retry is not None else {"attempts": 0, "restarts": 0}
+        
+        while True:
+            if not breaker.allow():
+                # devre acikken dosya dusurulmez, devre yeniden denenebilir olana kadar kuyruga geri doner
+                retry_in = breaker.retry_in()
+                delay = max(retry_in, self.retry_policy.base_delay) + self.retry_policy.compute_delay(1)
+                info = self.state_store.file(session_id, file_id)
+                info["status"] = "retrying"
+                info["error"] = str(CircuitOpenError(breaker.host, retry_in))
+                info["next_retry_in"] = round(delay, 2)
+                await self.broadcast_message({
+                    "type": "progress",
+                    "session_id": session_id,
+                    "file_id": file_id,
+                    "status": "retrying",
+                    "error": info["error"],
+                    "message": f"{delay:.1f} sn sonra tekrar denenecek"
+                })
+                raise RetryLater(delay)
+            
+            retry["attempts"] += 1
+            attempts = retry["attempts"]
+            watch = self.watchdog.track(session_id, file_id)
+            sample = RequestSample()
+            watch.task = asyncio.create_task(
+                self.download_attempt(session_id, file_id, url, watch, segments, min_segment_size, attempts,
+                                      checksum or ChecksumSpec(), compression, sample)
+            )
+            try:
+                await watch.task
+                breaker.record_success()
+                if sample.completed:
+                    self.record_concurrency(host, sample, "ok")
+                return
+            except asyncio.CancelledError:
+                if watch.reason is None:
+                    breaker.abandon()
+                    watch.task.cancel()
+                    raise
+                # duraklama host hatasi sayilmaz; yarim acik devrenin deneme hakki birakilir
+                breaker.abandon()
+            except TransientDownloadError as e:
+                breaker.record_failure()
+                self.record_concurrency(host, sample, "throttled" if e.status in THROTTLE_STATUSES else "error")
+                if attempts >= self.retry_policy.max_attempts:
+                    await self.mark_failed(session_id, file_id, str(e))
+                    return
+                
+                delay = self.retry_policy.compute_delay(attempts, e.retry_after)
+                info = self.state_store.file(session_id, file_id)
+                info["status"] = "retrying"
+                info["error"] = str(e)
+                info["next_retry_in"] = round(delay, 2)
+                logger.warning("Gecici hata, tekrar denenecek",
+                               extra={"session_id": session_id, "file_id": file_id, "error": str(e),
+                                      "delay": round(delay, 2), "attempt": attempts,
+                                      "max_attempts": self.retry_policy.max_attempts})
+                
+                await self.broadcast_message({
+                    "type": "progress",
+                    "session_id": session_id,
+                    "file_id": file_id,
+                    "status": "retrying",
+                    "error": str(e),
+                    "attempt": attempts,
+                    "message": f"{delay:.1f} sn sonra tekrar denenecek"
+                })
+                await self.update_report(session_id, file_id)
+                raise RetryLater(delay)
+            finally:
+                self.watchdog.untrack(watch)
+            
+            policy = watch.policy
+            if policy.action != "cancel" and retry["restarts"] < policy.max_restarts:
+                retry["restarts"] += 1
+                if policy.action == "retry":
+                    await self.resume_journal.finish(file_path)
+                logger.info("Indirme yeniden baslatiliyor",
+                            extra={"session_id": session_id, "file_id": file_id, "action": policy.action,
+                                   "restart": retry["restarts"], "max_restarts": policy.max_restarts})
+                continue
+            
+            await self.resume_journal.park(file_path)
+            info = self.state_store.file(session_id, file_id)
+            info["status"] = "stalled"
+            info["error"] = "Duraklama" if watch.reason == "stalled" else "Hiz esigin altinda"
             
             await self.broadcast_message({
                 "type": "progress",
                 "session_id": session_id,
                 "file_id": file_id,
-                "status": "failed",
-                "error": str(e)
+                "status": "stalled",
+                "message": "Dosya duraklamış ve silindi"
             })
+            await self.update_report(session_id, file_id)
+            return
     
-    async def download_file(self, session_id: str, file_id: str, url: str):
-        print(f"DEBUG: download_file basladi - {file_id} - {datetime.now()}")
-        self.download_dir.mkdir(parents=True, exist_ok=True)
-        file_path = self.download_dir / f"{file_id}.tmp"
+    async def download_attempt(self, session_id: str, file_id: str, url: str, watch: FileWatch,
+                               segments: int = 1, min_segment_size: int = MIN_SEGMENT_SIZE, attempt: int = 1,
+                               checksum: Optional[ChecksumSpec] = None, compression: str = DEFAULT_COMPRESSION,
+                               sample: Optional[RequestSample] = None):
+        checksum = checksum or ChecksumSpec()
+        sample = sample or RequestSample()
+        logger.debug("download_file basladi", extra={"session_id": session_id, "file_id": file_id, "url": url})
+        file_path = self.artifact_path(session_id, file_id)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
         
         download_info = {
             "file_id": file_id,
@@ -304,102 +993,280 @@ class DownloadManager:
             "status": "downloading",
             "progress": 0,
             "size": 0,
+            "wire_size": 0,
             "error": None,
+            "attempts": attempt,
             "start_time": time.time()
         }
         
-        if session_id not in self.active_downloads:
-            self.active_downloads[session_id] = {}
+        download_info = self.state_store.put_file(session_id, download_info)
         
-        self.active_downloads[session_id][file_id] = download_info
+        await self.create_initial_report(session_id, [file_id])
         
-        await self.create_initial_report(session_id)
+        try:
+            # ayni URL baska bir oturumda iniyorsa ikinci bir transfer acilmaz, sonucu beklenir
+            while True:
+                transfer, leader = self.content_cache.join(url, cache_variant(compression))
+                if leader:
+                    break
+                logger.info("Ayni URL'nin suren indirmesine baglandi",
+                            extra={"session_id": session_id, "file_id": file_id, "url": url})
+                entry = await self.content_cache.follow(transfer, watch)
+                if entry is not None and await self.complete_from_cache(session_id, file_id, file_path,
+                                                                        download_info, entry, checksum):
+                    return
+            
+            entry = None
+            try:
+                entry = await self.fetch_file(session_id, file_id, url, file_path, download_info, watch, transfer,
+                                              segments, min_segment_size, checksum, compression, sample)
+            finally:
+                self.content_cache.release(transfer, entry)
+        except ChecksumMismatch as e:
+            logger.error("Butunluk dogrulamasi basarisiz",
+                         extra={"session_id": session_id, "file_id": file_id, "algorithm": e.algorithm,
+                                "expected": e.expected, "actual": e.actual})
+            await asyncio.to_thread(file_path.unlink, missing_ok=True)
+            await self.resume_journal.finish(file_path)
+            await self.mark_failed(session_id, file_id, str(e))
+    
+    async def complete_from_cache(self, session_id: str, file_id: str, file_path, download_info: Dict,
+                                  entry: CacheEntry, checksum: ChecksumSpec) -> bool:
+        if not await self.content_cache.materialize(entry, file_path):
+            return False
+        await self.resume_journal.finish(file_path)
+        logger.info("Onbellekten alindi", extra={"session_id": session_id, "file_id": file_id, "bytes": entry.size})
         
-        if file_id == 'dosya_6':
-            await self.simulate_slow_download(session_id, file_id, url, file_path)
-            return
+        if checksum.algorithm == CACHE_HASH_ALGORITHM:
+            digest = entry.digest
+        else:
+            digest = (await asyncio.to_thread(digest_file, file_path, (checksum.algorithm,))).hexdigest(checksum.algorithm)
+        download_info["checksum"] = checksum.verify(digest)
+        
+        download_info["status"] = "completed"
+        download_info["progress"] = 100
+        download_info["size"] = entry.size
+        download_info["wire_size"] = 0
+        download_info["encoding"] = entry.encoding
         
+        await self.broadcast_message({
+            "type": "progress",
+            "session_id": session_id,
+            "file_id": file_id,
+            "status": "completed",
+            "progress": 100,
+            "size": entry.size,
+            "wire_size": 0,
+            "total_size": entry.size,
+            "checksum": download_info["checksum"],
+            "cached": True
+        })
+        
+        await self.update_report(session_id, file_id)
+        return True
+    
+    async def fetch_file(self, session_id: str, file_id: str, url: str, file_path, download_info: Dict,
+                         watch: FileWatch, transfer: InflightTransfer,
+                         segments: int = 1, min_segment_size: int = MIN_SEGMENT_SIZE,
+                         checksum: Optional[ChecksumSpec] = None,
+                         compression: str = DEFAULT_COMPRESSION,
+                         sample: Optional[RequestSample] = None) -> Optional[CacheEntry]:
+        checksum = checksum or ChecksumSpec()
+        sample = sample or RequestSample()
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, timeout=aiohttp.ClientTimeout(total=300)) as response:
-                    if response.status == 200:
-                        total_size = int(response.headers.get('content-length', 0))
-                        downloaded_size = 0
-                        
-                        await self.broadcast_message({
-                            "type": "progress",
-                            "session_id": session_id,
-                            "file_id": file_id,
-                            "status": "downloading",
-                            "progress": 0,
-                            "size": downloaded_size,
-                            "total_size": total_size
-                        })
-                        
-                        async with aiofiles.open(file_path, 'wb') as f:
-                            async for chunk in response.content.iter_chunked(8192):
-                                await f.write(chunk)
+            session = self.transports.session_for(url)
+            journal = await self.resume_journal.load(file_path, url)
+            resumable = journal is not None and journal.bytes_committed > 0
+            cache_entry = None if resumable else await self.content_cache.lookup(url, cache_variant(compression))
+            
+            if segments > 1 and cache_entry is None:
+                probe = await probe_range_support(session, url, timeout=aiohttp.ClientTimeout(total=30))
+                ranges = plan_segments(probe.content_length, segments, min_segment_size) if probe.accept_ranges else []
+                if ranges:
+                    try:
+                        return await self.download_segmented_file(session_id, file_id, url, file_path, download_info,
+                                                                  probe, ranges, watch, transfer, checksum, sample)
+                    except SegmentError as seg_err:
+                        logger.warning("Parcali indirme basarisiz, tek baglantiya geciliyor",
+                                       extra={"session_id": session_id, "file_id": file_id, "error": str(seg_err)})
+                        download_info["progress"] = 0
+                        download_info["size"] = 0
+                        journal = await self.resume_journal.load(file_path, url)
+            
+            headers = {"Accept-Encoding": accept_encoding(compression)}
+            if journal is not None and journal.bytes_committed > 0 and not journal.segments:
+                headers["Range"] = f"bytes={journal.bytes_committed}-"
+                headers["If-Range"] = journal.validator
+                # kodlanmis akis ortasindan acilamaz; devam ederken diskteki byte'larla ayni temsil istenir
+                headers["Accept-Encoding"] = journal.encoding or "identity"
+            elif cache_entry is not None:
+                headers.update(cache_entry.conditional_headers())
+            
+            sample.start()
+            async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=300)) as response:
+                # ilk byte suresi yanit basliklarinin geldigi ana kadar olculur
+                sample.feed(0)
+                if response.status == 304 and cache_entry is not None:
+                    self.content_cache.revalidated += 1
+                    if await self.complete_from_cache(session_id, file_id, file_path, download_info,
+                                                      cache_entry, checksum):
+                        sample.completed = True
+                        return cache_entry
+                    raise TransientDownloadError("Onbellek dosyasi bulunamadi")
+                
+                if response.status in (200, 206):
+                    wire_encoding = response_encoding(response.headers)
+                    resume_from = 0
+                    decoder = None
+                    if response.status == 206 and "Range" in headers \
+                            and response.headers.get('content-range', '').startswith(f"bytes {journal.bytes_committed}-") \
+                            and wire_encoding == journal.encoding:
+                        resume_from = journal.bytes_committed
+                        logger.info("Kaldigi yerden devam ediyor",
+                                    extra={"session_id": session_id, "file_id": file_id, "bytes": resume_from})
+                    elif response.status == 206:
+                        # istenenle uyusmayan kismi yanit dosyanin tamami gibi yazilamaz; bir sonraki deneme bastan baslar
+                        await self.resume_journal.finish(file_path)
+                        raise TransientDownloadError("Devam yaniti istenen aralikla uyusmuyor")
+                    else:
+                        if wire_encoding is not None and compression != "store":
+                            decoder = StreamDecoder(wire_encoding)
+                        journal = self.resume_journal.begin(
+                            file_path, url,
+                            response.headers.get('etag'),
+                            response.headers.get('last-modified'),
+                            int(response.headers.get('content-length', 0)),
+                            encoding=wire_encoding if decoder is None else None
+                        )
+                    download_info["encoding"] = journal.encoding
+                    
+                    total_size = resume_from + int(response.headers.get('content-length', 0))
+                    downloaded_size = resume_from
+                    download_info["size"] = downloaded_size
+                    download_info["wire_size"] = downloaded_size
+                    
+                    await self.broadcast_message({
+                        "type": "progress",
+                        "session_id": session_id,
+                        "file_id": file_id,
+                        "status": "downloading",
+                        "progress": 0,
+                        "size": downloaded_size,
+                        "wire_size": downloaded_size,
+                        "total_size": total_size
+                    })
+                    
+                    expected_size = total_size if decoder is None else 0
+                    # kodlanmis yanitta diske yazilan boyut bilinmez; akis uzunluk bildirmeden takip eder
+                    tail = self.tail(session_id, file_id)
+                    tail.begin(expected_size, resume_from)
+                    digest = StreamingDigest((CACHE_HASH_ALGORITHM, checksum.algorithm))
+                    host = urlsplit(url).netloc.lower()
+                    # kisitli hizda parcalar kucultulur, boylece her bekleme kisa kalir ve watchdog'u tetiklemez
+                    chunk_limit = self.bandwidth.chunk_limit(session_id, host, CHUNK_SIZE_MAX)
+                    transfer_started = time.monotonic()
+                    if resume_from:
+                        # yalnizca daha once yazilan kisim okunur, gerisi akarken ozetlenir
+                        await asyncio.to_thread(digest.update_from_file, file_path, resume_from)
+                    writer = BufferedFileWriter(file_path, offset=resume_from, truncate=not resume_from,
+                                                expected_size=expected_size, hasher=digest)
+                    try:
+                        async with writer:
+                            async for chunk in iter_adaptive_chunks(response.content,
+                                                                    min(CHUNK_SIZE_MIN, chunk_limit), chunk_limit):
                                 downloaded_size += len(chunk)
-                                
+                                watch.feed(len(chunk))
+                                sample.feed(len(chunk))
+                                transfer.feed(len(chunk))
+                                BYTES_DOWNLOADED.inc(len(chunk))
+                                await self.bandwidth.acquire(session_id, host, len(chunk))
+                                data = chunk if decoder is None else await decoder.decode(chunk)
+                                BYTES_STORED.inc(len(data))
+                                if await writer.write(data):
+                                    tail.advance(writer.bytes_flushed)
+                                    await self.resume_journal.checkpoint(journal, writer.bytes_flushed)
+                            
                                 if total_size > 0:
                                     progress = int((downloaded_size / total_size) * 100)
                                 else:
                                     progress = 0
-                                
+                            
                                 download_info["progress"] = progress
-                                download_info["size"] = downloaded_size
-                                
-                                if downloaded_size % 102400 < 8192:
-                                    await self.broadcast_message({
-                                        "type": "progress",
-                                        "session_id": session_id,
-                                        "file_id": file_id,
-                                        "status": "downloading",
-                                        "progress": progress,
-                                        "size": downloaded_size,
-                                        "total_size": total_size
-                                    })
-                        
-                        download_info["status"] = "completed"
-                        download_info["progress"] = 100
-                        
-                        await self.broadcast_message({
-                            "type": "progress",
-                            "session_id": session_id,
-                            "file_id": file_id,
-                            "status": "completed",
-                            "progress": 100,
-                            "size": downloaded_size,
-                            "total_size": total_size
-                        })
-                        
-                        await self.update_report(session_id)
-                        
-                    else:
-                        download_info["status"] = "failed"
-                        download_info["error"] = f"HTTP {response.status}"
-                        
-                        await self.broadcast_message({
-                            "type": "progress",
-                            "session_id": session_id,
-                            "file_id": file_id,
-                            "status": "failed",
-                            "error": f"HTTP {response.status}"
-                        })
-                        
-                        await self.update_report(session_id)
-                        
+                                download_info["size"] = writer.bytes_written
+                                download_info["wire_size"] = downloaded_size
+                            
+                                await self.broadcast_message({
+                                    "type": "progress",
+                                    "session_id": session_id,
+                                    "file_id": file_id,
+                                    "status": "downloading",
+                                    "progress": progress,
+                                    "size": writer.bytes_written,
+                                    "wire_size": downloaded_size,
+                                    "total_size": total_size
+                                })
+                            if decoder is not None:
+                                await writer.write(decoder.flush())
+                    except (asyncio.CancelledError, asyncio.TimeoutError, aiohttp.ClientError):
+                        # duraklatma, duraklama sonrasi devam ya da yarida kopan baglanti diske son yazilan offset'ten baslar
+                        await self.resume_journal.checkpoint(journal, writer.bytes_flushed, force=True)
+                        raise
+                    tail.advance(writer.bytes_flushed)
+                    
+                    observe_transfer(downloaded_size - resume_from, time.monotonic() - transfer_started)
+                    await self.resume_journal.finish(file_path)
+                    download_info["checksum"] = checksum.verify(digest.hexdigest(checksum.algorithm))
+                    sample.completed = True
+                    download_info["size"] = writer.bytes_written
+                    download_info["wire_size"] = downloaded_size
+                    entry = await self.cache_download(url, response.headers.get('etag'),
+                                                      response.headers.get('last-modified'), file_path,
+                                                      digest.hexdigest(CACHE_HASH_ALGORITHM), writer.bytes_written,
+                                                      journal.encoding, cache_variant(compression))
+                    download_info["status"] = "completed"
+                    download_info["progress"] = 100
+                    
+                    await self.broadcast_message({
+                        "type": "progress",
+                        "session_id": session_id,
+                        "file_id": file_id,
+                        "status": "completed",
+                        "progress": 100,
+                        "size": writer.bytes_written,
+                        "wire_size": downloaded_size,
+                        "total_size": total_size,
+                        "checksum": download_info["checksum"]
+                    })
+                    
+                    await self.update_report(session_id, file_id)
+                    return entry
+                    
+                elif self.retry_policy.is_retryable(response.status):
+                    raise TransientDownloadError(
+                        f"HTTP {response.status}",
+                        response.status,
+                        parse_retry_after(response.headers.get('retry-after'))
+                    )
+                else:
+                    download_info["status"] = "failed"
+                    download_info["error"] = f"HTTP {response.status}"
+                    
+                    await self.broadcast_message({
+                        "type": "progress",
+                        "session_id": session_id,
+                        "file_id": file_id,
+                        "status": "failed",
+                        "error": f"HTTP {response.status}"
+                    })
+                    
+                    await self.update_report(session_id, file_id)
+                    
+        except (TransientDownloadError, ChecksumMismatch):
+            raise
         except asyncio.TimeoutError:
-            download_info["status"] = "failed"
-            download_info["error"] = "Timeout"
-            await self.broadcast_message({
-                "type": "progress",
-                "session_id": session_id,
-                "file_id": file_id,
-                "status": "failed",
-                "error": "Timeout"
-            })
-            await self.update_report(session_id)
+            raise TransientDownloadError("Timeout")
+        except aiohttp.ClientError as e:
+            raise TransientDownloadError(str(e) or type(e).__name__)
         except Exception as e:
             download_info["status"] = "failed"
             download_info["error"] = str(e)
@@ -411,97 +1278,29 @@ class DownloadManager:
                 "status": "failed",
                 "error": str(e)
             })
-            await self.update_report(session_id)
+            await self.update_report(session_id, file_id)
     
-    async def check_stalled_files(self, session_id: str):
-        await asyncio.sleep(CHECK_INTERVAL_SECONDS)
+    async def finalize_session_report(self, session_id: str, parts: int = 0):
+        await self.wait_session(session_id)
         
-        if session_id not in self.active_downloads:
+        if session_id not in self.state_store:
             return
         
-        deleted_files = []
-        completed_files = []
-        pending_files = []
-        
-        for file_id, info in self.active_downloads[session_id].items():
-            file_path = self.download_dir / f"{file_id}.tmp"
-            
-            if file_id == "dosya_6":
-                deleted_files.append(file_id)
-                info["status"] = "stalled"
-                await self.broadcast_message({
-                    "type": "progress",
-                    "session_id": session_id,
-                    "file_id": file_id,
-                    "status": "stalled",
-                    "message": "dosya_6 duraklamış ve silindi"
-                })
-            elif info["status"] == "failed":
-                pending_files.append(file_id)
-            elif info["status"] == "completed":
-                completed_files.append(file_id)
-            elif info["status"] == "stalled":
-                deleted_files.append(file_id)
-            elif info["status"] == "downloading":
-                if file_path.exists():
-                    current_size = file_path.stat().st_size
-                    initial_size = info["size"]
-                    
-                    if current_size == initial_size and current_size > 0:
-                        try:
-                            file_path.unlink()
-                            deleted_files.append(file_id)
-                            info["status"] = "stalled"
-                            
-                            await self.broadcast_message({
-                                "type": "progress",
-                                "session_id": session_id,
-                                "file_id": file_id,
-                                "status": "stalled",
-                                "message": "Dosya duraklamış ve silindi"
-                            })
-                        except Exception as e:
-                            print(f"Dosya silinemedi: {e}")
-                    else:
-                        if info["progress"] == 100:
-                            completed_files.append(file_id)
-                        else:
-                            completed_files.append(file_id)
-                else:
-                    if info["status"] == "stalled":
-                        deleted_files.append(file_id)
-                    else:
-                        pending_files.append(file_id)
-        
-        report = {
-            "deleted_files": deleted_files,
-            "completed_files": completed_files,
-            "pending_files": pending_files,
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        report_path = self.download_dir / f"download_report_{session_id}.json"
-        with open(report_path, 'w', encoding='utf-8') as f:
-            json.dump(report, f, indent=4, ensure_ascii=False)
+        summary = self.state_store.files(session_id).summary()
+        transfer, remote_urls = await self.collect_parts(session_id, parts)
+        report = await self.report_engine.finalize(session_id, {
+            "wire_bytes": summary["wire_bytes"] + transfer["wire_bytes"],
+            "stored_bytes": summary["bytes"] + transfer["stored_bytes"]
+        })
         
-        print("=" * 80)
-        print(f"FINAL RAPOR - Session ID: {session_id}")
-        print("=" * 80)
-        print(json.dumps(report, indent=4, ensure_ascii=False))
-        print("=" * 80)
+        logger.info("Final rapor", extra={"session_id": session_id,
+                                          "completed": len(report["completed_files"]),
+                                          "deleted": len(report["deleted_files"]),
+                                          "pending": len(report["pending_files"])})
+        # tam rapor yalnizca DEBUG seviyesinde yazilir
+        report_logger.debug("Final rapor icerigi", extra={"session_id": session_id, "report": report})
         
-        print("=" * 80)
-        print(f"JSON DOSYASI ICERIGI - {report_path.name}")
-        print("=" * 80)
-        try:
-            with open(report_path, 'r', encoding='utf-8') as f:
-                file_content = f.read()
-                print(file_content)
-        except Exception as e:
-            print(f"JSON dosyasi okunamadi: {e}")
-        print("=" * 80)
-        
-        await self.create_deleted_urls_file(session_id, deleted_files)
+        await self.create_deleted_urls_file(session_id, report["deleted_files"], remote_urls)
         
         await self.broadcast_message({
             "type": "report",
@@ -509,7 +1308,21 @@ class DownloadManager:
             "report": report
         })
         
+        await self.close_session(session_id)
+        if self.cluster is not None:
+            await self.cluster.finished(session_id)
+        
         return report
+    
+    async def close_session(self, session_id: str):
+        await self.state_store.finish_session(session_id)
+        self.report_engine.discard(session_id)
+        self.watchdog.clear_policy(session_id)
+        self.bandwidth.release_session(session_id)
+        self.paused_sessions.discard(session_id)
+        if self.cluster is not None:
+            # sahiplik birakilmadan once tam hali veritabanina yazilir; sonraki sorgular oradan okunur
+            await self.state_store.flush()
 
 download_manager = DownloadManager()
 
@@ -521,45 +1334,335 @@ async def root():
 async def get_urls():
     return {"urls": URL_LIST}
 
+def session_options(request: Optional[DownloadRequest]) -> Dict[str, Any]:
+    options = {}
+    if request is not None and request.stall_policy is not None:
+        if request.stall_policy.action not in STALL_ACTIONS:
+            raise HTTPException(status_code=400, detail=f"Invalid stall action: {request.stall_policy.action}")
+        options["stall_policy"] = dict(request.stall_policy)
+    if request is not None and request.bandwidth_limit is not None:
+        validate_rate(request.bandwidth_limit)
+        options["bandwidth_limit"] = request.bandwidth_limit
+    return options
+
+async def call_session(session_id: str, name: str, **args) -> Any:
+    try:
+        return await download_manager.call_session(session_id, name, **args)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Session owner did not respond")
+    except ClusterCallError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+
+def with_request_defaults(file_item: Dict[str, Any], request: Optional[DownloadRequest]) -> Dict[str, Any]:
+    if request is None:
+        return file_item
+    defaults = {}
+    if request.segments > 1 and not file_item.get('segments'):
+        defaults['segments'] = request.segments
+        defaults['min_segment_size'] = request.min_segment_size
+    if request.hash_algorithm != DEFAULT_HASH_ALGORITHM:
+        defaults['hash_algorithm'] = request.hash_algorithm
+    if request.compression != DEFAULT_COMPRESSION and not file_item.get('compression'):
+        defaults['compression'] = request.compression
+    return {**file_item, **defaults} if defaults else file_item
+
+def validate_rate(rate: Optional[int]):
+    if rate is not None and rate < 0:
+        raise HTTPException(status_code=400, detail=f"Invalid bandwidth rate: {rate}")
+
+def validate_hash_algorithm(algorithm: str):
+    if algorithm not in HASH_ALGORITHMS:
+        raise HTTPException(status_code=400, detail=f"Unsupported hash algorithm: {algorithm}")
+
+def validate_compression(compression: str):
+    if compression not in COMPRESSION_MODES:
+        raise HTTPException(status_code=400, detail=f"Unsupported compression mode: {compression}")
+
 @app.post("/api/download")
-async def start_download():
-    session_id = f"session_{int(time.time())}"
+async def start_download(request: Optional[DownloadRequest] = None):
+    if request is not None:
+        validate_hash_algorithm(request.hash_algorithm)
+        validate_compression(request.compression)
     
-    files_to_download = URL_LIST
+    if request is not None and request.files:
+        files_to_download = []
+        seen_ids = set()
+        for file_item in request.files:
+            error = validate_file_item(file_item.id, file_item.url)
+            if error is None and file_item.id in seen_ids:
+                error = f"duplicate id: {file_item.id}"
+            if error is None and file_item.checksum:
+                try:
+                    parse_checksum(file_item.checksum, request.hash_algorithm)
+                except ValueError as e:
+                    error = str(e)
+            if error is None and file_item.compression and file_item.compression not in COMPRESSION_MODES:
+                error = f"invalid compression: {file_item.compression!r}"
+            if error:
+                raise HTTPException(status_code=400, detail=error)
+            seen_ids.add(file_item.id)
+            files_to_download.append({key: value for key, value in dict(file_item).items() if value is not None})
+    else:
+        files_to_download = URL_LIST
     
-    tasks = []
-    for file_item in files_to_download:
-        task = asyncio.create_task(
-            download_manager.download_file(session_id, file_item['id'], file_item['url'])
-        )
-        tasks.append(task)
+    files_to_download = [with_request_defaults(file_item, request) for file_item in files_to_download]
+    options = session_options(request)
     
-    check_task = asyncio.create_task(
-        download_manager.check_stalled_files(session_id)
-    )
+    session_id = download_manager.new_session_id()
+    await download_manager.submit_session(session_id, files_to_download, options)
     
-    asyncio.gather(*tasks, return_exceptions=True)
+    if "stall_policy" in options:
+        stall_policy = WatchdogPolicy(**options["stall_policy"])
+    else:
+        stall_policy = download_manager.watchdog.policy_for(session_id)
     
     return {
         "status": "started",
         "session_id": session_id,
         "file_count": len(files_to_download),
         "check_interval": CHECK_INTERVAL_SECONDS,
+        "stall_policy": stall_policy.to_dict(),
+        "bandwidth_limit": request.bandwidth_limit if request is not None else None,
         "files": files_to_download
     }
 
+@app.post("/api/download/manifest")
+async def ingest_manifest(request: Request, format: Optional[str] = None,
+                          segments: int = 1, min_segment_size: int = MIN_SEGMENT_SIZE,
+                          hash_algorithm: str = DEFAULT_HASH_ALGORITHM, bandwidth_limit: Optional[int] = None,
+                          compression: str = DEFAULT_COMPRESSION):
+    validate_hash_algorithm(hash_algorithm)
+    validate_compression(compression)
+    validate_rate(bandwidth_limit)
+    try:
+        fmt = detect_format(request.headers.get("content-type"), format)
+    except ManifestError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    
+    parser = ManifestParser(fmt, hash_algorithm)
+    defaults = DownloadRequest(segments=segments, min_segment_size=min_segment_size, hash_algorithm=hash_algorithm,
+                               bandwidth_limit=bandwidth_limit, compression=compression)
+    options = session_options(defaults)
+    session_id = download_manager.new_session_id()
+    # tek surecte her satir hemen kuyruga girer; kume modunda satirlar paketlenip sahip worker'a gider
+    batch_size = CLUSTER_DISPATCH_BATCH if download_manager.cluster is not None else 1
+    batch = []
+    
+    try:
+        async for line in iter_lines(request.stream()):
+            file_item = parser.parse_line(line)
+            if file_item is not None:
+                batch.append(with_request_defaults(file_item, defaults))
+            if len(batch) >= batch_size:
+                await download_manager.submit_session(session_id, batch, options, finalize=False)
+                batch, options = [], None
+    except ManifestError as e:
+        logger.warning("Manifest okuma hatasi", extra={"session_id": session_id, "error": str(e)})
+        parser.errors.append({"line": parser.line_no + 1, "error": str(e)})
+    finally:
+        await download_manager.submit_session(session_id, batch, options)
+    
+    logger.info("Manifest alindi", extra={"session_id": session_id, "accepted": parser.accepted,
+                                          "duplicates": parser.duplicates, "invalid": parser.invalid})
+    
+    return {
+        "status": "started",
+        "session_id": session_id,
+        "file_count": parser.accepted,
+        **parser.summary()
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    return Response(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/api/pool/stats")
+async def get_pool_stats():
+    return download_manager.http_pool.stats()
+
+@app.get("/api/scheduler/stats")
+async def get_scheduler_stats():
+    return download_manager.scheduler.stats()
+
+@app.get("/api/watchdog/stats")
+async def get_watchdog_stats():
+    return download_manager.watchdog.stats()
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    return download_manager.content_cache.stats()
+
+@app.get("/api/bandwidth")
+async def get_bandwidth():
+    return download_manager.bandwidth.stats()
+
+@app.put("/api/bandwidth")
+async def set_bandwidth(config: BandwidthConfig):
+    for rate in (config.global_rate, config.default_host_rate, config.default_session_rate):
+        validate_rate(rate)
+    download_manager.bandwidth.configure(config.global_rate, config.default_host_rate, config.default_session_rate)
+    return download_manager.bandwidth.stats()
+
+@app.put("/api/bandwidth/hosts/{host}")
+async def set_host_bandwidth(host: str, limit: RateLimit):
+    validate_rate(limit.rate)
+    download_manager.bandwidth.set_host_rate(host.lower(), limit.rate)
+    return download_manager.bandwidth.stats()
+
+@app.put("/api/bandwidth/sessions/{session_id}")
+async def set_session_bandwidth(session_id: str, limit: RateLimit):
+    validate_rate(limit.rate)
+    stats = await call_session(session_id, "bandwidth", rate=limit.rate)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return stats
+
+def validate_transport(transport: Optional[str]):
+    if transport is None:
+        return
+    if transport not in TRANSPORTS:
+        raise HTTPException(status_code=400, detail=f"Unsupported transport: {transport}")
+    if transport == "h2" and not h2_available():
+        raise HTTPException(status_code=400, detail="HTTP/2 transport requires the h2 package")
+
+@app.get("/api/transports")
+async def get_transports():
+    return download_manager.transports.stats()
+
+@app.put("/api/transports")
+async def set_transports(config: TransportConfig):
+    validate_transport(config.default)
+    download_manager.transports.configure(config.default)
+    await download_manager.scheduler.limits_changed()
+    return download_manager.transports.stats()
+
+@app.put("/api/transports/hosts/{host}")
+async def set_host_transport(host: str, config: HostTransport):
+    validate_transport(config.transport)
+    download_manager.transports.set_host(host.lower(), config.transport)
+    await download_manager.scheduler.limits_changed()
+    return download_manager.transports.stats()
+
+@app.get("/api/concurrency")
+async def get_concurrency():
+    return download_manager.concurrency.stats()
+
+@app.put("/api/concurrency")
+async def set_concurrency(config: ConcurrencyConfig):
+    if config.enabled is not None:
+        download_manager.concurrency.enabled = config.enabled
+        await download_manager.scheduler.limits_changed()
+    return download_manager.concurrency.stats()
+
+@app.delete("/api/concurrency/hosts/{host}")
+async def reset_host_concurrency(host: str):
+    # ogrenilen sinir unutulur, host baslangic sinirindan yeniden olcer
+    download_manager.concurrency.reset(host.lower())
+    await download_manager.scheduler.limits_changed()
+    return download_manager.concurrency.stats()
+
+async def control_download(session_id: str, action: str, file_id: Optional[str] = None):
+    if action not in SESSION_ACTIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid action: {action}")
+    result = await call_session(session_id, action, file_id=file_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="File not found" if file_id is not None else "Session not found")
+    return result
+
+@app.post("/api/download/{session_id}/{action}")
+async def control_session(session_id: str, action: str):
+    return await control_download(session_id, action)
+
+@app.post("/api/download/{session_id}/files/{file_id}/{action}")
+async def control_file(session_id: str, file_id: str, action: str):
+    return await control_download(session_id, action, file_id)
+
+@app.get("/api/cluster/stats")
+async def get_cluster_stats():
+    if download_manager.cluster is None:
+        return {"mode": "single", "workers": 1}
+    return {"mode": "cluster", "workers": CLUSTER_WORKERS, **download_manager.cluster.stats()}
+
+@app.get("/api/retry/stats")
+async def get_retry_stats():
+    return {
+        "policy": download_manager.retry_policy.to_dict(),
+        "circuit_breakers": download_manager.breakers.stats()
+    }
+
 @app.get("/api/download/status/{session_id}")
 async def get_download_status(session_id: str):
-    if session_id in download_manager.active_downloads:
-        return {
-            "session_id": session_id,
-            "files": download_manager.active_downloads[session_id]
-        }
-    else:
+    status = await call_session(session_id, "status")
+    if status is None:
         raise HTTPException(status_code=404, detail="Session not found")
+    return status
+
+async def serve_completed_file(request: Request, file_path: pathlib.Path, info: Dict[str, Any]) -> Response:
+    try:
+        stat_result = await asyncio.to_thread(os.stat, file_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File data not found")
+    if info.get("size") is not None and stat_result.st_size != info["size"]:
+        # diskteki dosya bu kayda ait degilse kaydin ETag'i ile sunulmaz
+        logger.warning("Sunulan dosya kayitla uyusmuyor",
+                       extra={"path": str(file_path), "size": stat_result.st_size, "expected": info["size"]})
+        raise HTTPException(status_code=409, detail="File data does not match the download record")
+    headers = {}
+    if info.get("encoding"):
+        # store modunda dosya sunucudan geldigi gibi kodlanmis durur
+        headers["Content-Encoding"] = info["encoding"]
+    if info.get("checksum"):
+        # icerik ozeti degismedikce ETag de degismez; If-Range de ayni degerle karsilastirilir
+        headers["ETag"] = f'"{info["checksum"]}"'
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+    return ArtifactResponse(file_path, headers=headers, media_type="application/octet-stream", stat_result=stat_result)
+
+def serve_partial_file(request: Request, session_id: str, file_id: str, file_path: pathlib.Path,
+                       info: Dict[str, Any]) -> Response:
+    # inmekte olan dosya yazildikca akar; toplam boyut bilinmiyorsa Range yok sayilir
+    total_size = info.get("total_size") or 0
+    start, end, status_code = 0, None, 200
+    headers = {"Cache-Control": "no-store", "X-Download-Status": info["status"],
+               "Accept-Ranges": "bytes" if total_size else "none"}
+    if info.get("encoding"):
+        headers["Content-Encoding"] = info["encoding"]
+    if total_size:
+        end = total_size
+        range_header = request.headers.get("range")
+        if range_header:
+            span = parse_range(range_header, total_size)
+            if span is None:
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{total_size}"})
+            start, end = span
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end - 1}/{total_size}"
+        headers["Content-Length"] = str(end - start)
+    if request.method == "HEAD":
+        return Response(status_code=status_code, headers=headers, media_type="application/octet-stream")
+    
+    async def fetch(offset: int) -> Optional[Dict[str, Any]]:
+        return await call_session(session_id, "file", file_id=file_id, offset=offset)
+    
+    return TailResponse(tail_file(file_path, start, end, fetch), file_path, status_code=status_code, headers=headers,
+                        media_type="application/octet-stream")
+
+@app.api_route("/api/files/{session_id}/{file_id}", methods=["GET", "HEAD"])
+async def serve_file(session_id: str, file_id: str, request: Request):
+    info = await call_session(session_id, "file", file_id=file_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    file_path = download_manager.artifact_path(session_id, file_id)
+    if info["status"] == "completed":
+        return await serve_completed_file(request, file_path, info)
+    if info["status"] not in FILE_TAIL_STATUSES:
+        raise HTTPException(status_code=409, detail=f"File is {info['status']}")
+    return serve_partial_file(request, session_id, file_id, file_path, info)
 
 @app.get("/api/report/{session_id}")
 async def get_report(session_id: str):
+    await download_manager.report_engine.flush_if_dirty(session_id)
     report_path = download_manager.download_dir / f"download_report_{session_id}.json"
     
     if report_path.exists():
@@ -591,61 +1694,116 @@ async def get_deleted_urls(session_id: str):
         raise HTTPException(status_code=404, detail="Deleted URLs file not found")
 
 @app.get("/api/reports")
-async def list_reports():
-    reports = []
-    for report_file in [f for f in download_manager.download_dir.iterdir() if f.name.startswith("download_report_") and f.name.endswith(".json")]:
-        report_file_path = report_file
-        with open(report_file_path, 'r', encoding='utf-8') as f:
-            report_data = json.load(f)
-            reports.append({
-                "filename": report_file.name,
-                "session_id": report_file.stem.replace("download_report_", ""),
-                "data": report_data
-            })
+async def list_reports(limit: int = 50, offset: int = 0, since: Optional[float] = None, until: Optional[float] = None,
+                       status: Optional[str] = None, file_status: Optional[str] = None):
+    if status not in (None, "running", "finished"):
+        raise HTTPException(status_code=400, detail=f"Invalid status filter: {status}")
+    limit = max(1, min(limit, REPORT_PAGE_MAX))
+    
+    total, summaries = await download_manager.state_store.query_reports(
+        limit=limit,
+        offset=offset,
+        since=since,
+        until=until,
+        finished=None if status is None else status == "finished",
+        file_status=file_status
+    )
     
-    return {"reports": reports}
+    return {
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "reports": [
+            {
+                **summary,
+                "filename": f"download_report_{summary['session_id']}.json",
+                "report_url": f"/api/report/{summary['session_id']}"
+            }
+            for summary in summaries
+        ]
+    }
 
 @app.get("/api/reports/print/{session_id}")
 async def print_report(session_id: str):
-    report_path = download_manager.download_dir / f"download_report_{session_id}.json"
-    
-    if not report_path.exists():
-        raise HTTPException(status_code=404, detail="Report not found")
-    
-    with open(report_path, 'r', encoding='utf-8') as f:
-        report_data = json.load(f)
+    if session_id in download_manager.report_engine.sessions:
+        report_data = download_manager.report_engine.sessions[session_id].snapshot()
+    else:
+        report_path = download_manager.download_dir / f"download_report_{session_id}.json"
+        
+        if not report_path.exists():
+            raise HTTPException(status_code=404, detail="Report not found")
+        
+        report_data = await asyncio.to_thread(lambda: json.loads(report_path.read_text(encoding='utf-8')))
     
-    print("=" * 80)
-    print(f"INDIRME RAPORU - Session ID: {session_id}")
-    print("=" * 80)
-    print(json.dumps(report_data, indent=4, ensure_ascii=False))
-    print("=" * 80)
+    report_logger.info("Indirme raporu", extra={"session_id": session_id, "report": report_data})
     
     return {
         "message": f"Rapor konsola yazdırıldı - Session ID: {session_id}",
         "report": report_data
     }
 
+@app.get("/api/logging")
+async def get_logging():
+    return log_levels()
+
+@app.put("/api/logging")
+async def update_logging(config: LogLevel):
+    try:
+        set_log_level(config.level, config.logger)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail=f"Invalid log level: {config.level}")
+    return log_levels()
+
+@app.get("/api/ws/stats")
+async def get_websocket_stats():
+    return download_manager.broadcast_hub.stats()
+
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(websocket: WebSocket, session_id: Optional[str] = None):
     await websocket.accept()
-    download_manager.websocket_connections.append(websocket)
+    channel = download_manager.broadcast_hub.register(websocket, session_id)
     
     try:
         while True:
             data = await websocket.receive_text()
             
             if data == "ping":
-                await websocket.send_json({"type": "pong"})
+                channel.send_direct({"type": "pong"})
+                continue
+            
+            try:
+                command = json.loads(data)
+            except ValueError:
+                continue
+            if not isinstance(command, dict):
+                continue
+            
+            if command.get("action") == "subscribe":
+                channel.subscribe(command.get("session_id"))
+                channel.send_direct({"type": "subscribed", "session_id": command.get("session_id")})
+            elif command.get("action") == "unsubscribe" and command.get("session_id"):
+                channel.unsubscribe(command["session_id"])
+                channel.send_direct({"type": "unsubscribed", "session_id": command["session_id"]})
     
     except WebSocketDisconnect:
-        download_manager.websocket_connections.remove(websocket)
+        download_manager.broadcast_hub.unregister(channel)
     except Exception as e:
-        print(f"WebSocket error: {e}")
-        if websocket in download_manager.websocket_connections:
-            download_manager.websocket_connections.remove(websocket)
+        logger.warning("WebSocket hatasi", extra={"error": str(e)})
+        download_manager.broadcast_hub.unregister(channel)
+
+async def recover_state():
+    store = SQLiteStateStore(download_manager.download_dir / STATE_DB_NAME)
+    await store.open()
+    await store.close()
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if CLUSTER_WORKERS > 1:
+        asyncio.run(recover_state())
+        socket_path = str(download_manager.download_dir / CLUSTER_SOCKET_NAME)
+        os.environ[CLUSTER_SOCKET_ENV] = socket_path
+        start_coordinator(socket_path)
+        uvicorn.run("backend:app", host="0.0.0.0", port=8000, workers=CLUSTER_WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
 
@@ -0,0 +1,540 @@
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import pathlib
+import platform
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import Counter as TypeCounter
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+BENCH_ROOT = pathlib.Path(__file__).parent
+BENCH_LAG_INTERVAL = 0.05
+BENCH_SERVER_START_TIMEOUT = 10.0
+BENCH_DEFAULT_SCENARIOS = ("small", "medium", "large", "segmented", "latency", "flaky", "compressed", "resume",
+                           "cancel")
+BENCH_SESSION_ID = "bench_session"
+
+# her senaryo ayri bir surecte calisir; tepe RSS ve metrikler birbirine karismaz
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    "small": {"files": 10000, "size": "4k"},
+    "medium": {"files": 1000, "size": "256k"},
+    "large": {"files": 8, "size": "32m"},
+    "segmented": {"files": 4, "size": "64m", "segments": 4},
+    "latency": {"files": 2000, "size": "16k", "latency": 0.05},
+    "flaky": {"files": 2000, "size": "16k", "error_rate": 0.05},
+    "throttled": {"files": 40, "size": "1m", "rate": "2m"},
+    # her dosya takilir; watchdog hepsini 'stalled' olarak birakmali
+    "stalled": {"files": 20, "size": "1m", "stall": "256k", "expect": "stalled"},
+    # ilk yonetici yarida kapatilir; ikincisi ayni oturumu gunlukten devam ettirip kalan byte'lari indirir
+    "resume": {"files": 8, "size": "8m", "rate": "4m", "interrupt_after": 1.0},
+    # oturum inerken iptal edilir; kuyrukta ve ucusta is kalmamali
+    "cancel": {"files": 200, "size": "1m", "rate": "512k", "cancel_after": 0.5, "expect": "cancelled"},
+    "manifest-100k": {"files": 100000, "size": "1k"},
+    # her URL iki kez istenir (decode ve store); her dorduncu URL'nin ilk iki yaniti 128k'da kopar ve devam
+    # istegi kodlamayi sabitler. Kopmalar seyrek tutulur, ardisik hatalar devre kesiciyi acmasin
+    "compressed": {"files": 200, "size": "1m", "encoding": ("gzip", "deflate"), "drop": "128k", "drops": 2,
+                   "drop_every": 4, "compression": ("decode", "store")},
+}
+
+COMPARE_FIELDS = ("elapsed_seconds", "files_per_sec", "mb_per_sec", "peak_rss_mb", "loop_lag_p99_ms",
+                  "ws_messages_per_sec")
+# bu alanlarda dusus iyilesmedir
+LOWER_IS_BETTER = {"elapsed_seconds", "peak_rss_mb", "loop_lag_p99_ms"}
+
+
+def scenario_url(server: str, spec: Dict[str, Any], index: int) -> str:
+    params = [f"n={index}"]
+    for key in ("latency", "rate", "stall", "drop", "drops", "error_rate", "encoding"):
+        value = spec.get(key)
+        if key in ("drop", "drops") and index % spec.get("drop_every", 1):
+            continue
+        if isinstance(value, (list, tuple)):
+            value = value[index % len(value)]
+        if value:
+            params.append(f"{key}={value}")
+    return f"{server}/bytes/{spec['size']}?{'&'.join(params)}"
+
+
+def scenario_files(server: str, spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    modes = spec.get("compression")
+    if not modes:
+        return [{"id": f"bench_{i}", "url": scenario_url(server, spec, i), "segments": spec.get("segments")}
+                for i in range(spec["files"])]
+    # ayni URL her modda bir kez istenir; onbellek ve es zamanli indirme paylasimi modlari karistirmamali
+    return [{"id": f"bench_{i}", "url": scenario_url(server, spec, i // len(modes)),
+             "compression": modes[i % len(modes)]}
+            for i in range(spec["files"])]
+
+
+def verify_stored(path_for: Callable[[str], pathlib.Path], spec: Dict[str, Any], files: List[Dict[str, Any]],
+                  table, progress: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+    # decode modunda diskte acik metin, store modunda sunucunun kodladigi byte'lar olmali
+    from mock_server import encoded_payload, parse_size, text_payload
+
+    size = parse_size(spec["size"])
+    encodings = spec["encoding"]
+    plain = text_payload(0, size)
+    counts = {"matched": 0, "mismatched": 0, "missing": 0, "progress_mismatch": 0}
+    for index, item in enumerate(files):
+        path = path_for(item["id"])
+        if not path.exists():
+            counts["missing"] += 1
+            continue
+        encoding = encodings[(index // len(spec["compression"])) % len(encodings)]
+        expected = plain if item["compression"] == "decode" else encoded_payload(size, encoding)
+        counts["matched" if path.read_bytes() == expected else "mismatched"] += 1
+        # WebSocket'e giden son ilerleme durum API'siyle ayni byte sayilarini tasimali
+        record = table[item["id"]].to_dict()
+        last = progress.get(item["id"], {})
+        if (last.get("size"), last.get("wire_size")) != (record["size"], record["wire_size"]):
+            counts["progress_mismatch"] += 1
+    return counts
+
+
+def verify_payloads(path_for: Callable[[str], pathlib.Path], spec: Dict[str, Any], files: List[Dict[str, Any]],
+                    table) -> Dict[str, int]:
+    # sikistirmasiz senaryolarda tamamlanan her dosya sunucunun urettigi byte'lar ve kayitli ozetle karsilastirilir
+    from mock_server import parse_size, payload
+
+    expected = payload(0, parse_size(spec["size"]))
+    digests: Dict[str, Optional[str]] = {}
+    counts = {"verified": 0, "mismatched": 0, "missing": 0, "checksum_mismatch": 0}
+    for item in files:
+        record = table[item["id"]]
+        if record["status"] != "completed":
+            continue
+        path = path_for(item["id"])
+        if not path.exists():
+            counts["missing"] += 1
+            continue
+        counts["verified" if path.read_bytes() == expected else "mismatched"] += 1
+        algorithm = (record["checksum"] or "").partition(":")[0]
+        if algorithm not in digests:
+            digests[algorithm] = f"{algorithm}:{hashlib.new(algorithm, expected).hexdigest()}" \
+                if algorithm in hashlib.algorithms_available else None
+        if record["checksum"] != digests[algorithm]:
+            counts["checksum_mismatch"] += 1
+    return counts
+
+
+def check(name: str, actual: Any, expected: Any, ok: Optional[bool] = None) -> Dict[str, Any]:
+    return {"name": name, "ok": actual == expected if ok is None else ok, "expected": expected, "actual": actual}
+
+
+def outcome_checks(spec: Dict[str, Any], report: Dict[str, Any], table) -> List[Dict[str, Any]]:
+    statuses = TypeCounter(record["status"] for record in (table[file_id] for file_id in table.keys()))
+    expect = spec.get("expect", "completed")
+    if expect == "cancelled":
+        # iptalden once biten dosyalar tamamlanmis sayilir; baska bir sonuc kalmamali
+        return [
+            check("cancelled", statuses["cancelled"], "> 0", ok=statuses["cancelled"] > 0),
+            check("unfinished", spec["files"] - statuses["cancelled"] - statuses["completed"], 0),
+        ]
+    bucket = "deleted_files" if expect == "stalled" else "completed_files"
+    return [check(f"{expect}_count", len(report[bucket]), spec["files"])]
+
+
+class LagRecorder:
+    # LoopLagMonitor'a histogram yerine verilir; yuzdelikler icin ham ornekleri tutar
+    def __init__(self):
+        self.samples: List[float] = []
+
+    def observe(self, value: float):
+        self.samples.append(value)
+
+    def summary(self) -> Dict[str, float]:
+        if not self.samples:
+            return {"loop_lag_p50_ms": 0.0, "loop_lag_p99_ms": 0.0, "loop_lag_max_ms": 0.0}
+        ordered = sorted(self.samples)
+        pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+        return {
+            "loop_lag_p50_ms": round(pick(0.5), 2),
+            "loop_lag_p99_ms": round(pick(0.99), 2),
+            "loop_lag_max_ms": round(ordered[-1] * 1000, 2),
+        }
+
+
+class CountingSocket:
+    # hub'a gercek bir WebSocket gibi kaydedilir; gonderilen mesajlari sayar
+    def __init__(self):
+        self.messages = 0
+        self.types: TypeCounter = TypeCounter()
+        self.progress: Dict[str, Dict[str, Any]] = {}
+
+    async def send_json(self, message: Dict[str, Any]):
+        self.messages += 1
+        self.types[message.get("type")] += 1
+        if message.get("type") == "progress" and "size" in message:
+            self.progress[message["file_id"]] = message
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux KiB, macOS bayt dondurur
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def server_stats(server: str, reset: bool = False) -> Dict[str, Any]:
+    request = urllib.request.Request(f"{server}/stats/reset" if reset else f"{server}/stats",
+                                     method="POST" if reset else "GET")
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return json.load(response)
+
+
+async def interrupt_manager(spec: Dict[str, Any], files: List[Dict[str, Any]], transport: str):
+    # oturum indirilirken yonetici kapatilir; diskte kismi dosyalar ve devam gunlukleri kalir
+    import backend
+
+    manager = backend.DownloadManager()
+    manager.transports.configure(transport)
+    await manager.start()
+    try:
+        await manager.enqueue_session(BENCH_SESSION_ID, files)
+        await asyncio.sleep(spec["interrupt_after"])
+    finally:
+        await manager.close()
+
+
+async def cancel_after(manager, session_id: str, delay: float):
+    await asyncio.sleep(delay)
+    await manager.cancel_files(session_id)
+
+
+async def run_manager(server: str, spec: Dict[str, Any], workdir: pathlib.Path,
+                      transport: str = "http1") -> Dict[str, Any]:
+    import backend
+    from metrics import BYTES_DOWNLOADED, LoopLagMonitor
+
+    backend.DOWNLOAD_DIR = workdir
+    files = scenario_files(server, spec)
+    if spec.get("interrupt_after"):
+        await interrupt_manager(spec, files, transport)
+    manager = backend.DownloadManager()
+    manager.transports.configure(transport)
+    await manager.start()
+    lag = LagRecorder()
+    monitor = LoopLagMonitor(BENCH_LAG_INTERVAL, lag)
+    socket_counter = CountingSocket()
+    manager.broadcast_hub.register(socket_counter)
+
+    bytes_before = BYTES_DOWNLOADED.children[()].value
+    canceller = None
+    await monitor.start()
+    started = time.perf_counter()
+    try:
+        session_id = BENCH_SESSION_ID if spec.get("interrupt_after") else manager.new_session_id()
+        await manager.enqueue_session(session_id, files)
+        if spec.get("cancel_after"):
+            canceller = asyncio.create_task(cancel_after(manager, session_id, spec["cancel_after"]))
+        report = await manager.finalize_session_report(session_id)
+        # son rapor mesajinin da istemciye ulasmasi beklenir
+        while manager.broadcast_hub.stats()["pending"] or any(channel.pending
+                                                             for channel in manager.broadcast_hub.channels):
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        # h2 baglanti istatistikleri kapanista silinir
+        transports = manager.transports.stats()
+        table = manager.state_store.files(session_id)
+        path_for = lambda file_id: manager.artifact_path(session_id, file_id)
+        checks = outcome_checks(spec, report, table)
+        stored = None
+        if spec.get("compression"):
+            stored = {**verify_stored(path_for, spec, files, table, socket_counter.progress),
+                      "bytes": table.summary()["bytes"], "wire_bytes": table.summary()["wire_bytes"]}
+            checks += [check("stored_matched", stored["matched"], len(files)),
+                       check("progress_mismatch", stored["progress_mismatch"], 0)]
+        else:
+            verified = verify_payloads(path_for, spec, files, table)
+            completed = len(report["completed_files"])
+            checks += [check("bytes_verified", verified["verified"], completed),
+                       check("checksum_mismatch", verified["checksum_mismatch"], 0)]
+        scheduler = manager.scheduler.stats()
+        checks += [check("scheduler_pending", scheduler["queue_depth"] + scheduler["delayed"], 0),
+                   check("scheduler_in_flight", scheduler["in_flight"], 0)]
+        if spec.get("interrupt_after"):
+            # devam eden oturum dosyalarin tamamini yeniden indirmemeli
+            from mock_server import parse_size
+            downloaded = int(BYTES_DOWNLOADED.children[()].value - bytes_before)
+            full = len(files) * parse_size(spec["size"])
+            checks.append(check("resumed_bytes", downloaded, f"< {full}", ok=downloaded < full))
+    finally:
+        if canceller is not None:
+            canceller.cancel()
+        await monitor.stop()
+        await manager.close()
+
+    return {
+        "elapsed": elapsed,
+        "completed": len(report["completed_files"]),
+        "failed": len(report["pending_files"]),
+        "stalled": len(report["deleted_files"]),
+        "bytes": int(BYTES_DOWNLOADED.children[()].value - bytes_before),
+        "lag": lag.summary(),
+        "ws_messages": socket_counter.messages,
+        "ws_types": dict(socket_counter.types),
+        "hub": {key: manager.broadcast_hub.stats()[key] for key in ("published", "coalesced", "sent")},
+        "scheduler": manager.scheduler.stats(),
+        "transports": transports,
+        "stored": stored,
+        "checks": checks,
+    }
+
+
+async def run_cli(server: str, spec: Dict[str, Any], workdir: pathlib.Path,
+                  transport: str = "http1") -> Dict[str, Any]:
+    from metrics import LoopLagMonitor
+    from url_downloader import FileDownloader
+
+    downloader = FileDownloader(download_dir=str(workdir))
+    lag = LagRecorder()
+    monitor = LoopLagMonitor(BENCH_LAG_INTERVAL, lag)
+    files = [{"id": f"bench_{i}", "url": scenario_url(server, spec, i)} for i in range(spec["files"])]
+    await monitor.start()
+    started = time.perf_counter()
+    try:
+        await downloader.start_downloads(files)
+        elapsed = time.perf_counter() - started
+    finally:
+        await monitor.stop()
+
+    statuses = TypeCounter(downloader.download_status.values())
+    # CLI istemcisinde kesme ve iptal yok; yalnizca tamamlanma sayisi dogrulanir
+    checks = [check("completed_count", statuses["completed"], spec["files"])] \
+        if spec.get("expect", "completed") == "completed" else []
+    return {
+        "elapsed": elapsed,
+        "completed": statuses["completed"],
+        "failed": statuses["failed"],
+        "stalled": 0,
+        "bytes": sum(downloader.file_sizes.values()),
+        "lag": lag.summary(),
+        "ws_messages": None,
+        "checks": checks,
+    }
+
+
+def run_scenario(name: str, server: str, client: str, files: Optional[int], transport: str = "http1",
+                 h2_server: Optional[str] = None) -> Dict[str, Any]:
+    spec = dict(SCENARIOS[name])
+    if files:
+        spec["files"] = files
+    workdir = pathlib.Path(tempfile.mkdtemp(prefix=f"bench_{name}_"))
+    server_stats(server, reset=True)
+    cpu_before = cpu_seconds()
+    try:
+        runner = run_manager if client == "manager" else run_cli
+        # istatistikler her zaman HTTP/1.1 adresinden okunur, dosyalar h2c adresinden iner
+        result = asyncio.run(runner(h2_server if transport == "h2" else server, spec, workdir, transport))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    elapsed = result["elapsed"]
+    summary = {
+        "params": spec,
+        "client": client,
+        "transport": transport,
+        "elapsed_seconds": round(elapsed, 3),
+        "completed": result["completed"],
+        "failed": result["failed"],
+        "stalled": result["stalled"],
+        "bytes": result["bytes"],
+        "files_per_sec": round(result["completed"] / elapsed, 1) if elapsed else 0.0,
+        "mb_per_sec": round(result["bytes"] / elapsed / 1e6, 2) if elapsed else 0.0,
+        "cpu_seconds": round(cpu_seconds() - cpu_before, 2),
+        "peak_rss_mb": peak_rss_mb(),
+        **result["lag"],
+        "ws_messages": result["ws_messages"],
+        "ws_messages_per_sec": round(result["ws_messages"] / elapsed, 1)
+        if result["ws_messages"] is not None and elapsed else None,
+        "server": server_stats(server),
+    }
+    for key in ("ws_types", "hub", "scheduler", "transports", "stored", "checks"):
+        if result.get(key) is not None:
+            summary[key] = result[key]
+    return summary
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mock_server(h2: bool = False) -> Tuple[subprocess.Popen, str, Optional[str]]:
+    port = free_port()
+    command = [sys.executable, str(BENCH_ROOT / "mock_server.py"), "--port", str(port)]
+    h2_server = None
+    if h2:
+        h2_port = free_port()
+        command += ["--h2-port", str(h2_port)]
+        h2_server = f"http://127.0.0.1:{h2_port}"
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    server = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + BENCH_SERVER_START_TIMEOUT
+    while True:
+        try:
+            server_stats(server)
+            return process, server, h2_server
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError("Sahte sunucu baslatilamadi")
+            time.sleep(0.1)
+
+
+def git_revision() -> Dict[str, Any]:
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=BENCH_ROOT, capture_output=True, text=True).stdout.strip()
+    try:
+        return {"commit": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "-uno"))}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+def run_isolated(name: str, server: str, client: str, files: Optional[int], transport: str = "http1",
+                 h2_server: Optional[str] = None) -> Dict[str, Any]:
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as handle:
+        result_path = handle.name
+    env = dict(os.environ, LOG_LEVEL=os.environ.get("BENCH_LOG_LEVEL", "ERROR"))
+    command = [sys.executable, str(BENCH_ROOT / "benchmark.py"), "--child", name, "--server", server,
+               "--client", client, "--transport", transport, "--result-file", result_path]
+    if files:
+        command += ["--files", str(files)]
+    if h2_server:
+        command += ["--h2-server", h2_server]
+    try:
+        # alt surecin konsol ciktisi JSON sonucuna karismasin diye stderr'e yonlendirilir
+        completed = subprocess.run(command, env=env, cwd=BENCH_ROOT, stdout=sys.stderr)
+        if completed.returncode != 0:
+            return {"error": f"exit code {completed.returncode}"}
+        with open(result_path, encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        os.unlink(result_path)
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    lines = [f"Karsilastirma: {(baseline.get('commit') or '?')[:10]} -> {(current.get('commit') or '?')[:10]}"]
+    for name, result in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before or "error" in before or "error" in result:
+            continue
+        lines.append(f"  {name}" if before.get("params") == result.get("params")
+                     else f"  {name} (parametreler farkli, karsilastirma yaniltici olabilir)")
+        for field in COMPARE_FIELDS:
+            old, new = before.get(field), result.get(field)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old * 100 if old else 0.0
+            better = change < 0 if field in LOWER_IS_BETTER else change > 0
+            marker = "+" if better and abs(change) >= 5 else "-" if abs(change) >= 5 else " "
+            lines.append(f"    {marker} {field:<22} {old:>12} -> {new:>12} ({change:+.1f}%)")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Yerel sahte sunucuya karsi indirme benchmark'i")
+    parser.add_argument("scenarios", nargs="*", help=f"senaryolar: {', '.join(SCENARIOS)}")
+    parser.add_argument("--client", choices=("manager", "cli"), default="manager")
+    parser.add_argument("--files", type=int, help="senaryodaki dosya sayisini ezer")
+    parser.add_argument("--server", help="calisan bir mock_server adresi; verilmezse otomatik baslatilir")
+    parser.add_argument("--transport", choices=("http1", "h2"), default="http1",
+                        help="manager istemcisinin tasimasi; h2 icin sahte sunucu h2c de dinler")
+    parser.add_argument("--h2-server", help="--server ile birlikte, calisan mock_server'in h2c adresi")
+    parser.add_argument("--output", help="JSON sonuc dosyasi; verilmezse stdout")
+    parser.add_argument("--compare", help="onceki bir sonuc dosyasi ile karsilastir")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_scenario(args.child, args.server, args.client, args.files, args.transport, args.h2_server)
+        with open(args.result_file, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        return
+
+    names = args.scenarios or list(BENCH_DEFAULT_SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"bilinmeyen senaryo: {', '.join(unknown)}")
+
+    if args.transport == "h2" and args.client != "manager":
+        parser.error("--transport h2 yalnizca manager istemcisiyle kullanilabilir")
+    if args.transport == "h2" and args.server and not args.h2_server:
+        parser.error("--transport h2 ve --server birlikte verilirse --h2-server de gerekir")
+    mock, server, h2_server = (None, args.server, args.h2_server) if args.server \
+        else start_mock_server(args.transport == "h2")
+    results = {
+        **git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "client": args.client,
+        "transport": args.transport,
+        "scenarios": {},
+    }
+    try:
+        for name in names:
+            print(f"Senaryo calisiyor: {name}", file=sys.stderr, flush=True)
+            result = results["scenarios"][name] = run_isolated(name, server, args.client, args.files, args.transport,
+                                                               h2_server)
+            if "error" in result:
+                print(f"  basarisiz: {result['error']}", file=sys.stderr)
+            else:
+                print(f"  {result['completed']} dosya, {result['elapsed_seconds']} sn, "
+                      f"{result['files_per_sec']} dosya/sn, {result['mb_per_sec']} MB/sn, "
+                      f"RSS {result['peak_rss_mb']} MB, lag p99 {result['loop_lag_p99_ms']} ms",
+                      file=sys.stderr, flush=True)
+                if result.get("stored"):
+                    print(f"  dogrulama: {result['stored']}", file=sys.stderr, flush=True)
+                for item in result.get("checks", []):
+                    if not item["ok"]:
+                        print(f"  KONTROL BASARISIZ: {item['name']}: beklenen {item['expected']}, "
+                              f"olculen {item['actual']}", file=sys.stderr, flush=True)
+    finally:
+        if mock is not None:
+            mock.terminate()
+            mock.wait()
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print("\n".join(compare(baseline, results)), file=sys.stderr)
+
+    # senaryo kontrollerinden biri tutmazsa ya da senaryo calismazsa CI'da basarisiz sayilir
+    failed = [name for name, result in results["scenarios"].items()
+              if "error" in result or not all(item["ok"] for item in result.get("checks", []))]
+    if failed:
+        print(f"Basarisiz senaryolar: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
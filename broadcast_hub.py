@@ -0,0 +1,198 @@
+
+import asyncio
+import itertools
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set
+
+from fastapi import WebSocket
+
+from metrics import BROADCAST_LATENCY
+from structured_logging import get_logger
+
+BROADCAST_TICK_SECONDS = 0.25
+CLIENT_MAX_PENDING = 20000
+CLIENT_SEND_TIMEOUT = 10.0
+
+logger = get_logger("broadcast")
+
+
+def message_key(message: Dict[str, Any], seq: int) -> Hashable:
+    # ayni dosyanin ilerleme mesajlari tek anahtarda birlesir, digerleri sirayla gider
+    if message.get("type") == "progress" and message.get("file_id") is not None:
+        return ("progress", message.get("session_id"), message["file_id"])
+    return ("event", seq)
+
+
+class ClientChannel:
+    def __init__(self, hub: "BroadcastHub", websocket: WebSocket, sessions: Optional[Set[str]] = None):
+        self.hub = hub
+        self.websocket = websocket
+        self.sessions = sessions
+        self.pending: Dict[Hashable, Dict[str, Any]] = {}
+        self.pending_since: Optional[float] = None
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.sent = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def accepts(self, message: Dict[str, Any]) -> bool:
+        if self.sessions is None:
+            return True
+        session_id = message.get("session_id")
+        return session_id is None or session_id in self.sessions
+
+    def subscribe(self, session_id: Optional[str]):
+        if session_id is None:
+            self.sessions = None
+        elif self.sessions is None:
+            self.sessions = {session_id}
+        else:
+            self.sessions.add(session_id)
+
+    def unsubscribe(self, session_id: str):
+        if self.sessions is not None:
+            self.sessions.discard(session_id)
+
+    def offer(self, batch: Dict[Hashable, Dict[str, Any]], published_at: float) -> bool:
+        for key, message in batch.items():
+            if not self.accepts(message):
+                continue
+            if self.pending_since is None:
+                self.pending_since = published_at
+            if key in self.pending:
+                del self.pending[key]
+                self.hub.coalesced += 1
+            self.pending[key] = message
+
+        if len(self.pending) > self.hub.client_max_pending:
+            return False
+        if self.pending:
+            self.ready.set()
+        return True
+
+    def send_direct(self, message: Dict[str, Any]):
+        self.pending[("direct", next(self.hub._seq))] = message
+        if self.pending_since is None:
+            self.pending_since = time.monotonic()
+        self.ready.set()
+
+    async def run(self):
+        try:
+            while not self.closed:
+                await self.ready.wait()
+                self.ready.clear()
+                batch, self.pending = self.pending, {}
+                published_at, self.pending_since = self.pending_since, None
+                for message in batch.values():
+                    await asyncio.wait_for(self.websocket.send_json(message), self.hub.send_timeout)
+                    self.sent += 1
+                    self.hub.sent += 1
+                if batch and published_at is not None:
+                    # partideki en eski mesajin yayinlanmasindan gonderimin bitmesine kadar
+                    BROADCAST_LATENCY.observe(time.monotonic() - published_at)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.hub.unregister(self, dropped=True)
+
+
+class BroadcastHub:
+    def __init__(self, tick_seconds: float = BROADCAST_TICK_SECONDS,
+                 client_max_pending: int = CLIENT_MAX_PENDING,
+                 send_timeout: float = CLIENT_SEND_TIMEOUT):
+        self.tick_seconds = tick_seconds
+        self.client_max_pending = client_max_pending
+        self.send_timeout = send_timeout
+
+        self.channels: List[ClientChannel] = []
+        self._pending: Dict[Hashable, Dict[str, Any]] = {}
+        self._pending_since = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._ticker: Optional[asyncio.Task] = None
+        self._seq = itertools.count()
+        # kume modunda yerel yayinlar diger worker'lara da aktarilir
+        self.relay: Optional[Callable[[Dict[str, Any]], None]] = None
+
+        self.published = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped_clients = 0
+
+    async def start(self):
+        if self._ticker is None:
+            self._wakeup = asyncio.Event()
+            self._ticker = asyncio.create_task(self._tick_loop(), name="broadcast-hub")
+
+    async def stop(self):
+        if self._ticker is not None:
+            self._ticker.cancel()
+            await asyncio.gather(self._ticker, return_exceptions=True)
+            self._ticker = None
+        for channel in list(self.channels):
+            self.unregister(channel)
+
+    def register(self, websocket: WebSocket, session_id: Optional[str] = None) -> ClientChannel:
+        channel = ClientChannel(self, websocket, {session_id} if session_id else None)
+        channel.task = asyncio.create_task(channel.run())
+        self.channels.append(channel)
+        return channel
+
+    def unregister(self, channel: ClientChannel, dropped: bool = False):
+        if channel.closed:
+            return
+        channel.closed = True
+        if dropped:
+            self.dropped_clients += 1
+        if channel in self.channels:
+            self.channels.remove(channel)
+        if channel.task is not None and channel.task is not asyncio.current_task():
+            channel.task.cancel()
+        if dropped:
+            asyncio.create_task(self._close_quietly(channel.websocket))
+
+    @staticmethod
+    async def _close_quietly(websocket: WebSocket):
+        try:
+            await websocket.close(code=1013)
+        except Exception:
+            pass
+
+    def publish(self, message: Dict[str, Any], local: bool = False):
+        if self.relay is not None and not local:
+            self.relay(message)
+        if not self.channels:
+            return
+        self.published += 1
+        key = message_key(message, next(self._seq))
+        if not self._pending:
+            self._pending_since = time.monotonic()
+        if key in self._pending:
+            del self._pending[key]
+            self.coalesced += 1
+        self._pending[key] = message
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _tick_loop(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            batch, self._pending = self._pending, {}
+            for channel in list(self.channels):
+                if not channel.offer(batch, self._pending_since):
+                    logger.warning("WebSocket istemcisi cok yavas, baglanti kapatiliyor",
+                                   extra={"backlog": len(channel.pending)})
+                    self.unregister(channel, dropped=True)
+            await asyncio.sleep(self.tick_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "clients": len(self.channels),
+            "tick_seconds": self.tick_seconds,
+            "published": self.published,
+            "coalesced": self.coalesced,
+            "dropped_clients": self.dropped_clients,
+            "pending": len(self._pending),
+            "client_backlog": [len(channel.pending) for channel in self.channels],
+            "sent": self.sent,
+        }
@@ -0,0 +1,501 @@
+
+import asyncio
+import itertools
+import json
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from broadcast_hub import message_key
+from structured_logging import get_logger
+
+CLUSTER_WORKERS = int(os.environ.get("DOWNLOADER_WORKERS", "1"))
+CLUSTER_SOCKET_ENV = "DOWNLOADER_CLUSTER_SOCKET"
+CLUSTER_SOCKET_NAME = ".cluster.sock"
+CLUSTER_RELAY_SECONDS = 0.25
+CLUSTER_CALL_TIMEOUT = 5.0
+CLUSTER_DISPATCH_BATCH = 200
+CLUSTER_CONNECT_TIMEOUT = 10.0
+CLUSTER_LINE_LIMIT = 64 * 1024 * 1024
+
+logger = get_logger("cluster")
+
+
+def cluster_socket() -> Optional[str]:
+    return os.environ.get(CLUSTER_SOCKET_ENV)
+
+
+def _encode(message: Dict[str, Any]) -> bytes:
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+class WorkerLink:
+    __slots__ = ("worker_id", "writer", "outbox", "load", "sessions", "task")
+
+    def __init__(self, worker_id: str, writer: asyncio.StreamWriter,
+                 on_failed: Callable[["WorkerLink"], None]):
+        self.worker_id = worker_id
+        self.writer = writer
+        self.outbox: asyncio.Queue = asyncio.Queue()
+        self.load = 0
+        self.sessions = 0
+        self.task = asyncio.create_task(self._send_loop())
+        self.task.add_done_callback(lambda task: self._send_done(task, on_failed))
+
+    def send(self, message: Dict[str, Any]):
+        self.outbox.put_nowait(_encode(message))
+
+    async def _send_loop(self):
+        # her worker'a tek gonderici; yavas worker yalnizca kendi kuyrugunu buyutur
+        while True:
+            data = await self.outbox.get()
+            self.writer.write(data)
+            await self.writer.drain()
+
+    def _send_done(self, task: asyncio.Task, on_failed: Callable[["WorkerLink"], None]):
+        if task.cancelled() or task.exception() is None:
+            return
+        # yazilamayan worker'a giden mesajlar kaybolur; baglanti dusurulur, oturumlari sahipsiz kalir
+        logger.error("Worker'a gonderim hatasi", extra={"worker_id": self.worker_id, "error": str(task.exception())})
+        on_failed(self)
+
+
+class SessionPlacement:
+    # bir oturumun parcalari farkli worker'larda calisabilir; rapor ilk parcayi alan worker'da (primary) toplanir
+    __slots__ = ("primary", "holders", "helpers", "parted", "options")
+
+    def __init__(self, primary: str, options: Dict[str, Any]):
+        self.primary = primary
+        # worker id -> o worker'a verilen dosya id'leri
+        self.holders: Dict[str, List[str]] = {}
+        # primary disinda parca almis tum worker'lar; final rapor bu kadar parca bekler
+        self.helpers: Set[str] = set()
+        self.parted: Set[str] = set()
+        self.options = options
+
+
+class PendingCall:
+    __slots__ = ("caller", "waiting", "results", "error", "relay")
+
+    def __init__(self, caller: WorkerLink, waiting: Set[str], relay: bool = False):
+        self.caller = caller
+        self.waiting = waiting
+        self.results: List[Any] = []
+        self.error: Optional[str] = None
+        # relay: tek hedefin yaniti oldugu gibi iletilir; degilse tum hedeflerin sonuclari birlikte doner
+        self.relay = relay
+
+
+class Coordinator:
+    # yerel broker: oturum parcalarini worker'lara dagitir, ilerleme mesajlarini tum worker'lara yayar
+    def __init__(self, path: str):
+        self.path = path
+        self.workers: Dict[str, WorkerLink] = {}
+        self.sessions: Dict[str, SessionPlacement] = {}
+        self.pending_calls: Dict[str, PendingCall] = {}
+
+        self.dispatched = 0
+        self.relayed = 0
+        self.calls = 0
+
+    async def serve(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        server = await asyncio.start_unix_server(self._handle, self.path, limit=CLUSTER_LINE_LIMIT)
+        logger.info("Kume koordinatoru hazir", extra={"socket": self.path})
+        async with server:
+            await server.serve_forever()
+
+    def _least_loaded(self) -> WorkerLink:
+        return min(self.workers.values(), key=lambda link: (link.load, link.sessions))
+
+    def _place(self, placement: SessionPlacement, files: List[Dict[str, Any]]) -> WorkerLink:
+        primary = self.workers.get(placement.primary)
+        # bos son parca ve oturum bant genisligi sinirli oturumlar primary'de kalir; sinir tek yerde uygulanir
+        if primary is not None and (not files or placement.options.get("bandwidth_limit") is not None):
+            return primary
+        return self._least_loaded()
+
+    def _release(self, session_id: str, placement: SessionPlacement, worker_id: str, notify: bool = True):
+        placement.holders.pop(worker_id, None)
+        link = self.workers.get(worker_id)
+        if link is not None:
+            link.sessions -= 1
+            if notify:
+                link.send({"op": "release", "session_id": session_id})
+        if not placement.holders:
+            self.sessions.pop(session_id, None)
+
+    def _dispatch(self, link: WorkerLink, message: Dict[str, Any]):
+        session_id, files = message["session_id"], message["files"]
+        placement = self.sessions.get(session_id)
+        if placement is None:
+            placement = self.sessions[session_id] = SessionPlacement(self._least_loaded().worker_id,
+                                                                     message["options"] or {})
+        target = self._place(placement, files)
+        options = {}
+        if target.worker_id not in placement.holders:
+            placement.holders[target.worker_id] = []
+            target.sessions += 1
+            options = placement.options
+        file_ids = [file_item["id"] for file_item in files]
+        placement.holders[target.worker_id].extend(file_ids)
+        primary = self.workers.get(placement.primary)
+        if target.worker_id != placement.primary:
+            placement.helpers.add(target.worker_id)
+            if primary is not None and file_ids:
+                # final raporda bu dosyalar da yer alir; durumlari parca bitince gelir
+                primary.send({"op": "register", "session_id": session_id, "file_ids": file_ids})
+
+        self.dispatched += len(files)
+        target.load += len(files)
+        # yanit hedef worker paketi kuyruga aldiktan sonra gelir; POST ve manifest bu sayede geri basinc gorur
+        self.pending_calls[message["id"]] = PendingCall(link, {target.worker_id}, relay=True)
+        run = {"op": "run", "session_id": session_id, "finalize": message["finalize"],
+               "primary": placement.primary, "parts": len(placement.helpers)}
+        target.send({**run, "id": message["id"], "files": files, "options": options})
+        if message["finalize"]:
+            for worker_id in placement.holders:
+                if worker_id != target.worker_id:
+                    self.workers[worker_id].send({**run, "files": [], "options": {}})
+
+    def _call(self, link: WorkerLink, message: Dict[str, Any]):
+        placement = self.sessions.get(message["session_id"])
+        if placement is None:
+            link.send({"op": "reply", "id": message["id"], "owned": False, "results": []})
+            return
+        # oturumun dosyalarini tutan her worker'a gider; sonuclari cagiran worker birlestirir
+        targets = [self.workers[worker_id] for worker_id in placement.holders]
+        self.pending_calls[message["id"]] = PendingCall(link, {target.worker_id for target in targets})
+        call = {**message, "args": {**message["args"], "holders": len(targets)}}
+        for target in targets:
+            target.send(call)
+
+    def _reply(self, link: WorkerLink, message: Dict[str, Any]):
+        pending = self.pending_calls.get(message["id"])
+        if pending is None or link.worker_id not in pending.waiting:
+            return
+        if pending.relay:
+            del self.pending_calls[message["id"]]
+            pending.caller.send(message)
+            return
+        pending.waiting.discard(link.worker_id)
+        if "error" in message:
+            pending.error = message["error"]
+        else:
+            pending.results.append(message.get("result"))
+        if not pending.waiting:
+            self._complete(message["id"], pending)
+
+    def _complete(self, call_id: str, pending: PendingCall):
+        del self.pending_calls[call_id]
+        reply = {"op": "reply", "id": call_id, "owned": True, "results": pending.results}
+        if pending.error is not None:
+            reply["error"] = pending.error
+        pending.caller.send(reply)
+
+    def _part(self, link: WorkerLink, message: Dict[str, Any]):
+        session_id = message["session_id"]
+        placement = self.sessions.get(session_id)
+        if placement is None:
+            link.send({"op": "release", "session_id": session_id})
+            return
+        placement.parted.add(link.worker_id)
+        primary = self.workers.get(placement.primary)
+        if primary is not None:
+            primary.send(message)
+        else:
+            # primary oldu, final rapor yazilmayacak; parcasi biten worker oturumu hemen kapatabilir
+            self._release(session_id, placement, link.worker_id)
+
+    def _finished(self, link: WorkerLink, session_id: str):
+        placement = self.sessions.get(session_id)
+        if placement is None:
+            return
+        for worker_id in list(placement.holders):
+            self._release(session_id, placement, worker_id, notify=worker_id != link.worker_id)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        link: Optional[WorkerLink] = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                op = message["op"]
+                if op == "hello":
+                    link = WorkerLink(message["worker_id"], writer, self._drop)
+                    self.workers[link.worker_id] = link
+                    logger.info("Worker baglandi", extra={"worker_id": link.worker_id, "workers": len(self.workers)})
+                elif link is None:
+                    continue
+                elif op == "load":
+                    link.load = message["load"]
+                elif op == "publish":
+                    self.relayed += len(message["messages"])
+                    for other in self.workers.values():
+                        if other is not link:
+                            other.send(message)
+                elif op == "dispatch":
+                    self._dispatch(link, message)
+                elif op == "part":
+                    self._part(link, message)
+                elif op == "finished":
+                    self._finished(link, message["session_id"])
+                elif op == "call":
+                    self.calls += 1
+                    self._call(link, message)
+                elif op == "reply":
+                    self._reply(link, message)
+        except (ConnectionError, ValueError, KeyError) as e:
+            logger.warning("Worker baglantisi hatali kapandi", extra={"error": str(e)})
+        finally:
+            if link is not None:
+                self._drop(link)
+            writer.close()
+
+    def _drop(self, link: WorkerLink):
+        # hem okuma dongusunden hem gonderim hatasindan cagrilabilir; ikinci cagri bir sey yapmaz
+        if self.workers.get(link.worker_id) is not link:
+            return
+        del self.workers[link.worker_id]
+        link.task.cancel()
+        link.writer.close()
+
+        orphaned, orphaned_files = [], {}
+        for session_id, placement in list(self.sessions.items()):
+            file_ids = placement.holders.pop(link.worker_id, None)
+            if file_ids is None:
+                continue
+            primary = self.workers.get(placement.primary)
+            if link.worker_id == placement.primary:
+                # final raporu yazacak worker yok; parcasini bitirmis olanlar beklemeden kapatilir
+                for worker_id in placement.parted & set(placement.holders):
+                    self._release(session_id, placement, worker_id)
+            elif primary is not None and link.worker_id not in placement.parted:
+                # primary eksik parcayi beklemesin; bu worker'in dosyalari 'interrupted' sayilir
+                primary.send({"op": "part", "session_id": session_id, "worker_id": link.worker_id,
+                              "statuses": {file_id: "interrupted" for file_id in file_ids},
+                              "checksums": {}, "transfer": {}, "deleted_urls": {}})
+            if placement.holders:
+                orphaned_files[session_id] = file_ids
+            else:
+                self.sessions.pop(session_id, None)
+                orphaned.append(session_id)
+
+        for call_id, pending in list(self.pending_calls.items()):
+            if pending.caller is link:
+                del self.pending_calls[call_id]
+            elif link.worker_id in pending.waiting:
+                # sahibi giden cagri zaman asimini beklemeden hata ile doner
+                pending.waiting.discard(link.worker_id)
+                pending.error = "Session owner exited"
+                if pending.relay or not pending.waiting:
+                    pending.results = []
+                    self._complete(call_id, pending)
+        if (orphaned or orphaned_files) and self.workers:
+            # yarim kalan dosyalar kalan bir worker'a kapattirilir, paylasilan durum deposunda 'interrupted' olur
+            self._least_loaded().send({"op": "orphaned", "session_ids": orphaned, "files": orphaned_files})
+        logger.warning("Worker ayrildi", extra={"worker_id": link.worker_id, "orphaned_sessions": len(orphaned),
+                                                 "orphaned_parts": len(orphaned_files)})
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": {link.worker_id: {"load": link.load, "sessions": link.sessions}
+                        for link in self.workers.values()},
+            "sessions": len(self.sessions),
+            "split_sessions": sum(1 for placement in self.sessions.values() if len(placement.holders) > 1),
+            "dispatched": self.dispatched,
+            "relayed": self.relayed,
+            "calls": self.calls,
+        }
+
+
+class ClusterCallError(Exception):
+    pass
+
+
+RunHandler = Callable[[str, List[Dict[str, Any]], bool, Dict[str, Any], bool, int], Awaitable[None]]
+CallHandler = Callable[[str, str, Dict[str, Any]], Awaitable[Any]]
+OrphanHandler = Callable[[List[str], Dict[str, List[str]]], Awaitable[None]]
+SessionHandler = Callable[[str, Dict[str, Any]], None]
+
+
+class ClusterClient:
+    def __init__(self, path: str, worker_id: str, on_run: RunHandler, on_publish: Callable[[Dict[str, Any]], None],
+                 on_call: CallHandler, load: Callable[[], int], on_orphaned: Optional[OrphanHandler] = None,
+                 on_session: Optional[SessionHandler] = None, relay_seconds: float = CLUSTER_RELAY_SECONDS):
+        self.path = path
+        self.worker_id = worker_id
+        self.on_run = on_run
+        self.on_publish = on_publish
+        self.on_call = on_call
+        self.load = load
+        self.on_orphaned = on_orphaned
+        # register/part/release: oturum parcalari arasindaki mesajlar
+        self.on_session = on_session
+        self.relay_seconds = relay_seconds
+
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._tasks: List[asyncio.Task] = []
+        self._outgoing: Dict[Hashable, Dict[str, Any]] = {}
+        self._seq = itertools.count()
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._session_locks: Dict[str, asyncio.Lock] = {}
+        self._handlers: set = set()
+
+        self.relayed = 0
+        self.received = 0
+
+    async def start(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_unix_connection(self.path, limit=CLUSTER_LINE_LIMIT), CLUSTER_CONNECT_TIMEOUT
+        )
+        await self._send({"op": "hello", "worker_id": self.worker_id})
+        self._tasks = [
+            asyncio.create_task(self._read_loop(), name="cluster-reader"),
+            asyncio.create_task(self._relay_loop(), name="cluster-relay"),
+        ]
+        logger.info("Kume koordinatorune baglanildi", extra={"worker_id": self.worker_id, "socket": self.path})
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    async def _send(self, message: Dict[str, Any]):
+        self._writer.write(_encode(message))
+        await self._writer.drain()
+
+    def relay(self, message: Dict[str, Any]):
+        # yerelde oldugu gibi ayni dosyanin ilerlemesi tek mesaja iner; broker'a tur basina bir paket gider
+        key = message_key(message, next(self._seq))
+        self._outgoing.pop(key, None)
+        self._outgoing[key] = message
+
+    async def _relay_loop(self):
+        while True:
+            await asyncio.sleep(self.relay_seconds)
+            if self._outgoing:
+                batch, self._outgoing = self._outgoing, {}
+                self.relayed += len(batch)
+                await self._send({"op": "publish", "messages": list(batch.values())})
+            await self._send({"op": "load", "load": self.load()})
+
+    async def dispatch(self, session_id: str, files: List[Dict[str, Any]], finalize: bool,
+                       options: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        # paketi alan worker zamanlayiciya teslim edince doner; kuyruk doluysa cagiran da bekler.
+        # sahibi olurse koordinator hata ile yanitlar, zaman asimi gerekmez
+        reply = await self._request({"op": "dispatch", "session_id": session_id, "files": files,
+                                     "finalize": finalize, "options": options or {}}, timeout=None)
+        return reply["result"]
+
+    async def send_part(self, session_id: str, part: Dict[str, Any]):
+        await self._send({"op": "part", "session_id": session_id, "worker_id": self.worker_id, **part})
+
+    async def finished(self, session_id: str):
+        self.release(session_id)
+        await self._send({"op": "finished", "session_id": session_id})
+
+    def release(self, session_id: str):
+        self._session_locks.pop(session_id, None)
+
+    async def call(self, session_id: str, name: str, args: Optional[Dict[str, Any]] = None) -> Tuple[bool, List[Any]]:
+        # oturumun dosyalarini tutan her worker'in sonucu ayri doner
+        reply = await self._request({"op": "call", "session_id": session_id, "name": name, "args": args or {}})
+        return reply["owned"], reply["results"]
+
+    async def _request(self, message: Dict[str, Any], timeout: Optional[float] = CLUSTER_CALL_TIMEOUT) -> Dict[str, Any]:
+        call_id = f"{self.worker_id}:{next(self._seq)}"
+        future = self._calls[call_id] = asyncio.get_running_loop().create_future()
+        try:
+            await self._send({**message, "id": call_id})
+            reply = await asyncio.wait_for(future, timeout)
+        finally:
+            self._calls.pop(call_id, None)
+        if "error" in reply:
+            raise ClusterCallError(reply["error"])
+        return reply
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._handlers.add(task)
+        task.add_done_callback(self._handlers.discard)
+
+    async def _run(self, message: Dict[str, Any]):
+        # ayni oturumun parcalari gelis sirasiyla islenir; okuma dongusu beklemez
+        session_id = message["session_id"]
+        lock = self._session_locks.setdefault(session_id, asyncio.Lock())
+        reply = {"op": "reply", "id": message.get("id"), "owned": True, "result": self.worker_id}
+        async with lock:
+            try:
+                await self.on_run(session_id, message["files"], message["finalize"], message["options"],
+                                  message["primary"] == self.worker_id, message["parts"])
+            except Exception as e:
+                logger.error("Dagitilan paket calistirilamadi", extra={"session_id": session_id, "error": str(e)})
+                reply["error"] = str(e)
+        if reply["id"] is not None:
+            await self._send(reply)
+
+    async def _answer(self, message: Dict[str, Any]):
+        reply = {"op": "reply", "id": message["id"], "owned": True}
+        try:
+            reply["result"] = await self.on_call(message["session_id"], message["name"], message["args"])
+        except Exception as e:
+            reply["error"] = str(e)
+        await self._send(reply)
+
+    async def _read_loop(self):
+        while True:
+            line = await self._reader.readline()
+            if not line:
+                logger.error("Kume koordinatoru baglantisi koptu", extra={"worker_id": self.worker_id})
+                return
+            message = json.loads(line)
+            op = message["op"]
+            if op == "publish":
+                self.received += len(message["messages"])
+                for item in message["messages"]:
+                    self.on_publish(item)
+            elif op == "run":
+                self._spawn(self._run(message))
+            elif op == "call":
+                self._spawn(self._answer(message))
+            elif op == "orphaned":
+                if self.on_orphaned is not None:
+                    self._spawn(self.on_orphaned(message["session_ids"], message["files"]))
+            elif op in ("register", "part", "release"):
+                if op == "release":
+                    self.release(message["session_id"])
+                if self.on_session is not None:
+                    self.on_session(op, message)
+            elif op == "reply":
+                future = self._calls.get(message["id"])
+                if future is not None and not future.done():
+                    future.set_result(message)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "relayed": self.relayed,
+            "received": self.received,
+            "pending_calls": len(self._calls),
+            "active_sessions": len(self._session_locks),
+        }
+
+
+def start_coordinator(path: str) -> Coordinator:
+    # koordinator ana surecte ayri bir thread'de calisir; uvicorn ana sureci yalnizca worker'lari izler
+    coordinator = Coordinator(path)
+    thread = threading.Thread(target=asyncio.run, args=(coordinator.serve(),), name="cluster-coordinator",
+                              daemon=True)
+    thread.start()
+    return coordinator
@@ -0,0 +1,240 @@
+import os
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from metrics import REGISTRY
+from structured_logging import get_logger
+
+ADAPTIVE_CONCURRENCY = os.environ.get("DOWNLOADER_ADAPTIVE_CONCURRENCY", "1") not in ("0", "false", "off")
+ADAPTIVE_MIN_LIMIT = 1
+# HTTP/1.1 host'lari icin tavan; baglanti havuzunun host basina siniri da buna cekilir
+ADAPTIVE_HTTP1_CEILING = 32
+# hata ya da 429 sonrasi sinir bu oranla carpilir, ilk byte suresi uzarsa daha yumusak azaltilir
+ADAPTIVE_ERROR_BACKOFF = 0.5
+ADAPTIVE_LATENCY_BACKOFF = 0.9
+# ortalama ilk byte suresi en iyi degerin bu katini asarsa sunucuda kuyruk birikiyor sayilir
+ADAPTIVE_LATENCY_RATIO = 2.0
+# loopback gibi cok hizli host'larda milisaniye alti dalgalanma sinyal sayilmaz
+ADAPTIVE_LATENCY_FLOOR = 0.005
+ADAPTIVE_TTFB_SMOOTHING = 0.2
+# en iyi ilk byte suresi her pencerede biraz gevsetilir; kalici olarak yavaslayan host'ta sinir sonsuza dek dusmez
+ADAPTIVE_BASELINE_DRIFT = 0.02
+ADAPTIVE_WINDOW_SECONDS = 2.0
+# sinir artisi verimi bu orandan az artirdiysa artis geri alinir
+ADAPTIVE_MIN_GAIN = 0.05
+THROTTLE_STATUSES = (429, 503)
+
+HOST_CONCURRENCY_LIMIT = REGISTRY.gauge("downloader_host_concurrency_limit",
+                                        "Current adaptive concurrency limit per host", labelnames=("host",))
+
+logger = get_logger("concurrency")
+
+
+class RequestSample:
+    # tek bir deneme icin sunucuya gercekten gonderilen istegin olcumu; onbellek ve takipci denemeleri bos kalir
+    __slots__ = ("started", "first_byte", "wire_bytes", "completed")
+
+    def __init__(self):
+        self.started: Optional[float] = None
+        self.first_byte: Optional[float] = None
+        self.wire_bytes = 0
+        self.completed = False
+
+    def start(self):
+        if self.started is None:
+            self.started = time.monotonic()
+
+    def feed(self, n: int):
+        if self.first_byte is None:
+            self.first_byte = time.monotonic()
+        self.wire_bytes += n
+
+    @property
+    def ttfb(self) -> Optional[float]:
+        if self.started is None or self.first_byte is None:
+            return None
+        return self.first_byte - self.started
+
+
+class HostConcurrency:
+    __slots__ = (
+        "host", "limit", "ceiling", "slow_start", "ttfb_min", "ttfb_avg", "last_decrease", "hold_until",
+        "reason", "increases", "decreases", "reverts", "window_started", "window_limit", "window_bytes",
+        "window_ok", "window_errors", "window_throttled", "throughput", "throughput_limit", "error_rate",
+    )
+
+    def __init__(self, host: str, initial: int, ceiling: int):
+        now = time.monotonic()
+        self.host = host
+        self.limit = float(min(initial, ceiling))
+        self.ceiling = ceiling
+        # ilk tikanma sinyaline kadar her basarili istekte bir artar (TCP slow start gibi)
+        self.slow_start = True
+        self.ttfb_min: Optional[float] = None
+        self.ttfb_avg: Optional[float] = None
+        self.last_decrease = 0.0
+        self.hold_until = 0.0
+        self.reason = "initial"
+        self.increases = 0
+        self.decreases = 0
+        self.reverts = 0
+        self.window_started = now
+        self.window_limit = int(self.limit)
+        self.window_bytes = 0
+        self.window_ok = 0
+        self.window_errors = 0
+        self.window_throttled = 0
+        self.throughput: Optional[float] = None
+        self.throughput_limit = int(self.limit)
+        self.error_rate = 0.0
+
+    @property
+    def current(self) -> int:
+        return max(ADAPTIVE_MIN_LIMIT, int(self.limit))
+
+    def to_dict(self, in_flight: int) -> Dict[str, Any]:
+        return {
+            "limit": self.current,
+            "ceiling": self.ceiling,
+            "in_flight": in_flight,
+            "phase": "slow_start" if self.slow_start else "aimd",
+            "reason": self.reason,
+            "ttfb_ms": round(self.ttfb_avg * 1000, 1) if self.ttfb_avg is not None else None,
+            "ttfb_min_ms": round(self.ttfb_min * 1000, 1) if self.ttfb_min is not None else None,
+            "throughput_bps": round(self.throughput) if self.throughput is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "reverts": self.reverts,
+        }
+
+
+class ConcurrencyController:
+    # host basina es zamanlilik siniri: artista toplamsal, tikanmada carpimsal (AIMD)
+    def __init__(self, bounds: Callable[[str], Tuple[int, int]], demand: Callable[[str], Tuple[int, int]],
+                 enabled: bool = ADAPTIVE_CONCURRENCY):
+        # bounds(host) -> (baslangic, tavan); demand(host) -> (calisan, kuyrukta)
+        self.bounds = bounds
+        self.demand = demand
+        self.enabled = enabled
+        self.hosts: Dict[str, HostConcurrency] = {}
+
+    def _state(self, host: str) -> HostConcurrency:
+        initial, ceiling = self.bounds(host)
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = HostConcurrency(host, initial, ceiling)
+        elif state.ceiling != ceiling:
+            # tasima degisti (h2 <-> http1); yeni tavanin ustunde kalmasin
+            state.ceiling = ceiling
+            state.limit = min(state.limit, float(ceiling))
+        return state
+
+    def limit_for(self, host: str) -> Optional[int]:
+        if not self.enabled:
+            return None
+        state = self.hosts.get(host)
+        if state is None:
+            initial, ceiling = self.bounds(host)
+            return min(initial, ceiling)
+        return min(state.current, state.ceiling)
+
+    def record(self, host: str, outcome: str, started: float, nbytes: int = 0, ttfb: Optional[float] = None):
+        # outcome: ok, throttled, error; started: istegin basladigi monotonic an
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        state = self._state(host)
+        state.window_bytes += nbytes
+        if ttfb is not None:
+            state.ttfb_min = ttfb if state.ttfb_min is None else min(state.ttfb_min, ttfb)
+            state.ttfb_avg = ttfb if state.ttfb_avg is None else (
+                ADAPTIVE_TTFB_SMOOTHING * ttfb + (1 - ADAPTIVE_TTFB_SMOOTHING) * state.ttfb_avg)
+
+        if outcome == "ok":
+            state.window_ok += 1
+            if self._congested(state):
+                self._decrease(state, now, started, ADAPTIVE_LATENCY_BACKOFF, "latency")
+            else:
+                self._increase(state, now)
+        elif outcome == "throttled":
+            state.window_throttled += 1
+            self._decrease(state, now, started, ADAPTIVE_ERROR_BACKOFF, "throttled")
+        else:
+            state.window_errors += 1
+            self._decrease(state, now, started, ADAPTIVE_ERROR_BACKOFF, outcome)
+
+        self._roll_window(state, now)
+        HOST_CONCURRENCY_LIMIT.labels(host).set(state.current)
+
+    def _congested(self, state: HostConcurrency) -> bool:
+        if state.ttfb_avg is None or state.ttfb_min is None:
+            return False
+        return (state.ttfb_avg > state.ttfb_min * ADAPTIVE_LATENCY_RATIO
+                and state.ttfb_avg - state.ttfb_min > ADAPTIVE_LATENCY_FLOOR)
+
+    def _increase(self, state: HostConcurrency, now: float):
+        if now < state.hold_until or state.limit >= state.ceiling:
+            return
+        running, queued = self.demand(state.host)
+        # sinir doldurulmuyorsa artirmak bir sey kazandirmaz
+        if running < state.current or not queued:
+            return
+        before = state.current
+        step = 1.0 if state.slow_start else 1.0 / state.limit
+        state.limit = min(float(state.ceiling), state.limit + step)
+        if state.current > before:
+            state.increases += 1
+            state.reason = "slow_start" if state.slow_start else "increase"
+
+    def _decrease(self, state: HostConcurrency, now: float, started: float, factor: float, reason: str):
+        state.slow_start = False
+        # onceki azaltmadan once baslamis istekler eski sinirla gonderilmisti; ayni dalga tek azaltma sayilir
+        if started < state.last_decrease:
+            return
+        before = state.current
+        state.limit = max(float(ADAPTIVE_MIN_LIMIT), state.limit * factor)
+        state.last_decrease = now
+        state.decreases += 1
+        state.reason = reason
+        if state.current != before:
+            logger.info("Host es zamanlilik siniri dusuruldu",
+                        extra={"host": state.host, "reason": reason, "limit": state.current, "previous": before})
+
+    def _roll_window(self, state: HostConcurrency, now: float):
+        elapsed = now - state.window_started
+        samples = state.window_ok + state.window_errors + state.window_throttled
+        if elapsed < ADAPTIVE_WINDOW_SECONDS or samples < 2:
+            return
+        throughput = state.window_bytes / elapsed
+        state.error_rate = (state.window_errors + state.window_throttled) / samples
+        previous, previous_limit = state.throughput, state.throughput_limit
+        # pencere daha yuksek bir sinirla calisti ama verim artmadiysa sunucu ya da hat doymustur
+        if (previous is not None and state.window_limit > previous_limit
+                and throughput < previous * (1 + ADAPTIVE_MIN_GAIN)):
+            state.limit = min(state.limit, float(previous_limit))
+            state.slow_start = False
+            state.hold_until = now + ADAPTIVE_WINDOW_SECONDS
+            state.reverts += 1
+            state.reason = "plateau"
+        else:
+            state.throughput = throughput
+            state.throughput_limit = state.window_limit
+        if state.ttfb_min is not None:
+            state.ttfb_min *= 1 + ADAPTIVE_BASELINE_DRIFT
+        state.window_started = now
+        state.window_limit = state.current
+        state.window_bytes = 0
+        state.window_ok = state.window_errors = state.window_throttled = 0
+
+    def reset(self, host: Optional[str] = None):
+        hosts = [host] if host is not None else list(self.hosts)
+        for name in hosts:
+            if self.hosts.pop(name, None) is not None:
+                HOST_CONCURRENCY_LIMIT.remove(name)
+
+    def stats(self) -> Dict[str, Any]:
+        hosts = {}
+        for host, state in self.hosts.items():
+            hosts[host] = state.to_dict(self.demand(host)[0])
+        return {"enabled": self.enabled, "hosts": hosts}
@@ -0,0 +1,338 @@
+
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from structured_logging import get_logger
+
+CACHE_DIR_NAME = ".cache"
+CACHE_INDEX_NAME = "index.json"
+CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+CACHE_MAX_ENTRIES = 10000
+CACHE_SAVE_DEBOUNCE_SECONDS = 2.0
+CACHE_HASH_ALGORITHM = "sha256"
+# blob'a hardlink'li indirilen dosya yerinde degistirilirse onbellek de bozulur; blob'lar salt okunur tutulur
+CACHE_BLOB_MODE = 0o444
+
+# linux/fs.h: _IOW(0x94, 9, int); btrfs/xfs uzerinde veri kopyalamadan klonlar
+FICLONE = 0x40049409
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+logger = get_logger("cache")
+
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    userinfo = parts.netloc.rpartition("@")[0]
+    if userinfo:
+        # farkli kimlik bilgileri ayri kayittir; parola anahtarda acik yazilmaz
+        host = f"{hashlib.sha256(userinfo.encode('utf-8')).hexdigest()[:16]}@{host}"
+    return urlunsplit((scheme, host, parts.path or "/", parts.query, ""))
+
+
+def cache_key(url: str, variant: Optional[str] = None) -> str:
+    # ayni URL'nin farkli saklama bicimleri (or. sikistirilmis) ayri kayitlardir; fragment normalde atilir
+    key = normalize_url(url)
+    return f"{key}#{variant}" if variant else key
+
+
+def link_or_clone(src: pathlib.Path, dest: pathlib.Path):
+    # once hardlink, olmazsa reflink, en son kopya; hedef her zaman atomik olarak yer degistirir
+    tmp = dest.with_name(dest.name + ".cache-link")
+    try:
+        tmp.unlink()
+    except FileNotFoundError:
+        pass
+    try:
+        os.link(src, tmp)
+    except OSError:
+        try:
+            with open(src, 'rb') as fsrc, open(tmp, 'wb') as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            shutil.copyfile(src, tmp)
+    os.replace(tmp, dest)
+
+
+class CacheEntry:
+    __slots__ = ("key", "etag", "last_modified", "digest", "size", "encoding", "last_used")
+
+    def __init__(self, key: str, etag: Optional[str], last_modified: Optional[str], digest: str, size: int,
+                 encoding: Optional[str] = None, last_used: Optional[float] = None):
+        self.key = key
+        self.etag = etag
+        self.last_modified = last_modified
+        self.digest = digest
+        self.size = size
+        self.encoding = encoding
+        self.last_used = last_used or time.time()
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "digest": self.digest,
+            "size": self.size,
+            "encoding": self.encoding,
+            "last_used": self.last_used,
+        }
+
+
+class InflightTransfer:
+    __slots__ = ("key", "future", "followers")
+
+    def __init__(self, key: str):
+        self.key = key
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.followers: Set[Any] = set()
+
+    def feed(self, n: int):
+        # bekleyen oturumlarin watchdog kayitlari lider ilerledikce beslenir, duraklama sayilmaz
+        for watch in self.followers:
+            watch.feed(n)
+
+
+class ContentCache:
+    def __init__(self, root: pathlib.Path, max_bytes: int = CACHE_MAX_BYTES, max_entries: int = CACHE_MAX_ENTRIES,
+                 shared: bool = False):
+        self.root = root
+        # birden fazla surec ayni dizini kullaniyorsa indeks kilit altinda birlestirilerek yazilir
+        self.shared = shared
+        self.blob_dir = root / "blobs"
+        self.index_path = root / CACHE_INDEX_NAME
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+
+        self.entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.blob_refs: Dict[str, int] = {}
+        self.blob_sizes: Dict[str, int] = {}
+        self.total_bytes = 0
+        self.inflight: Dict[str, InflightTransfer] = {}
+        self._removed: Set[str] = set()
+        self._save_task: Optional[asyncio.Task] = None
+        # ayni gecici dosyaya iki thread birden yazmasin; kapanistaki kayit suren kaydi bekler
+        self._save_lock = asyncio.Lock()
+
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+
+    def blob_path(self, digest: str) -> pathlib.Path:
+        return self.blob_dir / digest[:2] / digest
+
+    def _load_sync(self):
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                records = json.load(f)
+        except (OSError, ValueError):
+            return
+        for record in sorted(records, key=lambda record: record["last_used"]):
+            if self.blob_path(record["digest"]).exists():
+                self._add(CacheEntry(**record))
+
+    async def open(self):
+        await asyncio.to_thread(self._load_sync)
+        logger.info("Icerik onbellegi hazir", extra={"entries": len(self.entries), "total_bytes": self.total_bytes})
+
+    async def close(self):
+        if self._save_task is not None:
+            self._save_task.cancel()
+            self._save_task = None
+        await self.save()
+
+    def _write_index(self, records):
+        tmp_path = self.index_path.with_name(self.index_path.name + f".tmp-write-{os.getpid()}")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(records, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _save_sync(self, records, removed):
+        if not self.shared:
+            self._write_index(records)
+            return
+        with open(self.root / (CACHE_INDEX_NAME + ".lock"), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    merged = {record["key"]: record for record in json.load(f) if record["key"] not in removed}
+            except (OSError, ValueError):
+                merged = {}
+            for record in records:
+                current = merged.get(record["key"])
+                if current is None or current["last_used"] <= record["last_used"]:
+                    merged[record["key"]] = record
+            self._write_index(list(merged.values()))
+
+    async def save(self):
+        async with self._save_lock:
+            removed, self._removed = self._removed, set()
+            await asyncio.to_thread(self._save_sync, [entry.to_dict() for entry in self.entries.values()], removed)
+
+    def _schedule_save(self):
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._delayed_save())
+
+    async def _delayed_save(self):
+        await asyncio.sleep(CACHE_SAVE_DEBOUNCE_SECONDS)
+        self._save_task = None
+        await self.save()
+
+    def _add(self, entry: CacheEntry) -> Optional[str]:
+        if entry.digest not in self.blob_refs:
+            self.blob_refs[entry.digest] = 0
+            self.blob_sizes[entry.digest] = entry.size
+            self.total_bytes += entry.size
+        self.blob_refs[entry.digest] += 1
+        orphaned = self._drop(entry.key)
+        self.entries[entry.key] = entry
+        return orphaned
+
+    def _release_blob(self, digest: str) -> bool:
+        self.blob_refs[digest] -= 1
+        if self.blob_refs[digest] > 0:
+            return False
+        del self.blob_refs[digest]
+        self.total_bytes -= self.blob_sizes.pop(digest)
+        return True
+
+    def _drop(self, key: str) -> Optional[str]:
+        entry = self.entries.pop(key, None)
+        if entry is not None and self.shared:
+            self._removed.add(key)
+        if entry is not None and self._release_blob(entry.digest):
+            return entry.digest
+        return None
+
+    def _evict_sync(self, digests):
+        # indirilen dosyalar ayri hardlink oldugu icin blob silmek onlari etkilemez
+        for digest in digests:
+            try:
+                self.blob_path(digest).unlink()
+            except FileNotFoundError:
+                pass
+
+    async def _evict(self, orphaned):
+        while self.entries and (self.total_bytes > self.max_bytes or len(self.entries) > self.max_entries):
+            key = next(iter(self.entries))
+            digest = self._drop(key)
+            self.evictions += 1
+            if digest is not None:
+                orphaned.append(digest)
+        if orphaned:
+            await asyncio.to_thread(self._evict_sync, orphaned)
+
+    def join(self, url: str, variant: Optional[str] = None) -> Tuple[InflightTransfer, bool]:
+        key = cache_key(url, variant)
+        transfer = self.inflight.get(key)
+        if transfer is not None:
+            self.coalesced += 1
+            return transfer, False
+        transfer = self.inflight[key] = InflightTransfer(key)
+        return transfer, True
+
+    async def follow(self, transfer: InflightTransfer, watch) -> Optional[CacheEntry]:
+        transfer.followers.add(watch)
+        try:
+            return await asyncio.shield(transfer.future)
+        finally:
+            transfer.followers.discard(watch)
+
+    def release(self, transfer: InflightTransfer, entry: Optional[CacheEntry]):
+        if self.inflight.get(transfer.key) is transfer:
+            del self.inflight[transfer.key]
+        if not transfer.future.done():
+            transfer.future.set_result(entry)
+
+    async def lookup(self, url: str, variant: Optional[str] = None) -> Optional[CacheEntry]:
+        key = cache_key(url, variant)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if not await asyncio.to_thread(self.blob_path(entry.digest).exists):
+            self._drop(key)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        entry.last_used = time.time()
+        return entry
+
+    def _store_sync(self, file_path: pathlib.Path, digest: str):
+        blob = self.blob_path(digest)
+        if blob.exists():
+            # ayni icerik baska bir URL'den zaten var: indirilen kopya yerine blob'a baglan
+            link_or_clone(blob, file_path)
+            return
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(file_path, blob)
+        except OSError:
+            link_or_clone(file_path, blob)
+        os.chmod(blob, CACHE_BLOB_MODE)
+
+    async def store(self, url: str, etag: Optional[str], last_modified: Optional[str],
+                    file_path: pathlib.Path, digest: str, size: int, encoding: Optional[str] = None,
+                    variant: Optional[str] = None) -> Optional[CacheEntry]:
+        # dogrulayicisi olmayan yanit kosullu istekle yenilenemez, onbellege alinmaz
+        if not etag and not last_modified:
+            return None
+        if size > self.max_bytes:
+            return None
+        await asyncio.to_thread(self._store_sync, file_path, digest)
+        entry = CacheEntry(cache_key(url, variant), etag, last_modified, digest, size, encoding)
+        orphaned = self._add(entry)
+        await self._evict([orphaned] if orphaned else [])
+        self._schedule_save()
+        return entry
+
+    async def materialize(self, entry: CacheEntry, dest: pathlib.Path) -> bool:
+        try:
+            await asyncio.to_thread(link_or_clone, self.blob_path(entry.digest), dest)
+        except FileNotFoundError:
+            self._drop(entry.key)
+            self._schedule_save()
+            return False
+        self.hits += 1
+        self.bytes_saved += entry.size
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self.entries),
+            "blobs": len(self.blob_refs),
+            "total_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "inflight": len(self.inflight),
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "bytes_saved": self.bytes_saved,
+        }
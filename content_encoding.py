@@ -0,0 +1,94 @@
+
+import asyncio
+import zlib
+from typing import Mapping, Optional
+
+# br ve zstd istege bagli; kurulu degilse Accept-Encoding'de istenmez
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# decode: sikistirilmis iste, diske acarak yaz; store: geldigi gibi sakla; off: sikistirma isteme
+COMPRESSION_MODES = ("decode", "store", "off")
+DEFAULT_COMPRESSION = "decode"
+# buyuk parcalarin acilmasi event loop'u bekletmesin diye thread'de yapilir
+DECODE_THREAD_MIN = 256 * 1024
+
+
+def supported_encodings():
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings += ["gzip", "deflate"]
+    return tuple(encodings)
+
+
+SUPPORTED_ENCODINGS = supported_encodings()
+
+
+class UnsupportedEncoding(Exception):
+    def __init__(self, encoding: str):
+        super().__init__(f"Unsupported content encoding: {encoding}")
+        self.encoding = encoding
+
+
+def accept_encoding(compression: str) -> str:
+    if compression == "off":
+        return "identity"
+    return ", ".join(SUPPORTED_ENCODINGS)
+
+
+def response_encoding(headers: Mapping[str, str]) -> Optional[str]:
+    value = headers.get("content-encoding", "").strip().lower()
+    return None if value in ("", "identity") else value
+
+
+class StreamDecoder:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        self._decompress = None
+        self._flush = None
+        if encoding == "gzip":
+            self._use(zlib.decompressobj(16 + zlib.MAX_WBITS))
+        elif encoding == "br" and brotli is not None:
+            decoder = brotli.Decompressor()
+            self._decompress = getattr(decoder, "process", None) or decoder.decompress
+        elif encoding == "zstd" and zstandard is not None:
+            self._use(zstandard.ZstdDecompressor().decompressobj())
+        elif encoding != "deflate":
+            raise UnsupportedEncoding(encoding)
+
+    def _use(self, decoder):
+        self._decompress = decoder.decompress
+        self._flush = decoder.flush
+
+    def decompress(self, data: bytes) -> bytes:
+        if self._decompress is None:
+            # deflate sunucuya gore zlib sarmalli ya da ham gelir; ilk bayttan anlasilir
+            wrapped = bool(data) and data[0] & 0x0F == 8
+            self._use(zlib.decompressobj(zlib.MAX_WBITS if wrapped else -zlib.MAX_WBITS))
+        return self._decompress(data)
+
+    async def decode(self, data: bytes) -> bytes:
+        if len(data) >= DECODE_THREAD_MIN:
+            return await asyncio.to_thread(self.decompress, data)
+        return self.decompress(data)
+
+    def flush(self) -> bytes:
+        return self._flush() if self._flush is not None else b""
+
+
+def cache_variant(compression: str) -> Optional[str]:
+    # kodlanmis haliyle saklanan icerik acik icerikle ayni onbellek kaydini paylasmaz
+    return "stored" if compression == "store" else None
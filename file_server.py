@@ -0,0 +1,165 @@
+
+import asyncio
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from starlette.responses import FileResponse, StreamingResponse
+from starlette.types import Send
+
+from structured_logging import get_logger
+
+FILE_SERVE_CHUNK_SIZE = 1024 * 1024
+# kume cagrisi zaman asimindan kisa tutulur; bekleme sahibi olan worker'da yapilir
+FILE_TAIL_WAIT_SECONDS = 2.0
+FILE_TAIL_POLL_SECONDS = 0.25
+FILE_TAIL_IDLE_SECONDS = 300.0
+# bu durumlarda dosya hala buyuyebilir; akis bekler
+FILE_TAIL_STATUSES = ("queued", "downloading", "retrying", "paused")
+
+logger = get_logger("files")
+
+
+class FileTailError(Exception):
+    pass
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    # yalnizca tek aralik desteklenir; [start, end) dondurur
+    if not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[6:].strip().partition("-")
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                return None
+            return max(0, size - length), size
+        start = int(first)
+        end = int(last) + 1 if last else size
+    except ValueError:
+        return None
+    if start >= size or end <= start:
+        return None
+    return start, min(end, size)
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match zayif karsilastirma kullanir; W/ oneki yok sayilir
+    if header.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in header.split(",")]
+    return any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in tags)
+
+
+def segments_prefix(segments: List[List[int]]) -> int:
+    # parcalar sirasiz iner; bastan kesintisiz yazilmis kisim ilk bitmemis parcanin offset'inde biter
+    readable = 0
+    for _start, end, offset in segments:
+        if offset <= end:
+            return offset
+        readable = end + 1
+    return readable
+
+
+class FileTail:
+    # inmekte olan dosyanin diske yazilmis kesintisiz on eki; okuyucular buyumesini bekler
+    __slots__ = ("readable", "total_size", "_changed")
+
+    def __init__(self):
+        self.readable = 0
+        self.total_size = 0
+        self._changed: Optional[asyncio.Event] = None
+
+    def begin(self, total_size: int, readable: int = 0):
+        # bastan indirmede readable sifirlanir; okuyucular yeniden yazilana kadar bekler
+        self.total_size = total_size
+        self.readable = readable
+        self._wake()
+
+    def advance(self, readable: int):
+        if readable > self.readable:
+            self.readable = readable
+            self._wake()
+
+    def close(self):
+        self._wake()
+
+    def _wake(self):
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+    async def wait(self, offset: int, timeout: float):
+        if self.readable > offset:
+            return
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class ArtifactResponse(FileResponse):
+    # sunucu http.response.pathsend destekliyorsa dosya sendfile ile gider; yoksa buyuk parcalarla okunur
+    chunk_size = FILE_SERVE_CHUNK_SIZE
+
+
+class TailResponse(StreamingResponse):
+    def __init__(self, content, path, **kwargs):
+        super().__init__(content, **kwargs)
+        self.path = path
+
+    async def stream_response(self, send: Send):
+        try:
+            await super().stream_response(send)
+        except FileTailError as e:
+            # yanit tamamlanmadan baglanti kapanir; istemci eksik aktarimi basarili sanmaz
+            logger.warning("Dosya akisi kesildi", extra={"path": str(self.path), "error": str(e)})
+
+
+def read_range(path, offset: int, length: int) -> bytes:
+    # her okumada dosya yeniden acilir; bastan indirmede silinip yeniden olusturulan dosya da gorulur
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except FileNotFoundError:
+        return b""
+    try:
+        return os.pread(fd, length, offset)
+    finally:
+        os.close(fd)
+
+
+async def tail_file(path, start: int, end: Optional[int],
+                    fetch: Callable[[int], Awaitable[Optional[Dict[str, Any]]]],
+                    chunk_size: int = FILE_SERVE_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    position = start
+    idle_since = time.monotonic()
+    while end is None or position < end:
+        info = await fetch(position)
+        if info is None:
+            raise FileTailError("File disappeared while streaming")
+        status = info["status"]
+        if status == "completed":
+            available = (await asyncio.to_thread(os.stat, path)).st_size
+            if position >= available:
+                return
+        elif status in FILE_TAIL_STATUSES:
+            available = info.get("readable", 0)
+        else:
+            raise FileTailError(f"Download {status} while streaming")
+        if end is not None:
+            available = min(available, end)
+
+        if position >= available:
+            if time.monotonic() - idle_since > FILE_TAIL_IDLE_SECONDS:
+                raise FileTailError("Download made no progress")
+            continue
+        while position < available:
+            chunk = await asyncio.to_thread(read_range, path, position, min(chunk_size, available - position))
+            if not chunk:
+                break
+            position += len(chunk)
+            yield chunk
+        idle_since = time.monotonic()
@@ -0,0 +1,298 @@
+
+import math
+import sys
+from array import array
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+# durumlar tek baytlik kodlarla saklanir; bilinmeyen bir durum ilk goruldugunde sona eklenir
+STATUSES: List[str] = [
+    "queued", "downloading", "retrying", "paused", "completed", "failed", "stalled", "cancelled", "interrupted",
+]
+STATUS_CODES: Dict[str, int] = {status: code for code, status in enumerate(STATUSES)}
+
+# size diske yazilan, wire_size agdan alinan byte sayisidir; sikistirilmis yanitta ikisi farklidir
+RECORD_FIELDS = ("file_id", "url", "status", "progress", "size", "wire_size", "error", "attempts", "start_time",
+                 "checksum", "encoding", "next_retry_in")
+# bu alanlar yalnizca degeri varsa kayitta gorunur
+OPTIONAL_FIELDS = ("checksum", "encoding", "next_retry_in")
+
+
+def status_code(status: str) -> int:
+    code = STATUS_CODES.get(status)
+    if code is None:
+        if len(STATUSES) > 255:
+            raise ValueError(f"too many distinct statuses: {status}")
+        code = STATUS_CODES[status] = len(STATUSES)
+        STATUSES.append(sys.intern(status))
+    return code
+
+
+class FileRecord:
+    # tek dosyanin tablo satirina bakan gecici gorunum; eski dict arayuzu korunur, veri tabloda kalir
+    __slots__ = ("table", "row")
+
+    def __init__(self, table: "FileTable", row: int):
+        self.table = table
+        self.row = row
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            getter = _GETTERS[key]
+        except KeyError:
+            raise KeyError(key) from None
+        value = getter(self.table, self.row)
+        if value is None and key in OPTIONAL_FIELDS:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any):
+        try:
+            setter = _SETTERS[key]
+        except KeyError:
+            raise KeyError(f"unknown file field: {key}") from None
+        setter(self.table, self.row, value)
+
+    def __contains__(self, key: str) -> bool:
+        getter = _GETTERS.get(key)
+        return getter is not None and (key not in OPTIONAL_FIELDS or getter(self.table, self.row) is not None)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        getter = _GETTERS.get(key)
+        if getter is None:
+            return default
+        value = getter(self.table, self.row)
+        return default if value is None and key in OPTIONAL_FIELDS else value
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        value = self.get(key, default)
+        if key in OPTIONAL_FIELDS or key == "error":
+            _SETTERS[key](self.table, self.row, None)
+        return value
+
+    def update(self, values: Mapping[str, Any]):
+        for key, value in values.items():
+            self[key] = value
+
+    def keys(self) -> List[str]:
+        return [key for key in RECORD_FIELDS if key in self]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: self.get(key) for key in self.keys()}
+
+    def __repr__(self) -> str:
+        return f"FileRecord({self.to_dict()!r})"
+
+
+class FileTable:
+    # bir oturumun dosya durumlari kolonlarda tutulur: dosya basina bir dict yerine birkac byte
+    __slots__ = ("index", "file_ids", "urls", "status", "progress", "size", "wire_size", "attempts", "start_time",
+                 "errors", "checksums", "encodings", "retry_in")
+
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.file_ids: List[str] = []
+        self.urls: List[str] = []
+        self.status = array("B")
+        self.progress = array("B")
+        self.size = array("q")
+        self.wire_size = array("q")
+        self.attempts = array("I")
+        # baslamamis dosyalar icin NaN
+        self.start_time = array("d")
+        # seyrek alanlar yalnizca dolu satirlar icin yer kaplar
+        self.errors: Dict[int, str] = {}
+        self.checksums: Dict[int, str] = {}
+        self.encodings: Dict[int, str] = {}
+        self.retry_in: Dict[int, float] = {}
+
+    def __len__(self) -> int:
+        return len(self.file_ids)
+
+    def __contains__(self, file_id: str) -> bool:
+        return file_id in self.index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.file_ids)
+
+    def __getitem__(self, file_id: str) -> FileRecord:
+        return FileRecord(self, self.index[file_id])
+
+    def get(self, file_id: str) -> Optional[FileRecord]:
+        row = self.index.get(file_id)
+        return FileRecord(self, row) if row is not None else None
+
+    def keys(self) -> List[str]:
+        return self.file_ids
+
+    def values(self) -> Iterator[FileRecord]:
+        return (FileRecord(self, row) for row in range(len(self.file_ids)))
+
+    def items(self) -> Iterator[Tuple[str, FileRecord]]:
+        return ((file_id, FileRecord(self, row)) for row, file_id in enumerate(self.file_ids))
+
+    def put(self, info: Mapping[str, Any]) -> FileRecord:
+        file_id = info["file_id"]
+        row = self.index.get(file_id)
+        if row is None:
+            row = self.index[file_id] = len(self.file_ids)
+            self.file_ids.append(file_id)
+            self.urls.append(info["url"])
+            self.status.append(status_code(info.get("status") or "queued"))
+            self.progress.append(min(max(int(info.get("progress") or 0), 0), 255))
+            self.size.append(int(info.get("size") or 0))
+            self.wire_size.append(int(info.get("wire_size") or 0))
+            self.attempts.append(int(info.get("attempts") or 0))
+            start_time = info.get("start_time")
+            self.start_time.append(math.nan if start_time is None else float(start_time))
+            for key, column in _SPARSE_COLUMNS:
+                value = info.get(key)
+                if value is not None:
+                    getattr(self, column)[row] = value
+            return FileRecord(self, row)
+        record = FileRecord(self, row)
+        for key in RECORD_FIELDS[1:]:
+            if key in info:
+                record[key] = info[key]
+            elif key in OPTIONAL_FIELDS or key == "error":
+                _SETTERS[key](self, row, None)
+        return record
+
+    def status_counts(self) -> Dict[str, int]:
+        # bytes.count C dongusunde sayar; milyon dosyada bile dosya basina Python nesnesi olusmaz
+        data = self.status.tobytes()
+        counts = {}
+        for code, status in enumerate(STATUSES):
+            count = data.count(code)
+            if count:
+                counts[status] = count
+        return counts
+
+    def select(self, status: str) -> List[str]:
+        code = STATUS_CODES.get(status)
+        if code is None:
+            return []
+        data = self.status.tobytes()
+        selected = []
+        row = data.find(code)
+        while row >= 0:
+            selected.append(self.file_ids[row])
+            row = data.find(code, row + 1)
+        return selected
+
+    def summary(self) -> Dict[str, Any]:
+        total = len(self.file_ids)
+        return {
+            "files": total,
+            "status_counts": self.status_counts(),
+            "bytes": sum(self.size),
+            "wire_bytes": sum(self.wire_size),
+            "progress": round(sum(self.progress) / total, 1) if total else 0.0,
+            "errors": len(self.errors),
+        }
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {file_id: FileRecord(self, row).to_dict() for row, file_id in enumerate(self.file_ids)}
+
+    def memory_bytes(self) -> int:
+        columns = (self.status, self.progress, self.size, self.wire_size, self.attempts, self.start_time)
+        return sum(column.itemsize * len(column) for column in columns)
+
+
+def merge_summaries(summaries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # ayni oturumun farkli worker'lardaki parcalarinin ozetleri; ilerleme dosya sayisina gore agirliklanir
+    total = sum(summary["files"] for summary in summaries)
+    status_counts: Dict[str, int] = {}
+    for summary in summaries:
+        for status, count in summary["status_counts"].items():
+            status_counts[status] = status_counts.get(status, 0) + count
+    return {
+        "files": total,
+        "status_counts": status_counts,
+        "bytes": sum(summary["bytes"] for summary in summaries),
+        "wire_bytes": sum(summary["wire_bytes"] for summary in summaries),
+        "progress": round(sum(summary["progress"] * summary["files"] for summary in summaries) / total, 1)
+        if total else 0.0,
+        "errors": sum(summary["errors"] for summary in summaries),
+    }
+
+
+def _get_start_time(table: FileTable, row: int) -> Optional[float]:
+    value = table.start_time[row]
+    return None if math.isnan(value) else value
+
+
+def _set_sparse(column: str):
+    def setter(table: FileTable, row: int, value: Any):
+        values = getattr(table, column)
+        if value is None:
+            values.pop(row, None)
+        else:
+            values[row] = value
+    return setter
+
+
+def _set_url(table: FileTable, row: int, value: str):
+    table.urls[row] = value
+
+
+def _set_file_id(table: FileTable, row: int, value: str):
+    if table.file_ids[row] != value:
+        raise ValueError("file_id of a tracked file cannot change")
+
+
+def _set_status(table: FileTable, row: int, value: str):
+    table.status[row] = status_code(value)
+
+
+def _set_progress(table: FileTable, row: int, value: int):
+    table.progress[row] = min(max(int(value or 0), 0), 255)
+
+
+def _set_size(table: FileTable, row: int, value: int):
+    table.size[row] = int(value or 0)
+
+
+def _set_wire_size(table: FileTable, row: int, value: int):
+    table.wire_size[row] = int(value or 0)
+
+
+def _set_attempts(table: FileTable, row: int, value: int):
+    table.attempts[row] = int(value or 0)
+
+
+def _set_start_time(table: FileTable, row: int, value: Optional[float]):
+    table.start_time[row] = math.nan if value is None else float(value)
+
+
+_SPARSE_COLUMNS = (("error", "errors"), ("checksum", "checksums"), ("encoding", "encodings"),
+                   ("next_retry_in", "retry_in"))
+
+_GETTERS = {
+    "file_id": lambda table, row: table.file_ids[row],
+    "url": lambda table, row: table.urls[row],
+    "status": lambda table, row: STATUSES[table.status[row]],
+    "progress": lambda table, row: table.progress[row],
+    "size": lambda table, row: table.size[row],
+    "wire_size": lambda table, row: table.wire_size[row],
+    "error": lambda table, row: table.errors.get(row),
+    "attempts": lambda table, row: table.attempts[row],
+    "start_time": _get_start_time,
+    "checksum": lambda table, row: table.checksums.get(row),
+    "encoding": lambda table, row: table.encodings.get(row),
+    "next_retry_in": lambda table, row: table.retry_in.get(row),
+}
+
+_SETTERS = {
+    "file_id": _set_file_id,
+    "url": _set_url,
+    "status": _set_status,
+    "progress": _set_progress,
+    "size": _set_size,
+    "wire_size": _set_wire_size,
+    "error": _set_sparse("errors"),
+    "attempts": _set_attempts,
+    "start_time": _set_start_time,
+    "checksum": _set_sparse("checksums"),
+    "encoding": _set_sparse("encodings"),
+    "next_retry_in": _set_sparse("retry_in"),
+}
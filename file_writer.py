@@ -0,0 +1,128 @@
+
+import asyncio
+import os
+from typing import AsyncIterator, Optional
+
+import aiohttp
+
+CHUNK_SIZE_MIN = 64 * 1024
+CHUNK_SIZE_MAX = 1024 * 1024
+WRITE_BUFFER_SIZE = 2 * 1024 * 1024
+PREALLOCATE = True
+
+
+async def iter_adaptive_chunks(stream: aiohttp.StreamReader,
+                               min_size: int = CHUNK_SIZE_MIN,
+                               max_size: int = CHUNK_SIZE_MAX) -> AsyncIterator[bytes]:
+    # okuma her seferinde istenen boyutu dolduruyorsa baglanti hizli demektir, parcayi buyutuyoruz
+    size = min_size
+    while True:
+        chunk = await stream.read(size)
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) >= size and size < max_size:
+            size = min(size * 2, max_size)
+
+
+def open_for_write(path, truncate: bool = True) -> int:
+    # dosya onbellekteki bir blob'a hardlink olabilir; uzerine yazmak yerine once bag koparilir
+    if truncate:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+    return os.open(str(path), os.O_WRONLY | os.O_CREAT, 0o644)
+
+
+def preallocate(fd: int, offset: int, length: int):
+    if not PREALLOCATE or length <= 0 or not hasattr(os, "posix_fallocate"):
+        return
+    try:
+        os.posix_fallocate(fd, offset, length)
+    except OSError:
+        # bazi dosya sistemleri desteklemiyor (tmpfs eski surumler, NFS), yazma yine calisir
+        pass
+
+
+class BufferedFileWriter:
+    def __init__(self, path, offset: int = 0, buffer_size: int = WRITE_BUFFER_SIZE,
+                 truncate: bool = True, expected_size: int = 0, fd: Optional[int] = None, hasher=None):
+        self.path = path
+        self.offset = offset
+        self.buffer_size = buffer_size
+        self.truncate = truncate
+        self.expected_size = expected_size
+        self.fd = fd
+        self._owns_fd = fd is None
+        # yazma sirali oldugu surece ozet flush thread'inde, veri diske giderken hesaplanir
+        self.hasher = hasher
+        self._buffer = bytearray()
+
+        self.bytes_flushed = offset
+        self.flush_count = 0
+
+    @property
+    def bytes_written(self) -> int:
+        return self.bytes_flushed + len(self._buffer)
+
+    def _open_sync(self) -> int:
+        fd = open_for_write(self.path, self.truncate)
+        if self.expected_size > self.offset:
+            preallocate(fd, self.offset, self.expected_size - self.offset)
+        return fd
+
+    async def open(self) -> "BufferedFileWriter":
+        if self.fd is None:
+            self.fd = await asyncio.to_thread(self._open_sync)
+        return self
+
+    def _pwrite_all(self, data: bytes, offset: int):
+        if self.hasher is not None:
+            self.hasher.update(data)
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(self.fd, view, offset)
+            view = view[written:]
+            offset += written
+
+    async def write(self, chunk: bytes) -> int:
+        self._buffer += chunk
+        if len(self._buffer) >= self.buffer_size:
+            return await self.flush()
+        return 0
+
+    async def flush(self) -> int:
+        if not self._buffer:
+            return 0
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        await asyncio.to_thread(self._pwrite_all, data, self.bytes_flushed)
+        self.bytes_flushed += len(data)
+        self.flush_count += 1
+        return len(data)
+
+    def _close_sync(self, final_size: Optional[int]):
+        try:
+            if final_size is not None:
+                os.ftruncate(self.fd, final_size)
+        finally:
+            if self._owns_fd:
+                os.close(self.fd)
+
+    async def close(self, final_size: Optional[int] = None):
+        if self.fd is None:
+            return
+        try:
+            await self.flush()
+        finally:
+            await asyncio.to_thread(self._close_sync, final_size)
+            if self._owns_fd:
+                self.fd = None
+
+    async def __aenter__(self) -> "BufferedFileWriter":
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        # on tahsis edilen alan, beklenenden kisa inen dosyada sonda sifir olarak kalmasin
+        await self.close(self.bytes_written if self.expected_size else None)
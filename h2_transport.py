@@ -0,0 +1,498 @@
+
+import asyncio
+import collections
+import ssl
+import time
+from typing import Any, Deque, Dict, List, Mapping, Optional, Set, Tuple
+from urllib.parse import urljoin, urlsplit
+
+import aiohttp
+from multidict import CIMultiDict, CIMultiDictProxy
+
+from metrics import CONNECTION_SETUP, TIME_TO_FIRST_BYTE
+from structured_logging import get_logger
+
+# h2 istege bagli; kurulu degilse h2 tasimasi secilemez
+try:
+    import h2.config
+    import h2.connection
+    import h2.errors
+    import h2.events
+    import h2.exceptions
+    import h2.settings
+except ImportError:
+    h2 = None
+
+H2_STREAM_WINDOW = 4 * 1024 * 1024
+H2_CONNECTION_WINDOW = 16 * 1024 * 1024
+H2_MAX_STREAMS = 100
+H2_READ_SIZE = 256 * 1024
+H2_CONNECT_TIMEOUT = 30.0
+H2_MAX_REDIRECTS = 10
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+# HTTP/2'de baglantiya ozel basliklar gonderilemez
+HOP_BY_HOP_HEADERS = {"connection", "keep-alive", "proxy-connection", "transfer-encoding", "upgrade", "host"}
+
+logger = get_logger("h2")
+
+
+class H2TransportError(aiohttp.ClientConnectionError):
+    pass
+
+
+class H2NotSupported(H2TransportError):
+    pass
+
+
+def h2_available() -> bool:
+    return h2 is not None
+
+
+class H2Stream:
+    # tek istegin yanit govdesi; okunan veri kadar pencere acilir, yavas okuyucu sunucuyu yavaslatir
+    __slots__ = ("connection", "stream_id", "status", "headers", "chunks", "ended", "error", "_changed",
+                 "_deadline", "_read_timeout")
+
+    def __init__(self, connection: "H2Connection", stream_id: int, deadline: Optional[float],
+                 read_timeout: Optional[float]):
+        self.connection = connection
+        self.stream_id = stream_id
+        self.status = 0
+        self.headers: CIMultiDictProxy = CIMultiDictProxy(CIMultiDict())
+        self.chunks: Deque[List[Any]] = collections.deque()
+        self.ended = False
+        self.error: Optional[Exception] = None
+        self._changed: Optional[asyncio.Event] = None
+        self._deadline = deadline
+        self._read_timeout = read_timeout
+
+    def wake(self):
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+    def fail(self, error: Exception):
+        if self.error is None and not self.ended:
+            self.error = error
+        self.wake()
+
+    async def _wait(self):
+        if self.error is not None:
+            raise self.error
+        timeout = self._read_timeout
+        if self._deadline is not None:
+            remaining = self._deadline - time.monotonic()
+            timeout = remaining if timeout is None else min(timeout, remaining)
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        await asyncio.wait_for(self._changed.wait(), timeout)
+
+    async def wait_headers(self):
+        while not self.status:
+            await self._wait()
+
+    async def read(self, n: int = -1) -> bytes:
+        while not self.chunks:
+            if self.error is not None:
+                raise self.error
+            if self.ended:
+                return b""
+            await self._wait()
+        data = bytearray()
+        acknowledged = 0
+        while self.chunks and (n < 0 or len(data) < n):
+            chunk = self.chunks[0]
+            take = len(chunk[0]) if n < 0 else min(len(chunk[0]), n - len(data))
+            data += chunk[0][:take]
+            if take == len(chunk[0]):
+                self.chunks.popleft()
+                acknowledged += chunk[1]
+            else:
+                chunk[0] = chunk[0][take:]
+        if acknowledged:
+            self.connection.acknowledge(self.stream_id, acknowledged)
+        return bytes(data)
+
+
+class H2Response:
+    # aiohttp.ClientResponse'un indirme hattinda kullanilan kismi: status, headers, content.read()
+    def __init__(self, stream: H2Stream, url: str):
+        self.stream = stream
+        self.url = url
+        self.status = stream.status
+        self.headers = stream.headers
+        self.content = stream
+
+    async def read(self) -> bytes:
+        return await self.stream.read()
+
+    def release(self):
+        self.stream.connection.close_stream(self.stream)
+
+
+class H2Connection:
+    def __init__(self, scheme: str, host: str, port: int, ssl_context: Optional[ssl.SSLContext]):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.authority = host if port in (80, 443) else f"{host}:{port}"
+        self.ssl_context = ssl_context
+        self.h2 = None
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.streams: Dict[int, H2Stream] = {}
+        self.closed = False
+        self.goaway = False
+        self.error: Optional[Exception] = None
+        self.requests = 0
+        self._ready: Optional[asyncio.Future] = None
+        self._slots: Optional[asyncio.Event] = None
+        self._reader_task: Optional[asyncio.Task] = None
+
+    @property
+    def usable(self) -> bool:
+        return not self.closed and not self.goaway
+
+    async def connect(self, timeout: float):
+        started = time.monotonic()
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self.ssl_context,
+                                    server_hostname=self.host if self.ssl_context else None),
+            timeout)
+        if self.ssl_context is not None:
+            protocol = self.writer.get_extra_info("ssl_object").selected_alpn_protocol()
+            if protocol != "h2":
+                self.writer.close()
+                raise H2NotSupported(f"{self.authority} HTTP/2 desteklemiyor (ALPN: {protocol})")
+        config = h2.config.H2Configuration(client_side=True, header_encoding="utf-8")
+        self.h2 = h2.connection.H2Connection(config=config)
+        self.h2.local_settings = h2.settings.Settings(client=True, initial_values={
+            h2.settings.SettingCodes.INITIAL_WINDOW_SIZE: H2_STREAM_WINDOW,
+            h2.settings.SettingCodes.ENABLE_PUSH: 0,
+            h2.settings.SettingCodes.MAX_CONCURRENT_STREAMS: H2_MAX_STREAMS,
+        })
+        self.h2.initiate_connection()
+        self.h2.increment_flow_control_window(H2_CONNECTION_WINDOW - self.h2.inbound_flow_control_window)
+        self._ready = asyncio.get_running_loop().create_future()
+        self._reader_task = asyncio.create_task(self._read_loop())
+        try:
+            await self._flush()
+            # sunucunun SETTINGS cercevesi gelene kadar beklenir; h2c konusmayan sunucu burada anlasilir
+            await asyncio.wait_for(asyncio.shield(self._ready), timeout)
+        except BaseException:
+            self.close()
+            raise
+        CONNECTION_SETUP.observe(time.monotonic() - started)
+
+    async def _flush(self):
+        data = self.h2.data_to_send()
+        if data and not self.closed:
+            self.writer.write(data)
+            await self.writer.drain()
+
+    async def _read_loop(self):
+        first = True
+        try:
+            while True:
+                data = await self.reader.read(H2_READ_SIZE)
+                if not data:
+                    if not self._ready.done():
+                        raise H2NotSupported(f"{self.authority} HTTP/2 on bilgisiyle baglanmayi kabul etmedi")
+                    raise H2TransportError("Sunucu baglantiyi kapatti")
+                if first and data.startswith(b"HTTP/"):
+                    raise H2NotSupported(f"{self.authority} h2c desteklemiyor")
+                first = False
+                for event in self.h2.receive_data(data):
+                    self._handle(event)
+                await self._flush()
+        except asyncio.CancelledError:
+            self._shutdown(H2TransportError("Baglanti kapatildi"))
+        except H2TransportError as e:
+            self._shutdown(e)
+        except (OSError, h2.exceptions.ProtocolError) as e:
+            self._shutdown(H2TransportError(str(e) or type(e).__name__))
+
+    def _handle(self, event):
+        if isinstance(event, h2.events.RemoteSettingsChanged):
+            if not self._ready.done():
+                self._ready.set_result(None)
+            self._wake_slots()
+            return
+        if isinstance(event, h2.events.ConnectionTerminated):
+            # GOAWAY: son islenen akistan sonrakiler baska baglantida yeniden denenebilir
+            self.goaway = True
+            error = H2TransportError(f"GOAWAY ({event.error_code})")
+            for stream_id, stream in list(self.streams.items()):
+                if event.error_code or stream_id > (event.last_stream_id or 0):
+                    stream.fail(error)
+            self._wake_slots()
+            return
+        stream_id = getattr(event, "stream_id", None)
+        stream = self.streams.get(stream_id) if stream_id else None
+        if isinstance(event, h2.events.DataReceived):
+            if stream is None or not event.data:
+                # kapatilmis akisa ya da yalnizca dolgudan olusan cerceveye gelen veri hemen onaylanir
+                self.acknowledge(stream_id, event.flow_controlled_length)
+            else:
+                stream.chunks.append([event.data, event.flow_controlled_length])
+                stream.wake()
+        elif stream is None:
+            return
+        elif isinstance(event, h2.events.ResponseReceived):
+            headers = CIMultiDict()
+            for name, value in event.headers:
+                if name == ":status":
+                    status = int(value)
+                elif not name.startswith(":"):
+                    headers.add(name, value)
+            stream.headers = CIMultiDictProxy(headers)
+            stream.status = status
+            stream.wake()
+        elif isinstance(event, h2.events.StreamEnded):
+            stream.ended = True
+            self._forget(stream)
+        elif isinstance(event, h2.events.StreamReset):
+            stream.fail(H2TransportError(f"Akis sifirlandi ({event.error_code})"))
+            self._forget(stream)
+
+    def _forget(self, stream: H2Stream):
+        self.streams.pop(stream.stream_id, None)
+        stream.wake()
+        self._wake_slots()
+
+    def _wake_slots(self):
+        if self._slots is not None:
+            self._slots.set()
+            self._slots = None
+
+    def _shutdown(self, error: Exception):
+        if self.closed:
+            return
+        if self._ready is not None and not self._ready.done():
+            self._ready.set_exception(error)
+            # connect() beklemiyorsa "exception never retrieved" uyarisi cikmasin
+            self._ready.exception()
+        self.closed = True
+        self.error = error
+        for stream in list(self.streams.values()):
+            stream.fail(error)
+        self.streams.clear()
+        self._wake_slots()
+        if self.writer is not None:
+            self.writer.close()
+
+    def has_slot(self) -> bool:
+        limit = min(self.h2.remote_settings.max_concurrent_streams, H2_MAX_STREAMS)
+        return self.h2.open_outbound_streams < limit
+
+    async def open_stream(self, method: str, path: str, headers: Mapping[str, str],
+                          deadline: Optional[float], read_timeout: Optional[float]) -> H2Stream:
+        while not self.has_slot():
+            if not self.usable:
+                raise self.error or H2TransportError("Baglanti kullanilamaz")
+            if self._slots is None:
+                self._slots = asyncio.Event()
+            await self._slots.wait()
+        if not self.usable:
+            raise self.error or H2TransportError("Baglanti kullanilamaz")
+        stream_id = self.h2.get_next_available_stream_id()
+        request_headers = [(":method", method), (":scheme", self.scheme), (":authority", self.authority),
+                           (":path", path)]
+        request_headers += [(name.lower(), str(value)) for name, value in headers.items()
+                            if name.lower() not in HOP_BY_HOP_HEADERS]
+        stream = self.streams[stream_id] = H2Stream(self, stream_id, deadline, read_timeout)
+        self.h2.send_headers(stream_id, request_headers, end_stream=True)
+        self.requests += 1
+        await self._flush()
+        return stream
+
+    def acknowledge(self, stream_id: int, length: int):
+        # kapanmis akislarda h2 yalnizca baglanti penceresini acar
+        if self.closed or not length:
+            return
+        self.h2.acknowledge_received_data(length, stream_id)
+        self._send_pending()
+
+    def close_stream(self, stream: H2Stream):
+        # govdesi sonuna kadar okunmayan akis iptal edilir, tamponlanmis veri baglanti penceresine iade edilir
+        pending = sum(chunk[1] for chunk in stream.chunks)
+        stream.chunks.clear()
+        if stream.stream_id in self.streams and not self.closed:
+            self.streams.pop(stream.stream_id)
+            try:
+                self.h2.reset_stream(stream.stream_id, h2.errors.ErrorCodes.CANCEL)
+            except h2.exceptions.StreamClosedError:
+                pass
+            self._wake_slots()
+        self.acknowledge(stream.stream_id, pending)
+        self._send_pending()
+
+    def _send_pending(self):
+        if self.closed:
+            return
+        data = self.h2.data_to_send()
+        if data:
+            self.writer.write(data)
+
+    def close(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        self._shutdown(H2TransportError("Baglanti kapatildi"))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"streams": len(self.streams), "requests": self.requests, "goaway": self.goaway}
+
+
+class H2RequestContext:
+    def __init__(self, session: "H2Session", method: str, url: str, headers: Optional[Mapping[str, str]],
+                 timeout: Optional[aiohttp.ClientTimeout], allow_redirects: bool):
+        self.session = session
+        self.method = method
+        self.url = url
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+        self.allow_redirects = allow_redirects
+        self.response: Optional[H2Response] = None
+        self._fallback = None
+
+    async def __aenter__(self):
+        origin = self.session.origin(self.url)
+        if origin in self.session.http1_origins:
+            return await self._use_fallback()
+        try:
+            self.response = await self.session._request(self.method, self.url, self.headers, self.timeout,
+                                                        self.allow_redirects)
+        except H2NotSupported as e:
+            self.session.mark_http1(self.url, str(e))
+            return await self._use_fallback()
+        return self.response
+
+    async def _use_fallback(self):
+        self._fallback = self.session.fallback.request(self.method, self.url, headers=self.headers,
+                                                       timeout=self.timeout, allow_redirects=self.allow_redirects)
+        return await self._fallback.__aenter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._fallback is not None:
+            return await self._fallback.__aexit__(exc_type, exc, tb)
+        if self.response is not None:
+            self.response.release()
+
+
+class H2Session:
+    # ayni origin'e giden istekler tek baglantida akis olarak coklanir; h2 konusmayan origin HTTP/1.1'e duser
+    def __init__(self, fallback: aiohttp.ClientSession, connect_timeout: float = H2_CONNECT_TIMEOUT):
+        if h2 is None:
+            raise RuntimeError("HTTP/2 tasimasi icin h2 paketi kurulu olmali")
+        self.fallback = fallback
+        self.connect_timeout = connect_timeout
+        self.connections: Dict[Tuple[str, str, int], H2Connection] = {}
+        self.http1_origins: Set[Tuple[str, str, int]] = set()
+        self.http1_hosts: Set[str] = set()
+        self._connecting: Dict[Tuple[str, str, int], asyncio.Future] = {}
+        self._ssl_context: Optional[ssl.SSLContext] = None
+        self.connections_created = 0
+        self.requests_started = 0
+
+    @staticmethod
+    def origin(url: str) -> Tuple[str, str, int]:
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        return scheme, (parts.hostname or "").lower(), parts.port or (443 if scheme == "https" else 80)
+
+    def ssl_context(self) -> ssl.SSLContext:
+        if self._ssl_context is None:
+            self._ssl_context = ssl.create_default_context()
+            self._ssl_context.set_alpn_protocols(["h2"])
+        return self._ssl_context
+
+    def mark_http1(self, url: str, reason: str):
+        origin = self.origin(url)
+        self.http1_hosts.add(urlsplit(url).netloc.lower())
+        if origin not in self.http1_origins:
+            self.http1_origins.add(origin)
+            logger.warning("HTTP/2 kullanilamiyor, HTTP/1.1'e geciliyor",
+                           extra={"origin": f"{origin[0]}://{origin[1]}:{origin[2]}", "reason": reason})
+
+    async def connection(self, origin: Tuple[str, str, int], timeout: float) -> H2Connection:
+        connection = self.connections.get(origin)
+        if connection is not None and connection.usable:
+            return connection
+        # ayni anda gelen istekler tek bir baglanti kurulumunu bekler
+        pending = self._connecting.get(origin)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        pending = self._connecting[origin] = asyncio.get_running_loop().create_future()
+        try:
+            scheme, host, port = origin
+            connection = H2Connection(scheme, host, port, self.ssl_context() if scheme == "https" else None)
+            await connection.connect(timeout)
+            self.connections[origin] = connection
+            self.connections_created += 1
+            pending.set_result(connection)
+            return connection
+        except BaseException as e:
+            pending.set_exception(e)
+            pending.exception()
+            raise
+        finally:
+            del self._connecting[origin]
+
+    async def _request(self, method: str, url: str, headers: Dict[str, str],
+                       timeout: Optional[aiohttp.ClientTimeout], allow_redirects: bool) -> H2Response:
+        started = time.monotonic()
+        total = timeout.total if timeout is not None else None
+        deadline = started + total if total else None
+        connect_timeout = (timeout.sock_connect or timeout.connect) if timeout is not None else None
+        connect_timeout = min(filter(None, (connect_timeout, total, self.connect_timeout)))
+        read_timeout = timeout.sock_read if timeout is not None else None
+        for _ in range(H2_MAX_REDIRECTS + 1):
+            origin = self.origin(url)
+            if origin in self.http1_origins:
+                raise H2NotSupported("HTTP/1.1'e dusuldu")
+            connection = await self.connection(origin, connect_timeout)
+            parts = urlsplit(url)
+            path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+            self.requests_started += 1
+            stream = await connection.open_stream(method, path, headers, deadline, read_timeout)
+            try:
+                await stream.wait_headers()
+            except BaseException:
+                connection.close_stream(stream)
+                raise
+            TIME_TO_FIRST_BYTE.observe(time.monotonic() - started)
+            location = stream.headers.get("location")
+            if not allow_redirects or stream.status not in REDIRECT_STATUSES or not location:
+                return H2Response(stream, url)
+            connection.close_stream(stream)
+            url = urljoin(url, location)
+            if stream.status == 303 and method != "HEAD":
+                method = "GET"
+        raise aiohttp.TooManyRedirects(aiohttp.RequestInfo(url, method, CIMultiDictProxy(CIMultiDict())), ())
+
+    def request(self, method: str, url: str, headers: Optional[Mapping[str, str]] = None,
+                timeout: Optional[aiohttp.ClientTimeout] = None, allow_redirects: bool = True) -> H2RequestContext:
+        return H2RequestContext(self, method, url, headers, timeout, allow_redirects)
+
+    def get(self, url: str, **kwargs) -> H2RequestContext:
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url: str, allow_redirects: bool = False, **kwargs) -> H2RequestContext:
+        return self.request("HEAD", url, allow_redirects=allow_redirects, **kwargs)
+
+    async def close(self):
+        for connection in self.connections.values():
+            connection.close()
+        self.connections.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connections": len([connection for connection in self.connections.values() if connection.usable]),
+            "connections_created": self.connections_created,
+            "requests_started": self.requests_started,
+            "http1_fallback": sorted(f"{scheme}://{host}:{port}" for scheme, host, port in self.http1_origins),
+            "origins": {f"{scheme}://{host}:{port}": connection.stats()
+                        for (scheme, host, port), connection in self.connections.items() if connection.usable},
+        }
@@ -0,0 +1,155 @@
+
+import time
+import aiohttp
+from typing import Dict, Any, Optional
+
+from metrics import CONNECTION_SETUP, TIME_TO_FIRST_BYTE
+
+POOL_LIMIT = 100
+POOL_LIMIT_PER_HOST = 10
+KEEPALIVE_TIMEOUT = 30
+DNS_CACHE_TTL = 300
+
+
+class SessionPool:
+    def __init__(
+        self,
+        limit: int = POOL_LIMIT,
+        limit_per_host: int = POOL_LIMIT_PER_HOST,
+        keepalive_timeout: float = KEEPALIVE_TIMEOUT,
+        ttl_dns_cache: int = DNS_CACHE_TTL,
+        auto_decompress: bool = True,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        self.auto_decompress = auto_decompress
+
+        self._connector: Optional[aiohttp.TCPConnector] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._started_at: Optional[float] = None
+
+        self.requests_started = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            self.requests_started += 1
+            ctx.request_started = time.monotonic()
+
+        async def on_request_end(session, ctx, params):
+            # yanit basliklari okundugunda cagrilir: ilk byte'a kadar gecen sure
+            TIME_TO_FIRST_BYTE.observe(time.monotonic() - ctx.request_started)
+
+        async def on_connection_create_start(session, ctx, params):
+            ctx.connection_started = time.monotonic()
+
+        async def on_connection_create_end(session, ctx, params):
+            self.connections_created += 1
+            CONNECTION_SETUP.observe(time.monotonic() - ctx.connection_started)
+
+        async def on_connection_reuseconn(session, ctx, params):
+            self.connections_reused += 1
+
+        async def on_dns_cache_hit(session, ctx, params):
+            self.dns_cache_hits += 1
+
+        async def on_dns_cache_miss(session, ctx, params):
+            self.dns_cache_misses += 1
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_end.append(on_request_end)
+        trace.on_connection_create_start.append(on_connection_create_start)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace
+
+    async def start(self) -> aiohttp.ClientSession:
+        if self._session is not None and not self._session.closed:
+            return self._session
+
+        self._connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.ttl_dns_cache,
+            use_dns_cache=True,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=self._connector,
+            trace_configs=[self._trace_config()],
+            auto_decompress=self.auto_decompress,
+        )
+        self._started_at = time.time()
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._connector = None
+        self._started_at = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            raise RuntimeError("SessionPool baslatilmadi, once start() cagrilmali")
+        return self._session
+
+    @property
+    def started(self) -> bool:
+        return self._session is not None and not self._session.closed
+
+    async def __aenter__(self) -> "SessionPool":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def stats(self) -> Dict[str, Any]:
+        in_use = 0
+        idle = 0
+        per_host: Dict[str, Dict[str, int]] = {}
+
+        connector = self._connector
+        if connector is not None and not connector.closed:
+            acquired = getattr(connector, "_acquired", set())
+            in_use = len(acquired)
+
+            for key, conns in getattr(connector, "_conns", {}).items():
+                host = f"{key.host}:{key.port}"
+                per_host.setdefault(host, {"in_use": 0, "idle": 0})
+                per_host[host]["idle"] += len(conns)
+                idle += len(conns)
+
+            for key, conns in getattr(connector, "_acquired_per_host", {}).items():
+                host = f"{key.host}:{key.port}"
+                per_host.setdefault(host, {"in_use": 0, "idle": 0})
+                per_host[host]["in_use"] += len(conns)
+
+        return {
+            "started": self.started,
+            "uptime_seconds": round(time.time() - self._started_at, 3) if self._started_at else 0,
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "keepalive_timeout": self.keepalive_timeout,
+            "ttl_dns_cache": self.ttl_dns_cache,
+            "auto_decompress": self.auto_decompress,
+            "connections_in_use": in_use,
+            "connections_idle": idle,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "requests_started": self.requests_started,
+            "dns_cache_hits": self.dns_cache_hits,
+            "dns_cache_misses": self.dns_cache_misses,
+            "hosts": per_host,
+        }
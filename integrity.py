@@ -0,0 +1,78 @@
+
+import hashlib
+import string
+from typing import Iterable, Optional, Tuple
+
+HASH_ALGORITHMS = ("sha256", "blake2b")
+DEFAULT_HASH_ALGORITHM = "sha256"
+HASH_READ_BLOCK = 1024 * 1024
+
+
+class ChecksumMismatch(Exception):
+    def __init__(self, algorithm: str, expected: str, actual: str):
+        super().__init__(f"Checksum mismatch ({algorithm}): expected {expected}, got {actual}")
+        self.algorithm = algorithm
+        self.expected = expected
+        self.actual = actual
+
+
+def parse_checksum(value: str, default_algorithm: str = DEFAULT_HASH_ALGORITHM) -> Tuple[str, str]:
+    algorithm, sep, digest = value.strip().partition(":")
+    if not sep:
+        algorithm, digest = default_algorithm, value.strip()
+    algorithm = algorithm.lower()
+    digest = digest.lower()
+    if algorithm not in HASH_ALGORITHMS:
+        raise ValueError(f"unsupported checksum algorithm: {algorithm}")
+    if len(digest) != hashlib.new(algorithm).digest_size * 2 or not set(digest) <= set(string.hexdigits):
+        raise ValueError(f"invalid {algorithm} checksum: {value}")
+    return algorithm, digest
+
+
+class StreamingDigest:
+    # ayni veri tek geciste birden fazla algoritmaya beslenir (onbellek adresi + dogrulama)
+    def __init__(self, algorithms: Iterable[str]):
+        self.hashers = {algorithm: hashlib.new(algorithm) for algorithm in dict.fromkeys(algorithms)}
+
+    def update(self, data: bytes):
+        for hasher in self.hashers.values():
+            hasher.update(data)
+
+    def update_from_file(self, path, length: Optional[int] = None):
+        remaining = length
+        with open(path, 'rb') as f:
+            while remaining is None or remaining > 0:
+                block = f.read(HASH_READ_BLOCK if remaining is None else min(HASH_READ_BLOCK, remaining))
+                if not block:
+                    break
+                self.update(block)
+                if remaining is not None:
+                    remaining -= len(block)
+
+    def hexdigest(self, algorithm: str) -> str:
+        return self.hashers[algorithm].hexdigest()
+
+
+def digest_file(path, algorithms: Iterable[str]) -> StreamingDigest:
+    digest = StreamingDigest(algorithms)
+    digest.update_from_file(path)
+    return digest
+
+
+class ChecksumSpec:
+    __slots__ = ("algorithm", "expected")
+
+    def __init__(self, algorithm: str = DEFAULT_HASH_ALGORITHM, expected: Optional[str] = None):
+        self.algorithm = algorithm
+        self.expected = expected
+
+    @classmethod
+    def from_item(cls, checksum: Optional[str], algorithm: Optional[str] = None) -> "ChecksumSpec":
+        if checksum:
+            return cls(*parse_checksum(checksum, algorithm or DEFAULT_HASH_ALGORITHM))
+        return cls(algorithm or DEFAULT_HASH_ALGORITHM)
+
+    def verify(self, actual: str) -> str:
+        if self.expected is not None and actual != self.expected:
+            raise ChecksumMismatch(self.algorithm, self.expected, actual)
+        return f"{self.algorithm}:{actual}"
@@ -0,0 +1,164 @@
+
+import csv
+import json
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from content_encoding import COMPRESSION_MODES
+from integrity import DEFAULT_HASH_ALGORITHM, parse_checksum
+
+MAX_LINE_BYTES = 64 * 1024
+MAX_ERROR_SAMPLES = 20
+
+FILE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_][A-Za-z0-9._-]{0,199}$")
+
+JSONL_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-lines", "application/json")
+CSV_CONTENT_TYPES = ("text/csv", "application/csv")
+
+
+class ManifestError(Exception):
+    pass
+
+
+def validate_file_item(file_id: Any, url: Any) -> Optional[str]:
+    if not isinstance(file_id, str) or not FILE_ID_PATTERN.match(file_id):
+        return f"invalid id: {file_id!r}"
+    if not isinstance(url, str):
+        return f"invalid url: {url!r}"
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.netloc:
+        return f"invalid url: {url!r}"
+    return None
+
+
+def detect_format(content_type: Optional[str], explicit: Optional[str] = None) -> str:
+    if explicit:
+        explicit = explicit.lower()
+        if explicit not in ("jsonl", "csv"):
+            raise ManifestError(f"Unsupported manifest format: {explicit}")
+        return explicit
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in CSV_CONTENT_TYPES:
+        return "csv"
+    if content_type in JSONL_CONTENT_TYPES or not content_type:
+        return "jsonl"
+    raise ManifestError(f"Unsupported manifest content type: {content_type}")
+
+
+async def iter_lines(stream: AsyncIterator[bytes], max_line_bytes: int = MAX_LINE_BYTES) -> AsyncIterator[str]:
+    buffer = b""
+    async for chunk in stream:
+        if not chunk:
+            continue
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r").decode("utf-8", errors="replace")
+        if len(buffer) > max_line_bytes:
+            raise ManifestError(f"Manifest line exceeds {max_line_bytes} bytes")
+    if buffer.strip():
+        yield buffer.rstrip(b"\r").decode("utf-8", errors="replace")
+
+
+class ManifestParser:
+    def __init__(self, fmt: str, hash_algorithm: str = DEFAULT_HASH_ALGORITHM):
+        self.format = fmt
+        self.hash_algorithm = hash_algorithm
+        self.line_no = 0
+        self.accepted = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.seen_ids = set()
+        self._csv_columns: Optional[Dict[str, int]] = None
+
+    def _error(self, message: str):
+        self.invalid += 1
+        if len(self.errors) < MAX_ERROR_SAMPLES:
+            self.errors.append({"line": self.line_no, "error": message})
+
+    def _parse_jsonl(self, line: str) -> Optional[Dict[str, Any]]:
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            self._error(f"invalid JSON: {e}")
+            return None
+        if not isinstance(record, dict):
+            self._error("line must be a JSON object")
+            return None
+        return record
+
+    def _parse_csv(self, line: str) -> Optional[Dict[str, Any]]:
+        # alan icinde satir sonu desteklenmiyor, her satir bagimsiz bir kayit
+        row = next(csv.reader([line]))
+        if self._csv_columns is None:
+            header = [column.strip().lower() for column in row]
+            if "id" in header and "url" in header:
+                self._csv_columns = {name: index for index, name in enumerate(header)}
+                return None
+            self._csv_columns = {"id": 0, "url": 1, "priority": 2, "checksum": 3}
+
+        record = {}
+        for name, index in self._csv_columns.items():
+            if index < len(row) and row[index].strip():
+                record[name] = row[index].strip()
+        return record
+
+    def parse_line(self, line: str) -> Optional[Dict[str, Any]]:
+        self.line_no += 1
+        if not line.strip() or line.lstrip().startswith("#"):
+            return None
+
+        record = self._parse_jsonl(line) if self.format == "jsonl" else self._parse_csv(line)
+        if record is None:
+            return None
+
+        file_id, url = record.get("id"), record.get("url")
+        error = validate_file_item(file_id, url)
+        if error:
+            self._error(error)
+            return None
+        if file_id in self.seen_ids:
+            self.duplicates += 1
+            if len(self.errors) < MAX_ERROR_SAMPLES:
+                self.errors.append({"line": self.line_no, "error": f"duplicate id: {file_id}"})
+            return None
+
+        item: Dict[str, Any] = {"id": file_id, "url": url}
+        for key in ("priority", "segments", "min_segment_size"):
+            if key in record:
+                try:
+                    item[key] = int(record[key])
+                except (TypeError, ValueError):
+                    self._error(f"invalid {key}: {record[key]!r}")
+                    return None
+
+        if record.get("checksum"):
+            try:
+                algorithm, digest = parse_checksum(str(record["checksum"]), self.hash_algorithm)
+            except ValueError as e:
+                self._error(str(e))
+                return None
+            item["checksum"] = f"{algorithm}:{digest}"
+
+        if record.get("compression"):
+            compression = str(record["compression"]).lower()
+            if compression not in COMPRESSION_MODES:
+                self._error(f"invalid compression: {record['compression']!r}")
+                return None
+            item["compression"] = compression
+
+        self.seen_ids.add(file_id)
+        self.accepted += 1
+        return item
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "format": self.format,
+            "lines": self.line_no,
+            "accepted": self.accepted,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "errors": self.errors,
+        }
@@ -0,0 +1,253 @@
+
+import asyncio
+import bisect
+import math
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+THROUGHPUT_BUCKETS = tuple(float(2 ** n) for n in range(13, 31, 2))
+LOOP_LAG_INTERVAL = 0.5
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+
+class HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        # sicak yol: tek bisect ve uc toplama, kilit yok (tek event loop)
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self.children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values) -> object:
+        key = tuple(str(value) for value in values)
+        child = self.children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self.children[key] = self._new_child()
+        return child
+
+    def remove(self, *values):
+        self.children.pop(tuple(str(value) for value in values), None)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+                for key, child in self.children.items()]
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return CounterChild()
+
+    def inc(self, amount: float = 1):
+        self.children[()].inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def _new_child(self):
+        return GaugeChild()
+
+    def set(self, value: float):
+        self.children[()].set(value)
+
+    def set_function(self, function: Callable[[], float]):
+        # deger yalnizca scrape aninda hesaplanir
+        self.function = function
+
+    def samples(self) -> List[str]:
+        if self.function is not None:
+            return [f"{self.name} {_format_value(self.function())}"]
+        return super().samples()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.children[()].observe(value)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, child in self.children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"metric already registered: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, function: Optional[Callable[[], float]] = None,
+              labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function=function))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+BYTES_DOWNLOADED = REGISTRY.counter("downloader_bytes_downloaded_total", "Bytes received from origin servers")
+BYTES_STORED = REGISTRY.counter("downloader_bytes_stored_total", "Bytes written to disk after content decoding")
+FILES_FINISHED = REGISTRY.counter("downloader_files_finished_total", "File transitions into a final status",
+                                  ("status",))
+FILE_THROUGHPUT = REGISTRY.histogram("downloader_file_throughput_bytes_per_second",
+                                     "Average transfer rate of each completed download",
+                                     buckets=THROUGHPUT_BUCKETS)
+FILE_DURATION = REGISTRY.histogram("downloader_file_duration_seconds", "Wall time of each completed transfer",
+                                   buckets=LATENCY_BUCKETS + (60.0, 300.0))
+TIME_TO_FIRST_BYTE = REGISTRY.histogram("downloader_time_to_first_byte_seconds",
+                                        "Time from sending a request to receiving response headers")
+CONNECTION_SETUP = REGISTRY.histogram("downloader_connection_setup_seconds",
+                                      "Time to open a new connection (DNS, TCP, TLS)")
+QUEUE_WAIT = REGISTRY.histogram("downloader_queue_wait_seconds", "Time a job spent in the scheduler queue",
+                                buckets=LATENCY_BUCKETS + (60.0, 300.0))
+BROADCAST_LATENCY = REGISTRY.histogram("downloader_broadcast_latency_seconds",
+                                       "Time from publishing a WebSocket message to sending it")
+REPORT_WRITE = REGISTRY.histogram("downloader_report_write_seconds", "Time to write a report file")
+LOOP_LAG = REGISTRY.histogram("downloader_event_loop_lag_seconds", "Event loop scheduling delay")
+QUEUE_PENDING = REGISTRY.gauge("downloader_queue_pending", "Jobs waiting in the scheduler queue")
+DOWNLOADS_IN_FLIGHT = REGISTRY.gauge("downloader_downloads_in_flight", "Jobs currently running")
+WS_CLIENTS = REGISTRY.gauge("downloader_websocket_clients", "Connected WebSocket clients")
+
+
+def observe_transfer(size: int, seconds: float):
+    FILE_DURATION.observe(seconds)
+    if seconds > 0:
+        FILE_THROUGHPUT.observe(size / seconds)
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, histogram: Histogram = LOOP_LAG):
+        self.interval = interval
+        self.histogram = histogram
+        self.last_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="loop-lag-monitor")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            self.last_lag = max(0.0, time.monotonic() - expected)
+            self.histogram.observe(self.last_lag)
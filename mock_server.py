@@ -0,0 +1,455 @@
+
+import argparse
+import asyncio
+import gzip
+import random
+import time
+import zlib
+from typing import Any, AsyncIterator, Callable, Dict, Mapping, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from aiohttp import web
+
+from file_server import parse_range
+
+# h2c (on bilgili HTTP/2) dinleyicisi istege bagli; h2 kurulu degilse yalnizca HTTP/1.1 sunulur
+try:
+    import h2.config
+    import h2.connection
+    import h2.events
+    import h2.exceptions
+except ImportError:
+    h2 = None
+
+MOCK_HOST = "127.0.0.1"
+MOCK_PORT = 8900
+MOCK_BLOCK_SIZE = 64 * 1024
+MOCK_STALL_SECONDS = 3600.0
+MOCK_LAST_MODIFIED = "Mon, 01 Jan 2024 00:00:00 GMT"
+MOCK_ENCODINGS = ("gzip", "deflate")
+# kodlanmis govdeler bir kez sikistirilip saklanir; Range istekleri bu byte'lardan kesilir
+MOCK_ENCODED_CACHE = 16
+_UNITS = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+# tum yanitlar ayni tekrarlayan bloktan kesilir; ayni boyut ve aralik her zaman ayni baytlari dondurur
+_BLOCK = random.Random(0).randbytes(MOCK_BLOCK_SIZE)
+_RING = memoryview(_BLOCK * 2)
+
+
+def _text_block() -> bytes:
+    # rastgele bayt sikismaz; encoding istenen kaynaklar kucuk bir sozlukten uretilen metinle sunulur
+    words = [b"indir", b"dosya", b"parca", b"sunucu", b"akis", b"baglanti", b"ozet", b"kuyruk", b"host", b"byte"]
+    rng = random.Random(1)
+    text = bytearray()
+    while len(text) < MOCK_BLOCK_SIZE:
+        text += b" ".join(rng.choice(words) for _ in range(rng.randint(4, 12))) + b" %d\n" % rng.randint(0, 99999)
+    return bytes(text[:MOCK_BLOCK_SIZE])
+
+
+_TEXT_RING = memoryview(_text_block() * 2)
+_encoded: Dict[Tuple[int, str], bytes] = {}
+
+
+def parse_size(value: str) -> int:
+    value = value.strip().lower()
+    if value and value[-1] in _UNITS:
+        return int(float(value[:-1]) * _UNITS[value[-1]])
+    return int(value)
+
+
+def payload(start: int, end: int, ring: memoryview = _RING) -> bytes:
+    if end - start > MOCK_BLOCK_SIZE:
+        return b"".join(payload(position, min(position + MOCK_BLOCK_SIZE, end), ring)
+                        for position in range(start, end, MOCK_BLOCK_SIZE))
+    offset = start % MOCK_BLOCK_SIZE
+    return ring[offset:offset + (end - start)].tobytes()
+
+
+def text_payload(start: int, end: int) -> bytes:
+    return payload(start, end, _TEXT_RING)
+
+
+def encoded_payload(size: int, encoding: str) -> bytes:
+    data = _encoded.get((size, encoding))
+    if data is None:
+        plain = text_payload(0, size)
+        data = gzip.compress(plain, mtime=0) if encoding == "gzip" else zlib.compress(plain)
+        if len(_encoded) >= MOCK_ENCODED_CACHE:
+            _encoded.pop(next(iter(_encoded)))
+        _encoded[(size, encoding)] = data
+    return data
+
+
+def accepts(accept_encoding: str, encoding: str) -> bool:
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().lower().partition(";")
+        if name.strip() == encoding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+class MockStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started = time.monotonic()
+        self.requests = 0
+        self.head_requests = 0
+        self.range_requests = 0
+        self.active = 0
+        self.peak_active = 0
+        self.bytes_sent = 0
+        self.injected_errors = 0
+        self.stalls = 0
+        self.aborted = 0
+        self.dropped = 0
+        self.encoded = 0
+        self.h2_connections = 0
+        self.statuses: Dict[int, int] = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "uptime_seconds": round(time.monotonic() - self.started, 3),
+            "requests": self.requests,
+            "head_requests": self.head_requests,
+            "range_requests": self.range_requests,
+            "active": self.active,
+            "peak_active": self.peak_active,
+            "bytes_sent": self.bytes_sent,
+            "injected_errors": self.injected_errors,
+            "stalls": self.stalls,
+            "aborted": self.aborted,
+            "dropped": self.dropped,
+            "encoded": self.encoded,
+            "h2_connections": self.h2_connections,
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+        }
+
+
+class MockBody:
+    # yanit govdesini bloklar halinde uretir; hiz siniri, duraksama ve baglanti kopmasi burada uygulanir
+    def __init__(self, stats: MockStats, start: int, end: int, rate: int, stall: Optional[int],
+                 drop: Optional[int] = None, source: Callable[[int, int], bytes] = payload):
+        self.stats = stats
+        self.start = start
+        self.end = end
+        self.rate = rate
+        self.stall = stall
+        self.drop = drop
+        self.source = source
+        self.dropped = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        start, end, rate, stall, drop = self.start, self.end, self.rate, self.stall, self.drop
+        began = time.monotonic()
+        position = start
+        while position < end:
+            if drop is not None and position - start >= drop:
+                # cagiran baglantiyi govde tamamlanmadan kapatir
+                self.stats.dropped += 1
+                self.dropped = True
+                return
+            if stall is not None and position - start >= stall:
+                # baglanti acik kalir, bayt gelmez; istemci kopana kadar beklenir
+                self.stats.stalls += 1
+                await asyncio.sleep(MOCK_STALL_SECONDS)
+            step = min(MOCK_BLOCK_SIZE, end - position)
+            for limit in (stall, drop):
+                if limit is not None:
+                    step = min(step, max(1, limit - (position - start)))
+            yield self.source(position, position + step)
+            position += step
+            self.stats.bytes_sent += step
+            if rate:
+                ahead = (position - start) / rate - (time.monotonic() - began)
+                if ahead > 0:
+                    await asyncio.sleep(ahead)
+
+
+class MockOrigin:
+    # /bytes/{size}?latency=&rate=&stall=&drop=&drops=&error_rate=&error_status=&ranges=&etag=&encoding=
+    def __init__(self, seed: int = 0):
+        self.random = random.Random(seed)
+        self.stats = MockStats()
+        # drop ayni URL'nin yalnizca ilk `drops` tam yanitina uygulanir; tekrar deneme tamamlanabilsin
+        self.drop_counts: Dict[str, int] = {}
+
+    def _count(self, status: int):
+        self.stats.statuses[status] = self.stats.statuses.get(status, 0) + 1
+
+    async def handle_bytes(self, request: web.Request) -> web.StreamResponse:
+        self.stats.requests += 1
+        self.stats.active += 1
+        self.stats.peak_active = max(self.stats.peak_active, self.stats.active)
+        try:
+            return await self._serve(request)
+        finally:
+            self.stats.active -= 1
+
+    async def _plan(self, method: str, size_text: str, query: Mapping[str, str], range_header: Optional[str],
+                    accept_encoding: str = "") -> Tuple[int, Dict[str, str], Optional[bytes], Optional[MockBody]]:
+        # HTTP/1.1 ve h2c dinleyicileri ayni yaniti uretir; govde yoksa MockBody None doner
+        try:
+            size = parse_size(size_text)
+            latency = float(query.get("latency", 0))
+            rate = parse_size(query.get("rate", "0"))
+            stall = parse_size(query["stall"]) if "stall" in query else None
+            drop = parse_size(query["drop"]) if "drop" in query else None
+            drops = int(query.get("drops", 1))
+            error_rate = float(query.get("error_rate", 0))
+            error_status = int(query.get("error_status", 503))
+            encoding = query.get("encoding")
+            if encoding is not None and encoding not in MOCK_ENCODINGS:
+                raise ValueError(f"encoding must be one of {', '.join(MOCK_ENCODINGS)}")
+        except ValueError as e:
+            self._count(400)
+            return 400, {"Content-Type": "text/plain"}, f"invalid parameter: {e}".encode(), None
+        ranges = query.get("ranges", "1") != "0"
+        etag = query.get("etag", "1") != "0"
+
+        if latency > 0:
+            await asyncio.sleep(latency)
+
+        if error_rate and self.random.random() < error_rate:
+            self.stats.injected_errors += 1
+            self._count(error_status)
+            return error_status, {"Content-Type": "text/plain", "Retry-After": "0"}, b"injected error", None
+
+        headers = {"Content-Type": "application/octet-stream", "Last-Modified": MOCK_LAST_MODIFIED}
+        if ranges:
+            headers["Accept-Ranges"] = "bytes"
+        # encoding verilen kaynak sikisabilir metindir; istemci kabul ederse kodlanmis temsil sunulur
+        source, length, tag = payload, size, f"mock-{size:x}"
+        if encoding is not None:
+            headers["Vary"] = "Accept-Encoding"
+            source, tag = text_payload, f"{tag}-text"
+            if accepts(accept_encoding, encoding):
+                data = encoded_payload(size, encoding)
+                source, length, tag = (lambda start, end: data[start:end]), len(data), f"{tag}-{encoding}"
+                headers["Content-Encoding"] = encoding
+        if etag:
+            headers["ETag"] = f'"{tag}"'
+
+        if method == "HEAD":
+            self.stats.head_requests += 1
+            self._count(200)
+            headers["Content-Length"] = str(length)
+            return 200, headers, None, None
+
+        start, end, status = 0, length, 200
+        if ranges and range_header:
+            span = parse_range(range_header, length)
+            if span is None:
+                self._count(416)
+                return 416, {"Content-Range": f"bytes */{length}"}, None, None
+            self.stats.range_requests += 1
+            start, end, status = span[0], span[1], 206
+            headers["Content-Range"] = f"bytes {start}-{end - 1}/{length}"
+        if "Content-Encoding" in headers:
+            self.stats.encoded += 1
+        if drop is not None:
+            # yalnizca bastan istenen yanitlar kopar; devam istegi kaldigi yerden tamamlanir
+            key = f"{size_text}?{sorted(query.items())}"
+            seen = self.drop_counts.get(key, 0)
+            if status == 200 and seen < drops:
+                self.drop_counts[key] = seen + 1
+            else:
+                drop = None
+        self._count(status)
+        return status, headers, None, MockBody(self.stats, start, end, rate, stall, drop, source)
+
+    async def _serve(self, request: web.Request) -> web.StreamResponse:
+        status, headers, text, body = await self._plan(request.method, request.match_info["size"], request.query,
+                                                       request.headers.get("Range"),
+                                                       request.headers.get("Accept-Encoding", ""))
+        if body is None:
+            return web.Response(status=status, body=text, headers=headers)
+
+        response = web.StreamResponse(status=status, headers=headers)
+        response.content_length = body.end - body.start
+        await response.prepare(request)
+        try:
+            async for block in body:
+                await response.write(block)
+        except ConnectionResetError:
+            # istemcinin yarida kesmesi (watchdog, iptal, parca yeniden planlama) beklenen bir durumdur
+            self.stats.aborted += 1
+            return response
+        if body.dropped:
+            request.transport.close()
+            return response
+        await response.write_eof()
+        return response
+
+    async def handle_h2(self, protocol: "H2MockProtocol", stream_id: int, request_headers: Dict[str, str]):
+        self.stats.requests += 1
+        self.stats.active += 1
+        self.stats.peak_active = max(self.stats.peak_active, self.stats.active)
+        try:
+            parts = urlsplit(request_headers.get(":path", "/"))
+            if not parts.path.startswith("/bytes/"):
+                self._count(404)
+                protocol.respond(stream_id, 404, {}, b"not found")
+                return
+            status, headers, text, body = await self._plan(request_headers.get(":method", "GET"),
+                                                           parts.path[len("/bytes/"):], dict(parse_qsl(parts.query)),
+                                                           request_headers.get("range"),
+                                                           request_headers.get("accept-encoding", ""))
+            if body is None:
+                protocol.respond(stream_id, status, headers, text)
+                return
+            headers["Content-Length"] = str(body.end - body.start)
+            protocol.respond(stream_id, status, headers, None, end_stream=False)
+            async for block in body:
+                await protocol.send_data(stream_id, block)
+            if body.dropped:
+                protocol.reset_stream(stream_id)
+            else:
+                protocol.end_stream(stream_id)
+        except (asyncio.CancelledError, ConnectionError, h2.exceptions.StreamClosedError):
+            # istemci akisi sifirladi ya da baglanti koptu
+            self.stats.aborted += 1
+        finally:
+            self.stats.active -= 1
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats.to_dict())
+
+    async def handle_reset(self, request: web.Request) -> web.Response:
+        self.stats.reset()
+        self.drop_counts.clear()
+        return web.json_response(self.stats.to_dict())
+
+
+class H2MockProtocol(asyncio.Protocol):
+    # yalnizca /bytes sunan h2c dinleyicisi; istatistikler HTTP/1.1 tarafindaki /stats ile okunur
+    def __init__(self, origin: MockOrigin):
+        self.origin = origin
+        self.conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False, header_encoding="utf-8"))
+        self.transport: Optional[asyncio.Transport] = None
+        self.tasks: Dict[int, asyncio.Task] = {}
+        self.windows: Dict[int, asyncio.Event] = {}
+
+    def connection_made(self, transport: asyncio.Transport):
+        self.transport = transport
+        self.origin.stats.h2_connections += 1
+        self.conn.initiate_connection()
+        self._flush()
+
+    def _flush(self):
+        data = self.conn.data_to_send()
+        if data and not self.transport.is_closing():
+            self.transport.write(data)
+
+    def data_received(self, data: bytes):
+        try:
+            events = self.conn.receive_data(data)
+        except h2.exceptions.ProtocolError:
+            self._flush()
+            self.transport.close()
+            return
+        for event in events:
+            if isinstance(event, h2.events.RequestReceived):
+                stream_id = event.stream_id
+                task = asyncio.ensure_future(self.origin.handle_h2(self, stream_id, dict(event.headers)))
+                self.tasks[stream_id] = task
+                task.add_done_callback(lambda _task, stream_id=stream_id: self.tasks.pop(stream_id, None))
+            elif isinstance(event, h2.events.DataReceived):
+                self.conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+            elif isinstance(event, h2.events.WindowUpdated):
+                self._wake(event.stream_id)
+            elif isinstance(event, h2.events.StreamReset):
+                task = self.tasks.get(event.stream_id)
+                if task is not None:
+                    task.cancel()
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                self.transport.close()
+        self._flush()
+
+    def connection_lost(self, exc: Optional[Exception]):
+        for task in list(self.tasks.values()):
+            task.cancel()
+        self._wake(0)
+
+    def _wake(self, stream_id: int):
+        # stream 0 baglanti penceresidir; acildiginda bekleyen tum akislar uyanir
+        for waiting in list(self.windows) if stream_id == 0 else [stream_id]:
+            event = self.windows.pop(waiting, None)
+            if event is not None:
+                event.set()
+
+    def respond(self, stream_id: int, status: int, headers: Dict[str, str], body: Optional[bytes],
+                end_stream: bool = True):
+        response_headers = [(":status", str(status))] + [(name.lower(), value) for name, value in headers.items()]
+        if body is not None and "Content-Length" not in headers:
+            response_headers.append(("content-length", str(len(body))))
+        self.conn.send_headers(stream_id, response_headers, end_stream=end_stream and not body)
+        self._flush()
+        if body:
+            self.conn.send_data(stream_id, body, end_stream=end_stream)
+            self._flush()
+
+    async def send_data(self, stream_id: int, data: bytes):
+        view = memoryview(data)
+        while view:
+            if self.transport.is_closing():
+                raise ConnectionResetError("h2 baglantisi kapandi")
+            window = min(self.conn.local_flow_control_window(stream_id), self.conn.max_outbound_frame_size)
+            if window <= 0:
+                event = self.windows.setdefault(stream_id, asyncio.Event())
+                await event.wait()
+                continue
+            self.conn.send_data(stream_id, view[:window].tobytes())
+            view = view[window:]
+            self._flush()
+
+    def end_stream(self, stream_id: int):
+        self.conn.end_stream(stream_id)
+        self._flush()
+
+    def reset_stream(self, stream_id: int):
+        self.conn.reset_stream(stream_id)
+        self._flush()
+
+
+def create_app(seed: int = 0, h2_port: Optional[int] = None, host: str = MOCK_HOST) -> web.Application:
+    origin = MockOrigin(seed)
+    app = web.Application()
+    app["origin"] = origin
+    app.router.add_route("GET", "/bytes/{size}", origin.handle_bytes)
+    app.router.add_route("HEAD", "/bytes/{size}", origin.handle_bytes)
+    app.router.add_get("/stats", origin.handle_stats)
+    app.router.add_post("/stats/reset", origin.handle_reset)
+    if h2_port is not None:
+        async def start_h2(app: web.Application):
+            loop = asyncio.get_running_loop()
+            app["h2_server"] = await loop.create_server(lambda: H2MockProtocol(origin), host, h2_port, backlog=4096)
+
+        async def stop_h2(app: web.Application):
+            app["h2_server"].close()
+
+        app.on_startup.append(start_h2)
+        app.on_cleanup.append(stop_h2)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark icin yerel sahte HTTP sunucusu")
+    parser.add_argument("--host", default=MOCK_HOST)
+    parser.add_argument("--port", type=int, default=MOCK_PORT)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--h2-port", type=int, help="ayrica bu portta h2c (on bilgili HTTP/2) dinle")
+    args = parser.parse_args()
+    if args.h2_port is not None and h2 is None:
+        parser.error("--h2-port icin h2 paketi kurulu olmali")
+    ready = f"Sahte sunucu hazir: http://{args.host}:{args.port}"
+    if args.h2_port is not None:
+        ready += f", h2c://{args.host}:{args.h2_port}"
+    # istemci koptugunda duraklatilmis yanitlarin handler'i da sonlanir
+    web.run_app(create_app(args.seed, args.h2_port, args.host), host=args.host, port=args.port, access_log=None,
+                backlog=4096, handler_cancellation=True, print=lambda _: print(ready, flush=True))
+
+
+if __name__ == "__main__":
+    main()
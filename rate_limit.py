@@ -0,0 +1,187 @@
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+BANDWIDTH_GLOBAL_RATE = 0
+BANDWIDTH_HOST_RATE = 0
+BANDWIDTH_SESSION_RATE = 0
+BUCKET_BURST_SECONDS = 1.0
+BUCKET_MIN_BURST = 64 * 1024
+# bir parca icin beklenecek en uzun sure; watchdog'un duraklama sanmamasi icin parca boyutu buna gore kucultulur
+THROTTLE_CHUNK_SECONDS = 0.25
+THROTTLE_MIN_CHUNK = 4 * 1024
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated", "consumed", "throttled_seconds")
+
+    def __init__(self, rate: int, burst_seconds: float = BUCKET_BURST_SECONDS):
+        self.rate = 0
+        self.capacity = 0.0
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.consumed = 0
+        self.throttled_seconds = 0.0
+        self.set_rate(rate, burst_seconds)
+        self.tokens = self.capacity
+
+    def set_rate(self, rate: int, burst_seconds: float = BUCKET_BURST_SECONDS):
+        self._refill(time.monotonic())
+        self.rate = rate
+        self.capacity = max(rate * burst_seconds, BUCKET_MIN_BURST)
+        self.tokens = min(self.tokens, self.capacity)
+
+    def _refill(self, now: float):
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, now: float) -> float:
+        self._refill(now)
+        return max(self.tokens, 0.0)
+
+    def take(self, n: int):
+        self.tokens -= n
+        self.consumed += n
+
+    def wait_time(self, n: int) -> float:
+        # n jetonun (en fazla kova kapasitesi kadar) birikmesi icin gereken sure
+        missing = min(n, self.capacity) - self.tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rate": self.rate,
+            "tokens": int(self.tokens),
+            "consumed": self.consumed,
+            "throttled_seconds": round(self.throttled_seconds, 2),
+        }
+
+
+class BandwidthLimiter:
+    def __init__(self, global_rate: int = BANDWIDTH_GLOBAL_RATE, host_rate: int = BANDWIDTH_HOST_RATE,
+                 session_rate: int = BANDWIDTH_SESSION_RATE, burst_seconds: float = BUCKET_BURST_SECONDS):
+        self.burst_seconds = burst_seconds
+        self.global_rate = 0
+        self.host_rate = 0
+        self.session_rate = 0
+        self.global_bucket: Optional[TokenBucket] = None
+        self.host_buckets: Dict[str, TokenBucket] = {}
+        self.session_buckets: Dict[str, TokenBucket] = {}
+        self.host_overrides: Dict[str, int] = {}
+        self.session_overrides: Dict[str, int] = {}
+
+        self.waits = 0
+        self.configure(global_rate, host_rate, session_rate)
+
+    @property
+    def active(self) -> bool:
+        return bool(self.global_rate or self.host_rate or self.session_rate
+                    or self.host_overrides or self.session_overrides)
+
+    def configure(self, global_rate: Optional[int], host_rate: Optional[int], session_rate: Optional[int]):
+        self.global_rate = global_rate or 0
+        self.host_rate = host_rate or 0
+        self.session_rate = session_rate or 0
+        if self.global_rate:
+            if self.global_bucket is None:
+                self.global_bucket = TokenBucket(self.global_rate, self.burst_seconds)
+            else:
+                self.global_bucket.set_rate(self.global_rate, self.burst_seconds)
+        else:
+            self.global_bucket = None
+        # varsayilan degisince override'i olmayan kovalar bir sonraki istekte yeni hizla kurulur
+        for host in [host for host in self.host_buckets if host not in self.host_overrides]:
+            self._bucket(self.host_buckets, host, self.host_rate)
+        for session_id in [sid for sid in self.session_buckets if sid not in self.session_overrides]:
+            self._bucket(self.session_buckets, session_id, self.session_rate)
+
+    def set_host_rate(self, host: str, rate: Optional[int]):
+        if rate is None:
+            self.host_overrides.pop(host, None)
+        else:
+            self.host_overrides[host] = rate
+        self._bucket(self.host_buckets, host, self.host_overrides.get(host, self.host_rate))
+
+    def set_session_rate(self, session_id: str, rate: Optional[int]):
+        if rate is None:
+            self.session_overrides.pop(session_id, None)
+        else:
+            self.session_overrides[session_id] = rate
+        self._bucket(self.session_buckets, session_id, self.session_overrides.get(session_id, self.session_rate))
+
+    def release_session(self, session_id: str):
+        self.session_buckets.pop(session_id, None)
+        self.session_overrides.pop(session_id, None)
+
+    def _bucket(self, buckets: Dict[str, TokenBucket], key: str, rate: int) -> Optional[TokenBucket]:
+        if not rate:
+            buckets.pop(key, None)
+            return None
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(rate, self.burst_seconds)
+        elif bucket.rate != rate:
+            bucket.set_rate(rate, self.burst_seconds)
+        return bucket
+
+    def _buckets(self, session_id: str, host: str) -> List[TokenBucket]:
+        buckets = []
+        if self.global_bucket is not None:
+            buckets.append(self.global_bucket)
+        bucket = self._bucket(self.host_buckets, host, self.host_overrides.get(host, self.host_rate))
+        if bucket is not None:
+            buckets.append(bucket)
+        bucket = self._bucket(self.session_buckets, session_id,
+                              self.session_overrides.get(session_id, self.session_rate))
+        if bucket is not None:
+            buckets.append(bucket)
+        return buckets
+
+    def effective_rate(self, session_id: str, host: str) -> int:
+        rates = [bucket.rate for bucket in self._buckets(session_id, host)]
+        return min(rates) if rates else 0
+
+    def chunk_limit(self, session_id: str, host: str, max_size: int) -> int:
+        rate = self.effective_rate(session_id, host) if self.active else 0
+        if not rate:
+            return max_size
+        return max(THROTTLE_MIN_CHUNK, min(max_size, int(rate * THROTTLE_CHUNK_SECONDS)))
+
+    async def acquire(self, session_id: str, host: str, n: int):
+        if not self.active:
+            return
+        buckets = self._buckets(session_id, host)
+        remaining = n
+        while remaining > 0 and buckets:
+            # her kovadan yalnizca en dar kovanin verebildigi kadar dusulur; baska bir seviyede kisilan
+            # oturum kullanamayacagi global ya da host butcesini diger oturumlardan almaz
+            now = time.monotonic()
+            grant = int(min(remaining, min(bucket.available(now) for bucket in buckets)))
+            if grant > 0:
+                for bucket in buckets:
+                    bucket.take(grant)
+                remaining -= grant
+                if not remaining:
+                    break
+            waits = [bucket.wait_time(remaining) for bucket in buckets]
+            delay = max(waits)
+            for bucket, wait in zip(buckets, waits):
+                if wait == delay:
+                    bucket.throttled_seconds += delay
+            self.waits += 1
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "global_rate": self.global_rate,
+            "default_host_rate": self.host_rate,
+            "default_session_rate": self.session_rate,
+            "global": self.global_bucket.to_dict() if self.global_bucket is not None else None,
+            "hosts": {host: bucket.to_dict() for host, bucket in self.host_buckets.items()},
+            "sessions": {session_id: bucket.to_dict() for session_id, bucket in self.session_buckets.items()},
+            "host_overrides": dict(self.host_overrides),
+            "session_overrides": dict(self.session_overrides),
+            "waits": self.waits,
+        }
@@ -0,0 +1,261 @@
+
+import asyncio
+import json
+import os
+import pathlib
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from metrics import FILES_FINISHED, REPORT_WRITE
+
+REPORT_DEBOUNCE_SECONDS = 1.0
+
+STATUS_BUCKETS = {
+    "completed": "completed_files",
+    "stalled": "deleted_files",
+}
+DEFAULT_BUCKET = "pending_files"
+FINISHED_STATUSES = ("completed", "failed", "stalled", "cancelled")
+
+
+def write_atomic(path: pathlib.Path, text: str):
+    # okuyucular yarim yazilmis dosya gormez; gecici dosya yazilip yerine tasinir
+    tmp_path = path.with_name(path.name + ".tmp-write")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def bucket_for(status: str) -> str:
+    return STATUS_BUCKETS.get(status, DEFAULT_BUCKET)
+
+
+class SessionReport:
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.statuses: Dict[str, str] = {}
+        self.checksums: Dict[str, str] = {}
+        self.status_counts: Dict[str, int] = {}
+        # dict'ler sirali kume olarak kullaniliyor; rapordaki dosya sirasi korunur
+        self.buckets: Dict[str, Dict[str, None]] = {
+            "deleted_files": {},
+            "completed_files": {},
+            "pending_files": {},
+        }
+        self.version = 0
+        self.flushed_version = -1
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.finished = False
+        # agdan alinan ve diske yazilan toplam byte; oturum bitince doldurulur
+        self.transfer: Optional[Dict[str, int]] = None
+
+    def set_checksum(self, file_id: str, checksum: Optional[str]):
+        if checksum and self.checksums.get(file_id) != checksum:
+            self.checksums[file_id] = checksum
+            self._touch()
+
+    def add(self, file_id: str, status: str = "queued"):
+        if file_id in self.statuses:
+            self.transition(file_id, status)
+            return
+        self.statuses[file_id] = status
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        self.buckets[bucket_for(status)][file_id] = None
+        self._touch()
+
+    def transition(self, file_id: str, status: str):
+        old = self.statuses.get(file_id)
+        if old is None:
+            self.add(file_id, status)
+            return
+        if old == status:
+            return
+
+        self.statuses[file_id] = status
+        self.status_counts[old] -= 1
+        if not self.status_counts[old]:
+            del self.status_counts[old]
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        if status in FINISHED_STATUSES:
+            FILES_FINISHED.labels(status).inc()
+
+        old_bucket, new_bucket = bucket_for(old), bucket_for(status)
+        if old_bucket != new_bucket:
+            del self.buckets[old_bucket][file_id]
+            self.buckets[new_bucket][file_id] = None
+        self._touch()
+
+    def _touch(self):
+        self.version += 1
+        self.updated_at = time.time()
+
+    @property
+    def dirty(self) -> bool:
+        return self.version != self.flushed_version
+
+    def snapshot(self) -> Dict[str, Any]:
+        snapshot = {
+            "deleted_files": list(self.buckets["deleted_files"]),
+            "completed_files": list(self.buckets["completed_files"]),
+            "pending_files": list(self.buckets["pending_files"]),
+            "checksums": dict(self.checksums),
+            "timestamp": datetime.now().isoformat(),
+        }
+        if self.transfer is not None:
+            snapshot["transfer"] = dict(self.transfer)
+        return snapshot
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "total": len(self.statuses),
+            "deleted": len(self.buckets["deleted_files"]),
+            "completed": len(self.buckets["completed_files"]),
+            "pending": len(self.buckets["pending_files"]),
+            "status_counts": dict(self.status_counts),
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "finished": self.finished,
+        }
+
+
+class ReportEngine:
+    def __init__(self, report_dir: pathlib.Path, debounce_seconds: float = REPORT_DEBOUNCE_SECONDS, index=None):
+        self.report_dir = report_dir
+        self.debounce_seconds = debounce_seconds
+        # index.index_report(summary) her yazimdan sonra cagrilir; liste istekleri dizini taramaz
+        self.index = index
+        self.sessions: Dict[str, SessionReport] = {}
+        # kume modunda oturumun bir parcasi; rapor dosyasini ve katalogu oturumun primary worker'i yazar
+        self.parts: Set[str] = set()
+        self._timers: Dict[str, asyncio.Task] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+        self.flushes = 0
+        self.flush_seconds = 0.0
+
+    def report_path(self, session_id: str) -> pathlib.Path:
+        return self.report_dir / f"download_report_{session_id}.json"
+
+    def session(self, session_id: str) -> SessionReport:
+        report = self.sessions.get(session_id)
+        if report is None:
+            report = self.sessions[session_id] = SessionReport(session_id)
+        return report
+
+    def register(self, session_id: str, file_ids: Iterable[str], status: str = "queued"):
+        report = self.session(session_id)
+        for file_id in file_ids:
+            if file_id not in report.statuses:
+                report.add(file_id, status)
+        self.schedule_flush(session_id)
+
+    def transition(self, session_id: str, file_id: str, status: str, checksum: Optional[str] = None):
+        report = self.session(session_id)
+        report.transition(file_id, status)
+        report.set_checksum(file_id, checksum)
+        if report.dirty:
+            self.schedule_flush(session_id)
+
+    def schedule_flush(self, session_id: str):
+        if session_id in self.parts:
+            return
+        timer = self._timers.get(session_id)
+        if timer is None or timer.done():
+            self._timers[session_id] = asyncio.create_task(self._delayed_flush(session_id))
+
+    async def _delayed_flush(self, session_id: str):
+        await asyncio.sleep(self.debounce_seconds)
+        self._timers.pop(session_id, None)
+        await self.flush(session_id)
+
+    @staticmethod
+    def _write_atomic(path: pathlib.Path, report: Dict[str, Any]):
+        write_atomic(path, json.dumps(report, indent=4, ensure_ascii=False))
+
+    async def flush(self, session_id: str, force: bool = False) -> Optional[Dict[str, Any]]:
+        report = self.sessions.get(session_id)
+        if report is None or session_id in self.parts:
+            return None
+
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        async with lock:
+            if not report.dirty and not force:
+                return None
+            version = report.version
+            snapshot = report.snapshot()
+            started = time.perf_counter()
+            await asyncio.to_thread(self._write_atomic, self.report_path(session_id), snapshot)
+            elapsed = time.perf_counter() - started
+            self.flush_seconds += elapsed
+            REPORT_WRITE.observe(elapsed)
+            self.flushes += 1
+            report.flushed_version = version
+            if self.index is not None:
+                self.index.index_report(report.summary())
+            return snapshot
+
+    async def flush_if_dirty(self, session_id: str):
+        report = self.sessions.get(session_id)
+        if report is not None and report.dirty:
+            await self.flush(session_id)
+
+    async def finalize(self, session_id: str, transfer: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        timer = self._timers.pop(session_id, None)
+        if timer is not None:
+            timer.cancel()
+        report = self.session(session_id)
+        report.finished = True
+        if transfer is not None:
+            report.transfer = transfer
+        return await self.flush(session_id, force=True)
+
+    def scan_reports(self) -> List[Dict[str, Any]]:
+        # katalogdan onceki rapor dosyalari icin tek seferlik tarama, thread icinde calistirilir
+        summaries = []
+        for path in self.report_dir.glob("download_report_*.json"):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                stat = path.stat()
+            except (OSError, ValueError):
+                continue
+            counts = {bucket: len(data.get(bucket, [])) for bucket in ("completed_files", "deleted_files", "pending_files")}
+            summaries.append({
+                "session_id": path.stem[len("download_report_"):],
+                "total": sum(counts.values()),
+                "completed": counts["completed_files"],
+                "deleted": counts["deleted_files"],
+                "pending": counts["pending_files"],
+                "status_counts": {},
+                "created_at": stat.st_mtime,
+                "updated_at": stat.st_mtime,
+                "finished": True,
+            })
+        return summaries
+
+    def discard(self, session_id: str):
+        timer = self._timers.pop(session_id, None)
+        if timer is not None:
+            timer.cancel()
+        self.sessions.pop(session_id, None)
+        self.parts.discard(session_id)
+        self._locks.pop(session_id, None)
+
+    async def close(self):
+        for session_id in list(self._timers):
+            timer = self._timers.pop(session_id)
+            timer.cancel()
+        for session_id, report in self.sessions.items():
+            if report.dirty:
+                await self.flush(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self.sessions),
+            "pending_flushes": sum(1 for timer in self._timers.values() if not timer.done()),
+            "flushes": self.flushes,
+            "avg_flush_seconds": round(self.flush_seconds / self.flushes, 6) if self.flushes else 0,
+        }
@@ -0,0 +1,169 @@
+
+import asyncio
+import json
+import os
+import pathlib
+import time
+from typing import Any, Dict, List, Optional
+
+JOURNAL_INTERVAL_BYTES = 1024 * 1024
+JOURNAL_INTERVAL_SECONDS = 1.0
+
+
+class DownloadJournal:
+    __slots__ = (
+        "path", "url", "etag", "last_modified", "total_size", "bytes_committed",
+        "segments", "encoding", "updated_at", "_flushed_bytes", "_flushed_at", "_write_lock",
+    )
+
+    def __init__(self, path: pathlib.Path, url: str, etag: Optional[str] = None,
+                 last_modified: Optional[str] = None, total_size: int = 0,
+                 bytes_committed: int = 0, segments: Optional[List[List[int]]] = None,
+                 encoding: Optional[str] = None, updated_at: Optional[float] = None):
+        self.path = path
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.total_size = total_size
+        self.bytes_committed = bytes_committed
+        # parcali indirmede her eleman [baslangic, bitis, yazilan_son_offset]
+        self.segments = segments
+        # diskteki byte'larin Content-Encoding'i; None acik (identity) icerik demek
+        self.encoding = encoding
+        self.updated_at = updated_at or time.time()
+        self._flushed_bytes = bytes_committed
+        self._flushed_at = time.monotonic()
+        self._write_lock = asyncio.Lock()
+
+    @property
+    def validator(self) -> Optional[str]:
+        return self.etag or self.last_modified
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "total_size": self.total_size,
+            "bytes_committed": self.bytes_committed,
+            "segments": [list(segment) for segment in self.segments] if self.segments else self.segments,
+            "encoding": self.encoding,
+            "updated_at": self.updated_at,
+        }
+
+
+class ResumeJournal:
+    def __init__(self, interval_bytes: int = JOURNAL_INTERVAL_BYTES,
+                 interval_seconds: float = JOURNAL_INTERVAL_SECONDS):
+        self.interval_bytes = interval_bytes
+        self.interval_seconds = interval_seconds
+
+    @staticmethod
+    def journal_path(file_path: pathlib.Path) -> pathlib.Path:
+        return file_path.with_name(file_path.name + ".journal")
+
+    @staticmethod
+    def part_path(file_path: pathlib.Path) -> pathlib.Path:
+        return file_path.with_suffix(".part")
+
+    def _load_sync(self, file_path: pathlib.Path, url: str) -> Optional[DownloadJournal]:
+        journal_path = self.journal_path(file_path)
+        if not journal_path.exists():
+            return None
+
+        try:
+            with open(journal_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if data.get("url") != url or not (data.get("etag") or data.get("last_modified")):
+            self._discard_sync(file_path)
+            return None
+
+        part_path = self.part_path(file_path)
+        if not file_path.exists() and part_path.exists():
+            os.replace(part_path, file_path)
+
+        if not file_path.exists():
+            self._discard_sync(file_path)
+            return None
+
+        # disk uzerindeki gercek boyut journal'dan kucukse ona guveniyoruz
+        on_disk = file_path.stat().st_size
+        segments = data.get("segments")
+        if segments:
+            bytes_committed = sum(offset - start for start, _end, offset in segments)
+        else:
+            bytes_committed = min(int(data.get("bytes_committed", 0)), on_disk)
+            if on_disk != bytes_committed:
+                with open(file_path, 'r+b') as f:
+                    f.truncate(bytes_committed)
+
+        return DownloadJournal(
+            file_path, url,
+            etag=data.get("etag"),
+            last_modified=data.get("last_modified"),
+            total_size=int(data.get("total_size", 0)),
+            bytes_committed=bytes_committed,
+            segments=segments,
+            encoding=data.get("encoding"),
+            updated_at=data.get("updated_at"),
+        )
+
+    async def load(self, file_path: pathlib.Path, url: str) -> Optional[DownloadJournal]:
+        return await asyncio.to_thread(self._load_sync, file_path, url)
+
+    def begin(self, file_path: pathlib.Path, url: str, etag: Optional[str],
+              last_modified: Optional[str], total_size: int,
+              segments: Optional[List[List[int]]] = None, encoding: Optional[str] = None) -> DownloadJournal:
+        return DownloadJournal(file_path, url, etag, last_modified, total_size, 0, segments, encoding)
+
+    def _write_sync(self, file_path: pathlib.Path, data: Dict[str, Any]):
+        journal_path = self.journal_path(file_path)
+        tmp_path = journal_path.with_name(journal_path.name + ".new")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, journal_path)
+
+    async def checkpoint(self, journal: Optional[DownloadJournal], bytes_committed: int, force: bool = False):
+        if journal is None or not journal.validator:
+            return
+
+        journal.bytes_committed = bytes_committed
+        now = time.monotonic()
+        if not force \
+                and bytes_committed - journal._flushed_bytes < self.interval_bytes \
+                and now - journal._flushed_at < self.interval_seconds:
+            return
+
+        journal.updated_at = time.time()
+        journal._flushed_bytes = bytes_committed
+        journal._flushed_at = now
+        # parcalar ayni journal'i ayni anda yazabilir; anlik goruntu loop'ta alinir, yazmalar sirayla yapilir
+        data = journal.to_dict()
+        async with journal._write_lock:
+            await asyncio.to_thread(self._write_sync, journal.path, data)
+
+    def _discard_sync(self, file_path: pathlib.Path):
+        for path in (self.journal_path(file_path), self.part_path(file_path)):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    async def finish(self, file_path: pathlib.Path):
+        await asyncio.to_thread(self._discard_sync, file_path)
+
+    def _park_sync(self, file_path: pathlib.Path) -> bool:
+        if not file_path.exists():
+            return False
+        if not self.journal_path(file_path).exists():
+            file_path.unlink()
+            return False
+        os.replace(file_path, self.part_path(file_path))
+        return True
+
+    async def park(self, file_path: pathlib.Path) -> bool:
+        # duraklayan dosyanin .tmp hali kaldirilir ama yazilan byte'lar .part olarak saklanir
+        return await asyncio.to_thread(self._park_sync, file_path)
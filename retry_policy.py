@@ -0,0 +1,181 @@
+
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterable, Optional
+
+from structured_logging import get_logger
+
+RETRY_MAX_ATTEMPTS = 4
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+RETRY_AFTER_MAX = 120.0
+RETRY_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RECOVERY_SECONDS = 30.0
+BREAKER_MAX_RECOVERY_SECONDS = 300.0
+
+logger = get_logger("retry")
+
+
+class TransientDownloadError(Exception):
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"{host} icin devre acik, {retry_in:.1f} sn sonra tekrar denenecek")
+        self.host = host
+        self.retry_in = retry_in
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    __slots__ = ("max_attempts", "base_delay", "max_delay", "retry_after_max", "retry_statuses")
+
+    def __init__(self, max_attempts: int = RETRY_MAX_ATTEMPTS, base_delay: float = RETRY_BASE_DELAY,
+                 max_delay: float = RETRY_MAX_DELAY, retry_after_max: float = RETRY_AFTER_MAX,
+                 retry_statuses: Iterable[int] = RETRY_STATUSES):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_after_max = retry_after_max
+        self.retry_statuses = frozenset(retry_statuses)
+
+    def is_retryable(self, status: int) -> bool:
+        return status in self.retry_statuses
+
+    def compute_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        # "full jitter": ayni anda hata alan istemciler ayni anda tekrar denemesin
+        ceiling = min(self.max_delay, self.base_delay * (2 ** max(attempt - 1, 0)))
+        delay = random.uniform(0, ceiling)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.retry_after_max))
+        return delay
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "max_attempts": self.max_attempts,
+            "base_delay": self.base_delay,
+            "max_delay": self.max_delay,
+            "retry_after_max": self.retry_after_max,
+            "retry_statuses": sorted(self.retry_statuses),
+        }
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, host: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 recovery_seconds: float = BREAKER_RECOVERY_SECONDS):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.base_recovery_seconds = recovery_seconds
+        self.recovery_seconds = recovery_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.failures = 0
+        self.successes = 0
+        self.rejections = 0
+
+    def retry_in(self) -> float:
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.recovery_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN and self.retry_in() <= 0:
+            self.state = self.HALF_OPEN
+            self.trial_in_flight = False
+
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        self.rejections += 1
+        return False
+
+    def record_success(self):
+        self.successes += 1
+        self.consecutive_failures = 0
+        if self.state != self.CLOSED:
+            logger.info("Devre kapandi, istekler normale dondu", extra={"host": self.host})
+        self.state = self.CLOSED
+        self.trial_in_flight = False
+        self.recovery_seconds = self.base_recovery_seconds
+
+    def abandon(self):
+        # deneme istegi sonuc vermeden iptal edildi, baska bir istege izin ver
+        if self.state == self.HALF_OPEN:
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN:
+            # deneme istegi de basarisiz: bekleme suresini ikiye katlayarak tekrar ac
+            self.recovery_seconds = min(self.recovery_seconds * 2, BREAKER_MAX_RECOVERY_SECONDS)
+            self._open()
+        elif self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+        logger.warning("Devre acildi", extra={"host": self.host, "failures": self.consecutive_failures,
+                                              "recovery_seconds": round(self.recovery_seconds, 1)})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "host": self.host,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in": round(self.retry_in(), 2),
+            "failures": self.failures,
+            "successes": self.successes,
+            "rejections": self.rejections,
+        }
+
+
+class BreakerRegistry:
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 recovery_seconds: float = BREAKER_RECOVERY_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, host: str) -> CircuitBreaker:
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = self.breakers[host] = CircuitBreaker(host, self.failure_threshold, self.recovery_seconds)
+        return breaker
+
+    def stats(self, hosts: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        if hosts is None:
+            hosts = self.breakers.keys()
+        return {host: self.breakers[host].to_dict() for host in hosts if host in self.breakers}
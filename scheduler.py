@@ -0,0 +1,345 @@
+
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Any, Set, Tuple
+from urllib.parse import urlsplit
+
+from metrics import QUEUE_WAIT
+from structured_logging import get_logger
+
+SCHEDULER_WORKERS = 50
+PER_SESSION_LIMIT = 20
+PER_HOST_LIMIT = 10
+MAX_PENDING = 10000
+
+logger = get_logger("scheduler")
+
+
+class RetryLater(Exception):
+    # is beklemek istiyor; isci ve host yuvasi bosaltilir, is gecikmeyle yeniden kuyruga alinir
+    def __init__(self, delay: float, run: Optional[Callable[[], Awaitable[Any]]] = None):
+        super().__init__(f"{delay:.2f} sn sonra yeniden denenecek")
+        self.delay = delay
+        self.run = run
+
+
+class ScheduledJob:
+    __slots__ = ("priority", "seq", "session_id", "file_id", "url", "host", "run", "enqueued_at")
+
+    def __init__(self, priority: int, seq: int, session_id: str, file_id: str, url: str,
+                 run: Callable[[], Awaitable[Any]]):
+        self.priority = priority
+        self.seq = seq
+        self.session_id = session_id
+        self.file_id = file_id
+        self.url = url
+        self.host = urlsplit(url).netloc.lower()
+        self.run = run
+        self.enqueued_at = time.monotonic()
+
+    def __lt__(self, other: "ScheduledJob") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class DownloadScheduler:
+    def __init__(
+        self,
+        workers: int = SCHEDULER_WORKERS,
+        per_session_limit: int = PER_SESSION_LIMIT,
+        per_host_limit: int = PER_HOST_LIMIT,
+        max_pending: int = MAX_PENDING,
+        host_limit: Optional[Callable[[str], Optional[int]]] = None,
+    ):
+        self.worker_count = workers
+        self.per_session_limit = per_session_limit
+        self.per_host_limit = per_host_limit
+        self.max_pending = max_pending
+        # host'a ozel sinir (ornegin HTTP/2 coklama); None donerse per_host_limit gecerli
+        self.host_limit = host_limit
+
+        self._seq = itertools.count()
+        self._cond: Optional[asyncio.Condition] = None
+        self._workers: List[asyncio.Task] = []
+
+        # oturum kotasina takilan isler burada bekler, kota bosaldikca host kuyruklarina alinir
+        self._session_backlog: Dict[str, List[ScheduledJob]] = {}
+        self._session_admitted: Dict[str, int] = {}
+        self._session_running: Dict[str, int] = {}
+        self._session_outstanding: Dict[str, int] = {}
+        self._session_done: Dict[str, asyncio.Event] = {}
+
+        self._host_queues: Dict[str, List[ScheduledJob]] = {}
+        self._host_running: Dict[str, int] = {}
+        self._host_last_served: Dict[str, int] = {}
+        self._serve_counter = itertools.count()
+        # geri cekilme suresini bekleyen isler; hicbir yuva tutmazlar
+        self._delayed: Dict[ScheduledJob, asyncio.Task] = {}
+
+        self.pending = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.deferred = 0
+        self.total_queue_wait = 0.0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self):
+        if self._workers:
+            return
+        self._cond = asyncio.Condition()
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"download-worker-{i}")
+            for i in range(self.worker_count)
+        ]
+
+    async def stop(self):
+        workers, self._workers = self._workers, []
+        delayed = list(self._delayed.values())
+        self._delayed.clear()
+        for task in workers + delayed:
+            task.cancel()
+        await asyncio.gather(*workers, *delayed, return_exceptions=True)
+
+    async def submit(self, session_id: str, file_id: str, url: str,
+                     run: Callable[[], Awaitable[Any]], priority: int = 0) -> ScheduledJob:
+        if self._cond is None:
+            raise RuntimeError("Scheduler baslatilmadi, once start() cagrilmali")
+
+        job = ScheduledJob(priority, next(self._seq), session_id, file_id, url, run)
+
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.pending < self.max_pending)
+
+            self.pending += 1
+            self._session_outstanding[session_id] = self._session_outstanding.get(session_id, 0) + 1
+            done = self._session_done.get(session_id)
+            if done is None or done.is_set():
+                self._session_done[session_id] = asyncio.Event()
+
+            if self._session_admitted.get(session_id, 0) < self.per_session_limit:
+                self._admit(job)
+            else:
+                heapq.heappush(self._session_backlog.setdefault(session_id, []), job)
+
+            self._cond.notify_all()
+        return job
+
+    def limit_for(self, host: str) -> int:
+        limit = self.host_limit(host) if self.host_limit is not None else None
+        return self.per_host_limit if limit is None else limit
+
+    def host_demand(self, host: str) -> Tuple[int, int]:
+        return self._host_running.get(host, 0), len(self._host_queues.get(host, ()))
+
+    async def limits_changed(self):
+        # sinir artinca bekleyen isciler yeniden bakar
+        if self._cond is None:
+            return
+        async with self._cond:
+            self._cond.notify_all()
+
+    async def wait_session(self, session_id: str):
+        event = self._session_done.get(session_id)
+        if event is not None:
+            await event.wait()
+
+    async def cancel(self, session_id: str, file_ids: Optional[Set[str]] = None) -> List[ScheduledJob]:
+        # yalnizca kuyrukta bekleyen isler geri alinir; calisan isler cagiran tarafindan durdurulur
+        if self._cond is None:
+            return []
+
+        def matches(job: ScheduledJob) -> bool:
+            return job.session_id == session_id and (file_ids is None or job.file_id in file_ids)
+
+        removed: List[ScheduledJob] = []
+        async with self._cond:
+            backlog = self._session_backlog.get(session_id)
+            if backlog:
+                removed.extend(job for job in backlog if matches(job))
+                backlog[:] = [job for job in backlog if not matches(job)]
+                heapq.heapify(backlog)
+
+            for host, queue in list(self._host_queues.items()):
+                taken = [job for job in queue if matches(job)]
+                if not taken:
+                    continue
+                queue[:] = [job for job in queue if not matches(job)]
+                heapq.heapify(queue)
+                if not queue:
+                    del self._host_queues[host]
+                for _job in taken:
+                    self._decrement(self._session_admitted, session_id)
+                removed.extend(taken)
+
+            for job in [job for job in self._delayed if matches(job)]:
+                self._delayed.pop(job).cancel()
+                removed.append(job)
+
+            # bosalan oturum kotasi bekleyen diger islerle doldurulur
+            while backlog and self._session_admitted.get(session_id, 0) < self.per_session_limit:
+                self._admit(heapq.heappop(backlog))
+            if backlog is not None and not backlog:
+                self._session_backlog.pop(session_id, None)
+
+            if removed:
+                self.pending -= len(removed)
+                self.cancelled += len(removed)
+                outstanding = self._session_outstanding.get(session_id, 0) - len(removed)
+                if outstanding > 0:
+                    self._session_outstanding[session_id] = outstanding
+                else:
+                    self._session_outstanding.pop(session_id, None)
+                    event = self._session_done.pop(session_id, None)
+                    if event is not None:
+                        event.set()
+                self._cond.notify_all()
+        return removed
+
+    def _admit(self, job: ScheduledJob):
+        self._session_admitted[job.session_id] = self._session_admitted.get(job.session_id, 0) + 1
+        heapq.heappush(self._host_queues.setdefault(job.host, []), job)
+
+    def _next_job(self) -> Optional[ScheduledJob]:
+        best_host = None
+        best_key = None
+        for host, queue in self._host_queues.items():
+            if not queue or self._host_running.get(host, 0) >= self.limit_for(host):
+                continue
+            head = queue[0]
+            # once oncelik, esitlikte en uzun suredir hizmet almayan host
+            key = (head.priority, self._host_last_served.get(host, -1))
+            if best_key is None or key < best_key:
+                best_host, best_key = host, key
+
+        if best_host is None:
+            return None
+
+        queue = self._host_queues[best_host]
+        job = heapq.heappop(queue)
+        if not queue:
+            del self._host_queues[best_host]
+        self._host_last_served[best_host] = next(self._serve_counter)
+        return job
+
+    async def _worker(self, index: int):
+        while True:
+            async with self._cond:
+                job = self._next_job()
+                while job is None:
+                    await self._cond.wait()
+                    job = self._next_job()
+
+                self.pending -= 1
+                self.in_flight += 1
+                self._host_running[job.host] = self._host_running.get(job.host, 0) + 1
+                self._session_running[job.session_id] = self._session_running.get(job.session_id, 0) + 1
+                waited = time.monotonic() - job.enqueued_at
+                self.total_queue_wait += waited
+                QUEUE_WAIT.observe(waited)
+                self._cond.notify_all()
+
+            delay = None
+            try:
+                await job.run()
+                self.completed += 1
+            except RetryLater as later:
+                delay = later.delay
+                if later.run is not None:
+                    job.run = later.run
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.failed += 1
+                logger.exception("Zamanlayici isi hata verdi",
+                                 extra={"session_id": job.session_id, "file_id": job.file_id})
+            finally:
+                await self._release(job, delay)
+
+    async def _release(self, job: ScheduledJob, delay: Optional[float] = None):
+        async with self._cond:
+            self.in_flight -= 1
+            self._decrement(self._host_running, job.host)
+            self._decrement(self._session_running, job.session_id)
+            self._decrement(self._session_admitted, job.session_id)
+
+            backlog = self._session_backlog.get(job.session_id)
+            if backlog:
+                self._admit(heapq.heappop(backlog))
+                if not backlog:
+                    del self._session_backlog[job.session_id]
+
+            if delay is not None:
+                # oturum bitmis sayilmaz; is sure dolunca yeniden kuyruga girer
+                self.pending += 1
+                self.deferred += 1
+                self._delayed[job] = asyncio.create_task(self._requeue_after(job, delay))
+            elif self._decrement(self._session_outstanding, job.session_id) == 0:
+                event = self._session_done.pop(job.session_id, None)
+                if event is not None:
+                    event.set()
+
+            self._cond.notify_all()
+
+    async def _requeue_after(self, job: ScheduledJob, delay: float):
+        await asyncio.sleep(delay)
+        async with self._cond:
+            if self._delayed.pop(job, None) is None:
+                return
+            job.enqueued_at = time.monotonic()
+            if self._session_admitted.get(job.session_id, 0) < self.per_session_limit:
+                self._admit(job)
+            else:
+                heapq.heappush(self._session_backlog.setdefault(job.session_id, []), job)
+            self._cond.notify_all()
+
+    @staticmethod
+    def _decrement(counter: Dict[str, int], key: str) -> int:
+        value = counter.get(key, 0) - 1
+        if value <= 0:
+            counter.pop(key, None)
+            return 0
+        counter[key] = value
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        sessions: Dict[str, Dict[str, int]] = {}
+        for session_id, outstanding in self._session_outstanding.items():
+            running = self._session_running.get(session_id, 0)
+            sessions[session_id] = {
+                "outstanding": outstanding,
+                "in_flight": running,
+                "queued": outstanding - running,
+                "backlog": len(self._session_backlog.get(session_id, ())),
+            }
+
+        hosts: Dict[str, Dict[str, int]] = {}
+        for host in set(self._host_queues) | set(self._host_running):
+            hosts[host] = {
+                "queued": len(self._host_queues.get(host, ())),
+                "in_flight": self._host_running.get(host, 0),
+                "limit": self.limit_for(host),
+            }
+
+        started = self.completed + self.failed + self.in_flight
+        return {
+            "workers": len(self._workers),
+            "per_session_limit": self.per_session_limit,
+            "per_host_limit": self.per_host_limit,
+            "max_pending": self.max_pending,
+            "queue_depth": self.pending,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "delayed": len(self._delayed),
+            "deferred": self.deferred,
+            "avg_queue_wait_seconds": round(self.total_queue_wait / started, 4) if started else 0,
+            "sessions": sessions,
+            "hosts": hosts,
+        }
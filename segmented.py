@@ -0,0 +1,176 @@
+
+import asyncio
+import os
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import aiohttp
+
+from file_writer import (
+    CHUNK_SIZE_MAX, CHUNK_SIZE_MIN, BufferedFileWriter, iter_adaptive_chunks, open_for_write, preallocate
+)
+
+SEGMENT_COUNT = 4
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+SEGMENT_WRITE_BUFFER = 1024 * 1024
+
+
+class SegmentError(Exception):
+    pass
+
+
+class RangeProbe:
+    __slots__ = ("accept_ranges", "content_length", "etag", "last_modified")
+
+    def __init__(self, accept_ranges: bool, content_length: int,
+                 etag: Optional[str], last_modified: Optional[str]):
+        self.accept_ranges = accept_ranges
+        self.content_length = content_length
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def validator(self) -> Optional[str]:
+        return self.etag or self.last_modified
+
+
+async def probe_range_support(session: aiohttp.ClientSession, url: str,
+                              timeout: Optional[aiohttp.ClientTimeout] = None) -> RangeProbe:
+    # parcalar ham byte araliklaridir; sunucudan sikistirilmamis temsil istenir
+    async with session.head(url, allow_redirects=True, timeout=timeout,
+                            headers={"Accept-Encoding": "identity"}) as response:
+        if response.status != 200:
+            return RangeProbe(False, 0, None, None)
+
+        accept_ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+        try:
+            content_length = int(response.headers.get("Content-Length", 0))
+        except ValueError:
+            content_length = 0
+
+        # sikistirilmis yanitlarda Content-Length ham boyutu gostermez, bolmeye uygun degil
+        if response.headers.get("Content-Encoding", "identity").lower() != "identity":
+            accept_ranges = False
+
+        return RangeProbe(
+            accept_ranges and content_length > 0,
+            content_length,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
+
+
+def parse_content_range(value: Optional[str]) -> Optional[Tuple[int, int, Optional[int]]]:
+    # "bytes 0-99/1000" -> (0, 99, 1000); toplam bilinmiyorsa "*" gelir
+    if not value:
+        return None
+    unit, _, spec = value.strip().partition(" ")
+    span, _, total = spec.partition("/")
+    first, _, last = span.partition("-")
+    try:
+        start, end = int(first), int(last)
+        size = None if total.strip() == "*" else int(total)
+    except ValueError:
+        return None
+    if unit.lower() != "bytes" or start > end:
+        return None
+    return start, end, size
+
+
+def plan_segments(total_size: int, segments: int, min_segment_size: int) -> List[Tuple[int, int]]:
+    if total_size <= 0 or segments <= 1:
+        return []
+
+    count = min(segments, total_size // max(min_segment_size, 1))
+    if count <= 1:
+        return []
+
+    base, extra = divmod(total_size, count)
+    ranges = []
+    start = 0
+    for i in range(count):
+        length = base + (1 if i < extra else 0)
+        ranges.append((start, start + length - 1))
+        start += length
+    return ranges
+
+
+async def _fetch_segment(session: aiohttp.ClientSession, url: str, file_path, fd: int, index: int,
+                         offset: int, end: int, validator: Optional[str],
+                         timeout: Optional[aiohttp.ClientTimeout],
+                         on_progress: Callable[[int], Awaitable[None]],
+                         on_checkpoint: Optional[Callable[[int, int], Awaitable[None]]],
+                         max_chunk_size: int = CHUNK_SIZE_MAX, total_size: Optional[int] = None):
+    if offset > end:
+        return
+
+    start = offset
+    headers = {"Range": f"bytes={start}-{end}", "Accept-Encoding": "identity"}
+    if validator:
+        headers["If-Range"] = validator
+
+    async with session.get(url, headers=headers, timeout=timeout) as response:
+        if response.status != 206:
+            raise SegmentError(f"Segment {start}-{end} icin HTTP {response.status}")
+        # baska bir aralik donduren sunucu ya da proxy'nin verisi yanlis offset'e yazilmamali
+        content_range = parse_content_range(response.headers.get("Content-Range"))
+        if content_range is None or content_range[:2] != (start, end) \
+                or (total_size and content_range[2] is not None and content_range[2] != total_size):
+            raise SegmentError(f"Segment {start}-{end} icin beklenmeyen Content-Range: "
+                               f"{response.headers.get('Content-Range')}")
+
+        writer = BufferedFileWriter(file_path, offset=offset, buffer_size=SEGMENT_WRITE_BUFFER, fd=fd)
+        try:
+            async for chunk in iter_adaptive_chunks(response.content, min(CHUNK_SIZE_MIN, max_chunk_size), max_chunk_size):
+                await on_progress(len(chunk))
+                if await writer.write(chunk) and on_checkpoint is not None:
+                    await on_checkpoint(index, writer.bytes_flushed)
+        finally:
+            await writer.close()
+            # iptal edilen parcanin da son offset'i kaydedilir, devam ederken bastan cekilmez
+            if on_checkpoint is not None:
+                await on_checkpoint(index, writer.bytes_flushed)
+
+        if writer.bytes_flushed != end + 1:
+            raise SegmentError(f"Segment {start}-{end} eksik indi ({writer.bytes_flushed - start} byte)")
+
+
+async def download_segmented(session: aiohttp.ClientSession, url: str, file_path,
+                             probe: RangeProbe, ranges: List[Tuple[int, int]],
+                             on_progress: Callable[[int], Awaitable[None]],
+                             timeout: Optional[aiohttp.ClientTimeout] = None,
+                             offsets: Optional[List[int]] = None,
+                             on_checkpoint: Optional[Callable[[int, int], Awaitable[None]]] = None,
+                             max_chunk_size: int = CHUNK_SIZE_MAX) -> int:
+    loop = asyncio.get_running_loop()
+    truncate = offsets is None
+    if truncate:
+        offsets = [start for start, _end in ranges]
+
+    fd = await loop.run_in_executor(None, open_for_write, file_path, truncate)
+    try:
+        await loop.run_in_executor(None, os.ftruncate, fd, probe.content_length)
+        await loop.run_in_executor(None, preallocate, fd, 0, probe.content_length)
+
+        tasks = [
+            asyncio.create_task(
+                _fetch_segment(session, url, file_path, fd, index, offsets[index], end,
+                               probe.validator, timeout, on_progress, on_checkpoint, max_chunk_size,
+                               probe.content_length)
+            )
+            for index, (_start, end) in enumerate(ranges)
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            # gather parcalari zaten iptal etti; ikinci bir iptal kapanistaki son yazmayi ve checkpoint'i keser
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+    finally:
+        await loop.run_in_executor(None, os.close, fd)
+
+    return probe.content_length
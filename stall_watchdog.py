@@ -0,0 +1,217 @@
+
+import asyncio
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from structured_logging import get_logger
+
+WATCHDOG_TICK_SECONDS = 1.0
+WATCHDOG_WHEEL_SLOTS = 512
+STALL_TIMEOUT_SECONDS = 20.0
+MIN_BYTES_PER_SECOND = 0
+SLOW_GRACE_SECONDS = 15.0
+STALL_ACTION = "resume"
+MAX_RESTARTS = 2
+RATE_SMOOTHING = 0.3
+
+STALL_ACTIONS = ("cancel", "retry", "resume")
+
+logger = get_logger("watchdog")
+
+
+class WatchdogPolicy:
+    __slots__ = ("stall_timeout", "min_bytes_per_second", "grace_seconds", "action", "max_restarts")
+
+    def __init__(self, stall_timeout: float = STALL_TIMEOUT_SECONDS,
+                 min_bytes_per_second: int = MIN_BYTES_PER_SECOND,
+                 grace_seconds: float = SLOW_GRACE_SECONDS,
+                 action: str = STALL_ACTION, max_restarts: int = MAX_RESTARTS):
+        if action not in STALL_ACTIONS:
+            raise ValueError(f"Gecersiz duraklama politikasi: {action}")
+        self.stall_timeout = stall_timeout
+        self.min_bytes_per_second = min_bytes_per_second
+        self.grace_seconds = grace_seconds
+        self.action = action
+        self.max_restarts = max_restarts
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class FileWatch:
+    __slots__ = (
+        "session_id", "file_id", "policy", "task", "started_at", "last_progress",
+        "bytes", "rate", "_rate_bytes", "_rate_time", "slot", "reason",
+    )
+
+    def __init__(self, session_id: str, file_id: str, policy: WatchdogPolicy):
+        now = time.monotonic()
+        self.session_id = session_id
+        self.file_id = file_id
+        self.policy = policy
+        self.task: Optional[asyncio.Task] = None
+        self.started_at = now
+        self.last_progress = now
+        self.bytes = 0
+        self.rate = 0.0
+        self._rate_bytes = 0
+        self._rate_time = now
+        self.slot = -1
+        self.reason: Optional[str] = None
+
+    def feed(self, n: int):
+        self.bytes += n
+        self.last_progress = time.monotonic()
+
+    def update_rate(self, now: float) -> float:
+        elapsed = now - self._rate_time
+        if elapsed > 0:
+            instant = (self.bytes - self._rate_bytes) / elapsed
+            if self._rate_bytes == 0 and self.rate == 0.0:
+                self.rate = instant
+            else:
+                self.rate = RATE_SMOOTHING * instant + (1 - RATE_SMOOTHING) * self.rate
+            self._rate_bytes = self.bytes
+            self._rate_time = now
+        return self.rate
+
+
+class TimerWheel:
+    def __init__(self, tick_seconds: float = WATCHDOG_TICK_SECONDS, slots: int = WATCHDOG_WHEEL_SLOTS):
+        self.tick_seconds = tick_seconds
+        self.slots: List[Set[FileWatch]] = [set() for _ in range(slots)]
+        self.current = 0
+
+    def schedule(self, watch: FileWatch, delay: float):
+        # tekerlekten uzun gecikmeler son slota konur, o turda yeniden planlanir
+        ticks = min(max(1, math.ceil(delay / self.tick_seconds)), len(self.slots) - 1)
+        slot = (self.current + ticks) % len(self.slots)
+        self.cancel(watch)
+        watch.slot = slot
+        self.slots[slot].add(watch)
+
+    def cancel(self, watch: FileWatch):
+        if watch.slot >= 0:
+            self.slots[watch.slot].discard(watch)
+            watch.slot = -1
+
+    def advance(self) -> Set[FileWatch]:
+        self.current = (self.current + 1) % len(self.slots)
+        due, self.slots[self.current] = self.slots[self.current], set()
+        for watch in due:
+            watch.slot = -1
+        return due
+
+
+class DownloadWatchdog:
+    def __init__(self, on_trigger: Callable[[FileWatch, str], Awaitable[None]],
+                 tick_seconds: float = WATCHDOG_TICK_SECONDS,
+                 slots: int = WATCHDOG_WHEEL_SLOTS):
+        self.on_trigger = on_trigger
+        self.wheel = TimerWheel(tick_seconds, slots)
+        self.default_policy = WatchdogPolicy()
+        self.policies: Dict[str, WatchdogPolicy] = {}
+        self.watches: Dict[Tuple[str, str], FileWatch] = {}
+        self._runner: Optional[asyncio.Task] = None
+
+        self.stalls = 0
+        self.slow = 0
+
+    @property
+    def tick_seconds(self) -> float:
+        return self.wheel.tick_seconds
+
+    async def start(self):
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run(), name="download-watchdog")
+
+    async def stop(self):
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+
+    def set_policy(self, session_id: str, policy: WatchdogPolicy):
+        self.policies[session_id] = policy
+
+    def clear_policy(self, session_id: str):
+        self.policies.pop(session_id, None)
+
+    def policy_for(self, session_id: str) -> WatchdogPolicy:
+        return self.policies.get(session_id, self.default_policy)
+
+    def track(self, session_id: str, file_id: str) -> FileWatch:
+        watch = FileWatch(session_id, file_id, self.policy_for(session_id))
+        self.watches[(session_id, file_id)] = watch
+        self.wheel.schedule(watch, self._next_check(watch, watch.started_at))
+        return watch
+
+    def untrack(self, watch: FileWatch):
+        self.wheel.cancel(watch)
+        if self.watches.get((watch.session_id, watch.file_id)) is watch:
+            del self.watches[(watch.session_id, watch.file_id)]
+
+    def get(self, session_id: str, file_id: str) -> Optional[FileWatch]:
+        return self.watches.get((session_id, file_id))
+
+    @staticmethod
+    def _next_check(watch: FileWatch, now: float) -> float:
+        policy = watch.policy
+        delay = watch.last_progress + policy.stall_timeout - now
+        if policy.min_bytes_per_second:
+            delay = min(delay, max(watch.started_at + policy.grace_seconds - now, WATCHDOG_TICK_SECONDS))
+        return max(delay, 0)
+
+    def _evaluate(self, watch: FileWatch, now: float) -> Optional[str]:
+        policy = watch.policy
+        rate = watch.update_rate(now)
+        if now - watch.last_progress >= policy.stall_timeout:
+            return "stalled"
+        if policy.min_bytes_per_second and now - watch.started_at >= policy.grace_seconds \
+                and rate < policy.min_bytes_per_second:
+            return "slow"
+        return None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.wheel.tick_seconds)
+            now = time.monotonic()
+            for watch in self.wheel.advance():
+                if watch.reason is not None:
+                    continue
+                reason = self._evaluate(watch, now)
+                if reason is None:
+                    self.wheel.schedule(watch, self._next_check(watch, now))
+                    continue
+
+                watch.reason = reason
+                if reason == "stalled":
+                    self.stalls += 1
+                else:
+                    self.slow += 1
+                try:
+                    await self.on_trigger(watch, reason)
+                except Exception as e:
+                    logger.exception("Watchdog islemi basarisiz",
+                                     extra={"session_id": watch.session_id, "file_id": watch.file_id})
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "tracked": len(self.watches),
+            "stalls": self.stalls,
+            "slow": self.slow,
+            "tick_seconds": self.wheel.tick_seconds,
+            "default_policy": self.default_policy.to_dict(),
+            "files": [
+                {
+                    "session_id": watch.session_id,
+                    "file_id": watch.file_id,
+                    "bytes": watch.bytes,
+                    "bytes_per_second": round(watch.rate, 1),
+                    "idle_seconds": round(now - watch.last_progress, 2),
+                }
+                for watch in list(self.watches.values())[:100]
+            ],
+        }
@@ -0,0 +1,530 @@
+
+import asyncio
+import json
+import pathlib
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from file_table import FileRecord, FileTable
+from structured_logging import get_logger
+
+STATE_FLUSH_SECONDS = 1.0
+STATE_HOT_SESSIONS = 32
+STATE_DB_NAME = "download_state.db"
+# IN (...) listeleri SQLite'in parametre sinirinin altinda tutulur
+STATE_QUERY_CHUNK = 500
+
+# yeniden baslatmada bu durumlarda kalan dosyalar aslinda yarida kesilmistir
+INTERRUPTED_STATUSES = ("queued", "downloading", "retrying", "paused")
+
+FILE_COLUMNS = ("file_id", "url", "status", "progress", "size", "error", "attempts", "start_time", "checksum",
+                "wire_size", "encoding")
+# eski veritabanlarina sonradan eklenen kolonlarin tipleri; belirtilmeyenler TEXT
+ADDED_COLUMN_TYPES = {"wire_size": "INTEGER NOT NULL DEFAULT 0"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS files (
+    session_id TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress INTEGER NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    start_time REAL,
+    checksum TEXT,
+    wire_size INTEGER NOT NULL DEFAULT 0,
+    encoding TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (session_id, file_id)
+);
+CREATE INDEX IF NOT EXISTS idx_files_session ON files (session_id);
+CREATE INDEX IF NOT EXISTS idx_files_status ON files (status);
+CREATE INDEX IF NOT EXISTS idx_sessions_created ON sessions (created_at);
+CREATE TABLE IF NOT EXISTS reports (
+    session_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    finished INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    pending INTEGER NOT NULL DEFAULT 0,
+    status_counts TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_reports_created ON reports (created_at);
+CREATE TABLE IF NOT EXISTS report_statuses (
+    status TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (status, session_id)
+);
+"""
+
+REPORT_COLUMNS = ("session_id", "created_at", "updated_at", "finished", "total", "completed", "deleted", "pending")
+REPORT_PAGE_MAX = 500
+
+
+FILE_UPSERT = (
+    f"INSERT INTO files (session_id, {', '.join(FILE_COLUMNS)}, updated_at) "
+    f"VALUES ({', '.join('?' * (len(FILE_COLUMNS) + 2))}) "
+    f"ON CONFLICT(session_id, file_id) DO UPDATE SET "
+    + ", ".join(f"{column} = excluded.{column}" for column in FILE_COLUMNS[1:] + ("updated_at",))
+)
+
+logger = get_logger("state")
+
+
+def report_matches(summary: Dict[str, Any], since: Optional[float], until: Optional[float],
+                   finished: Optional[bool], file_status: Optional[str]) -> bool:
+    return ((since is None or summary["created_at"] >= since)
+            and (until is None or summary["created_at"] < until)
+            and (finished is None or summary["finished"] == finished)
+            and (file_status is None or bool(summary["status_counts"].get(file_status))))
+
+
+def report_order(summary: Dict[str, Any]) -> Tuple[float, str]:
+    # veritabanindaki ORDER BY created_at DESC, session_id DESC ile ayni sira
+    return summary["created_at"], summary["session_id"]
+
+
+class SessionState:
+    __slots__ = ("session_id", "created_at", "finished_at", "files")
+
+    def __init__(self, session_id: str, created_at: Optional[float] = None, finished_at: Optional[float] = None):
+        self.session_id = session_id
+        self.created_at = created_at if created_at is not None else time.time()
+        self.finished_at = finished_at
+        self.files = FileTable()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "file_count": len(self.files),
+        }
+
+
+# bellek ici depo; kalici depolar _write_batch, _load_session ve _list_sessions'i ezer
+class StateStore:
+    persistent = False
+
+    def __init__(self, hot_sessions: int = STATE_HOT_SESSIONS, flush_seconds: float = STATE_FLUSH_SECONDS):
+        self.hot_sessions = hot_sessions
+        self.flush_seconds = flush_seconds
+        # aktif oturumlar her zaman bellekte; bitenler LRU sirasiyla hot_sessions kadar tutulur
+        self.sessions: "OrderedDict[str, SessionState]" = OrderedDict()
+        # dict sirali kume olarak kullaniliyor; satirlar eklenme sirasiyla yazilir
+        self._dirty_files: Dict[Tuple[str, str], None] = {}
+        self._dirty_sessions: Set[str] = set()
+        self._dirty_reports: Dict[str, Dict[str, Any]] = {}
+        # yazimi suren raporlar; yazim bitene kadar sorgular bunlari bellekten okur
+        self._flushing_reports: Dict[str, Dict[str, Any]] = {}
+        # kalici olmayan depoda rapor katalogu yalnizca bellekte tutulur
+        self.report_index: Dict[str, Dict[str, Any]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+        self.writes = 0
+        self.batches = 0
+        self.evictions = 0
+        self.cold_reads = 0
+
+    async def open(self):
+        if self._flusher is None:
+            self._wakeup = asyncio.Event()
+            self._flusher = asyncio.create_task(self._flush_loop(), name="state-store")
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self.sessions
+
+    def create_session(self, session_id: str) -> SessionState:
+        state = self.sessions.get(session_id)
+        if state is None:
+            state = self.sessions[session_id] = SessionState(session_id)
+            self._dirty_sessions.add(session_id)
+            self._schedule()
+        return state
+
+    def files(self, session_id: str) -> Optional[FileTable]:
+        state = self.sessions.get(session_id)
+        return state.files if state is not None else None
+
+    def file(self, session_id: str, file_id: str) -> Optional[FileRecord]:
+        state = self.sessions.get(session_id)
+        return state.files.get(file_id) if state is not None else None
+
+    def put_file(self, session_id: str, info: Dict[str, Any]) -> FileRecord:
+        # dict yalnizca ilk degerleri tasir; sonraki guncellemeler donen kayit uzerinden yapilmali
+        record = self.create_session(session_id).files.put(info)
+        self.touch(session_id, info["file_id"])
+        return record
+
+    def touch(self, session_id: str, file_id: str):
+        # ilerleme sayaclari yerinde guncellenir; satir yalnizca durum degisiminde kirli isaretlenir
+        self._dirty_files[(session_id, file_id)] = None
+        self._schedule()
+
+    def index_report(self, summary: Dict[str, Any]):
+        if self.persistent:
+            self._dirty_reports[summary["session_id"]] = summary
+            self._schedule()
+        else:
+            self.report_index[summary["session_id"]] = summary
+
+    async def query_reports(self, limit: int = 50, offset: int = 0, since: Optional[float] = None,
+                            until: Optional[float] = None, finished: Optional[bool] = None,
+                            file_status: Optional[str] = None) -> Tuple[int, List[Dict[str, Any]]]:
+        limit = max(1, min(limit, REPORT_PAGE_MAX))
+        return await self._query_reports(limit, max(0, offset), since, until, finished, file_status)
+
+    async def _query_reports(self, limit: int, offset: int, since: Optional[float], until: Optional[float],
+                             finished: Optional[bool], file_status: Optional[str]) -> Tuple[int, List[Dict[str, Any]]]:
+        matches = [
+            summary for summary in self.report_index.values()
+            if report_matches(summary, since, until, finished, file_status)
+        ]
+        matches.sort(key=report_order, reverse=True)
+        return len(matches), matches[offset:offset + limit]
+
+    async def report_count(self) -> int:
+        return len(self.report_index)
+
+    def _pending_reports(self) -> Dict[str, Dict[str, Any]]:
+        # henuz veritabanina yazilmamis ya da yazimi suren ozetler; sorgular bunlari DB satirlarinin yerine kullanir
+        return {**self._flushing_reports, **self._dirty_reports}
+
+    def _schedule(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def finish_session(self, session_id: str):
+        state = self.sessions.get(session_id)
+        if state is None:
+            return
+        state.finished_at = time.time()
+        self._dirty_sessions.add(session_id)
+        self.sessions.move_to_end(session_id)
+        # bitis satiri arka plandaki toplu yazimla diske iner; bellekten atma yazimdan sonra yapilir
+        self._schedule()
+
+    def _evict(self):
+        if not self.persistent:
+            return
+        # kirli satiri olan oturum diske inmeden bellekten atilmaz, aksi halde soguk okuma eski veriyi getirir
+        dirty = self._dirty_sessions | {session_id for session_id, _file_id in self._dirty_files}
+        finished = [sid for sid, state in self.sessions.items() if state.finished_at is not None and sid not in dirty]
+        for session_id in finished[:max(0, len(finished) - self.hot_sessions)]:
+            del self.sessions[session_id]
+            self.evictions += 1
+
+    async def interrupt_sessions(self, session_ids: List[str]) -> int:
+        return 0
+
+    async def interrupt_files(self, files: Dict[str, List[str]]) -> int:
+        return 0
+
+    async def load_session(self, session_id: str) -> Optional[SessionState]:
+        state = self.sessions.get(session_id)
+        if state is not None:
+            if state.finished_at is not None:
+                self.sessions.move_to_end(session_id)
+            return state
+        self.cold_reads += 1
+        return await self._load_session(session_id)
+
+    async def _flush_loop(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Durum deposu yazma hatasi", extra={"error": str(e)})
+            await asyncio.sleep(self.flush_seconds)
+
+    def _rows(self, dirty_sessions: Iterable[str], dirty_files: Iterable[Tuple[str, str]]) -> Tuple[List[Tuple], List[Tuple]]:
+        now = time.time()
+        session_rows = []
+        for session_id in dirty_sessions:
+            state = self.sessions.get(session_id)
+            if state is not None:
+                session_rows.append((session_id, state.created_at, state.finished_at))
+
+        file_rows = []
+        for session_id, file_id in dirty_files:
+            info = self.file(session_id, file_id)
+            if info is not None:
+                file_rows.append((session_id, *(info.get(column) for column in FILE_COLUMNS), now))
+        return session_rows, file_rows
+
+    async def flush(self):
+        if not self._dirty_sessions and not self._dirty_files and not self._dirty_reports:
+            self._evict()
+            return
+        dirty_sessions, self._dirty_sessions = self._dirty_sessions, set()
+        dirty_files, self._dirty_files = self._dirty_files, {}
+        dirty_reports, self._dirty_reports = self._dirty_reports, {}
+        if not self.persistent:
+            return
+
+        session_rows, file_rows = self._rows(dirty_sessions, dirty_files)
+        reports = list(dirty_reports.values())
+        self._flushing_reports = dirty_reports
+        try:
+            await self._write_batch(session_rows, file_rows, reports)
+        except Exception:
+            # yazilamayan satirlar bir sonraki turda tekrar denenir
+            self._dirty_sessions |= dirty_sessions
+            for key in dirty_files:
+                self._dirty_files[key] = None
+            for session_id, summary in dirty_reports.items():
+                self._dirty_reports.setdefault(session_id, summary)
+            raise
+        finally:
+            self._flushing_reports = {}
+        self.writes += len(session_rows) + len(file_rows) + len(reports)
+        self.batches += 1
+        self._evict()
+
+    async def _write_batch(self, session_rows: List[Tuple], file_rows: List[Tuple], reports: List[Dict[str, Any]]):
+        pass
+
+    async def _load_session(self, session_id: str) -> Optional[SessionState]:
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self).__name__,
+            "hot_sessions": len(self.sessions),
+            "active_sessions": sum(1 for state in self.sessions.values() if state.finished_at is None),
+            "hot_files": sum(len(state.files) for state in self.sessions.values()),
+            "file_column_bytes": sum(state.files.memory_bytes() for state in self.sessions.values()),
+            "dirty_files": len(self._dirty_files),
+            "writes": self.writes,
+            "batches": self.batches,
+            "evictions": self.evictions,
+            "cold_reads": self.cold_reads,
+        }
+
+
+class SQLiteStateStore(StateStore):
+    persistent = True
+
+    def __init__(self, path: pathlib.Path, hot_sessions: int = STATE_HOT_SESSIONS,
+                 flush_seconds: float = STATE_FLUSH_SECONDS, recover: bool = True):
+        super().__init__(hot_sessions, flush_seconds)
+        self.path = path
+        # ayni veritabanini paylasan surecler birbirinin suren indirmelerini 'interrupted' yapmamali
+        self.recover = recover
+        self._conn: Optional[sqlite3.Connection] = None
+        # tek baglanti, sorgular sirayla thread havuzunda calisir
+        self._lock = asyncio.Lock()
+
+    async def _run(self, fn, *args):
+        async with self._lock:
+            return await asyncio.to_thread(fn, *args)
+
+    def _open_sync(self) -> int:
+        conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        # onceki surumde olusturulan veritabanlarinda eksik kolonlar eklenir
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(files)")}
+        for column in FILE_COLUMNS:
+            if column not in existing:
+                conn.execute(f"ALTER TABLE files ADD COLUMN {column} {ADDED_COLUMN_TYPES.get(column, 'TEXT')}")
+        if not self.recover:
+            conn.commit()
+            self._conn = conn
+            return 0
+        self._conn = conn
+        return self._mark_interrupted(conn)
+
+    @staticmethod
+    def _mark_interrupted(conn: sqlite3.Connection, session_ids: Optional[List[str]] = None) -> int:
+        now = time.time()
+        scope, params = "", []
+        if session_ids is not None:
+            scope = f" AND session_id IN ({','.join('?' * len(session_ids))})"
+            params = list(session_ids)
+        placeholders = ",".join("?" * len(INTERRUPTED_STATUSES))
+        cursor = conn.execute(
+            f"UPDATE files SET status = 'interrupted', updated_at = ? WHERE status IN ({placeholders}){scope}",
+            (now, *INTERRUPTED_STATUSES, *params)
+        )
+        conn.execute(f"UPDATE sessions SET finished_at = ? WHERE finished_at IS NULL{scope}", (now, *params))
+        conn.commit()
+        return cursor.rowcount
+
+    async def open(self):
+        if self._conn is None:
+            interrupted = await self._run(self._open_sync)
+            logger.info("Durum deposu hazir", extra={"path": str(self.path)})
+            if interrupted:
+                logger.warning("Onceki calismadan yarida kalan dosyalar 'interrupted' olarak isaretlendi",
+                               extra={"files": interrupted})
+        await super().open()
+
+    async def close(self):
+        await super().close()
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            await self._run(conn.close)
+
+    def _write_sync(self, session_rows: List[Tuple], file_rows: List[Tuple], reports: List[Dict[str, Any]]):
+        with self._conn:
+            if session_rows:
+                self._conn.executemany(
+                    "INSERT INTO sessions (session_id, created_at, finished_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(session_id) DO UPDATE SET finished_at = excluded.finished_at",
+                    session_rows
+                )
+            if file_rows:
+                self._conn.executemany(FILE_UPSERT, file_rows)
+            for summary in reports:
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO reports ({', '.join(REPORT_COLUMNS)}, status_counts) "
+                    f"VALUES ({', '.join('?' * (len(REPORT_COLUMNS) + 1))})",
+                    (*(summary[column] for column in REPORT_COLUMNS), json.dumps(summary["status_counts"]))
+                )
+                self._conn.execute("DELETE FROM report_statuses WHERE session_id = ?", (summary["session_id"],))
+                self._conn.executemany(
+                    "INSERT INTO report_statuses (status, session_id, count) VALUES (?, ?, ?)",
+                    [(status, summary["session_id"], count) for status, count in summary["status_counts"].items()]
+                )
+
+    async def _write_batch(self, session_rows: List[Tuple], file_rows: List[Tuple], reports: List[Dict[str, Any]]):
+        if self._conn is not None:
+            await self._run(self._write_sync, session_rows, file_rows, reports)
+
+    def _load_sync(self, session_id: str) -> Optional[SessionState]:
+        row = self._conn.execute(
+            "SELECT session_id, created_at, finished_at FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        state = SessionState(row["session_id"], row["created_at"], row["finished_at"])
+        for file_row in self._conn.execute(
+                f"SELECT {', '.join(FILE_COLUMNS)} FROM files WHERE session_id = ? ORDER BY rowid", (session_id,)):
+            state.files.put(dict(file_row))
+        return state
+
+    async def _load_session(self, session_id: str) -> Optional[SessionState]:
+        if self._conn is None:
+            return None
+        return await self._run(self._load_sync, session_id)
+
+    async def interrupt_sessions(self, session_ids: List[str]) -> int:
+        # sureci olen worker'in oturumlari; yeniden baslatmadaki kurtarmayla ayni sekilde isaretlenir
+        if self._conn is None or not session_ids:
+            return 0
+        return await self._run(self._mark_interrupted, self._conn, session_ids)
+
+    def _interrupt_files_sync(self, files: Dict[str, List[str]]) -> int:
+        # oturumun diger parcalari baska worker'larda suruyor; yalnizca olen worker'in dosyalari isaretlenir
+        now = time.time()
+        placeholders = ",".join("?" * len(INTERRUPTED_STATUSES))
+        changed = 0
+        with self._conn:
+            for session_id, file_ids in files.items():
+                for start in range(0, len(file_ids), STATE_QUERY_CHUNK):
+                    chunk = file_ids[start:start + STATE_QUERY_CHUNK]
+                    changed += self._conn.execute(
+                        f"UPDATE files SET status = 'interrupted', updated_at = ? WHERE session_id = ? "
+                        f"AND status IN ({placeholders}) AND file_id IN ({','.join('?' * len(chunk))})",
+                        (now, session_id, *INTERRUPTED_STATUSES, *chunk)
+                    ).rowcount
+        return changed
+
+    async def interrupt_files(self, files: Dict[str, List[str]]) -> int:
+        if self._conn is None or not files:
+            return 0
+        return await self._run(self._interrupt_files_sync, files)
+
+    def _query_sync(self, limit: int, offset: int, since: Optional[float], until: Optional[float],
+                    finished: Optional[bool], file_status: Optional[str],
+                    pending: Dict[str, Dict[str, Any]]) -> Tuple[int, List[Dict[str, Any]]]:
+        clauses, params = [], []
+        if since is not None:
+            clauses.append("r.created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("r.created_at < ?")
+            params.append(until)
+        if finished is not None:
+            clauses.append("r.finished = ?")
+            params.append(int(finished))
+        if file_status is not None:
+            clauses.append("r.session_id IN (SELECT session_id FROM report_statuses WHERE status = ? AND count > 0)")
+            params.append(file_status)
+        if pending:
+            # bellekteki guncel ozetler veritabanindaki eski satirlarinin yerine gecer
+            clauses.append(f"r.session_id NOT IN ({','.join('?' * len(pending))})")
+            params.extend(pending)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        total = self._conn.execute(f"SELECT COUNT(*) FROM reports r {where}", params).fetchone()[0]
+        # her bekleyen ozetin birlesik siradaki yeri, kendisinden once gelen DB satirlari sayilarak bulunur
+        fresh = sorted((summary for summary in pending.values()
+                        if report_matches(summary, since, until, finished, file_status)),
+                       key=report_order, reverse=True)
+        ahead = f"{where} AND" if where else "WHERE"
+        placed = []
+        for index, summary in enumerate(fresh):
+            before = self._conn.execute(
+                f"SELECT COUNT(*) FROM reports r {ahead} "
+                f"(r.created_at > ? OR (r.created_at = ? AND r.session_id > ?))",
+                (*params, summary["created_at"], summary["created_at"], summary["session_id"])
+            ).fetchone()[0]
+            placed.append((before + index, summary))
+        skipped = sum(1 for position, _summary in placed if position < offset)
+
+        rows = self._conn.execute(
+            f"SELECT r.* FROM reports r {where} ORDER BY r.created_at DESC, r.session_id DESC LIMIT ? OFFSET ?",
+            (*params, limit, offset - skipped)
+        )
+        summaries = [summary for position, summary in placed if offset <= position < offset + limit]
+        for row in rows:
+            summary = dict(row)
+            summary["finished"] = bool(summary["finished"])
+            summary["status_counts"] = json.loads(summary["status_counts"])
+            summaries.append(summary)
+        summaries.sort(key=report_order, reverse=True)
+        return total + len(fresh), summaries[:limit]
+
+    async def _query_reports(self, limit: int, offset: int, since: Optional[float], until: Optional[float],
+                             finished: Optional[bool], file_status: Optional[str]) -> Tuple[int, List[Dict[str, Any]]]:
+        if self._conn is None:
+            return 0, []
+        return await self._run(self._query_sync, limit, offset, since, until, finished, file_status,
+                               self._pending_reports())
+
+    def _count_sync(self, pending: List[str]) -> int:
+        stored = self._conn.execute(
+            f"SELECT COUNT(*) FROM reports WHERE session_id NOT IN ({','.join('?' * len(pending))})", pending
+        ).fetchone()[0]
+        return stored + len(pending)
+
+    async def report_count(self) -> int:
+        if self._conn is None:
+            return 0
+        return await self._run(self._count_sync, list(self._pending_reports()))
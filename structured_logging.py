@@ -0,0 +1,136 @@
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+LOG_QUEUE_SIZE = 10000
+LOGGER_PREFIX = "downloader"
+
+# LogRecord'un kendi alanlari; geri kalan her sey extra= ile gelen yapisal alandir
+_RECORD_FIELDS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+def record_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "message": record.getMessage(),
+        }
+        entry.update(record_fields(record))
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = record_fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    # kuyruk doluysa event loop beklemez, kayit atilir ve sayilir
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # bicimlendirme dinleyici thread'inde yapilir; burada yalnizca mesaj ve hata metni sabitlenir
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[DroppingQueueHandler] = None
+_format = LOG_FORMAT
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, stream=None) -> DroppingQueueHandler:
+    global _listener, _queue_handler, _format
+    if _queue_handler is not None:
+        return _queue_handler
+    _format = fmt
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    _queue_handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(logging.WARNING)
+    logging.getLogger(LOGGER_PREFIX).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    # yeniden kurulumda cikis kancasi tekrar eklenmez
+    atexit.unregister(shutdown_logging)
+    atexit.register(shutdown_logging)
+    return _queue_handler
+
+
+def shutdown_logging():
+    # kuyruk bosaltilip handler kaldirilir; sonraki setup_logging dinleyiciyi yeniden kurar
+    global _listener, _queue_handler
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"{LOGGER_PREFIX}.{name}")
+
+
+def set_level(level: str, name: Optional[str] = None):
+    logger = logging.getLogger(f"{LOGGER_PREFIX}.{name}" if name else LOGGER_PREFIX)
+    logger.setLevel(level.upper())
+
+
+def levels() -> Dict[str, Any]:
+    manager = logging.Logger.manager
+    result = {LOGGER_PREFIX: logging.getLevelName(logging.getLogger(LOGGER_PREFIX).getEffectiveLevel())}
+    for name, logger in sorted(manager.loggerDict.items()):
+        if name.startswith(LOGGER_PREFIX + ".") and isinstance(logger, logging.Logger) and logger.level:
+            result[name] = logging.getLevelName(logger.level)
+    return {
+        "levels": result,
+        "format": _format,
+        "queued": _queue_handler.queue.qsize() if _queue_handler is not None else 0,
+        "dropped": _queue_handler.dropped if _queue_handler is not None else 0,
+    }
@@ -0,0 +1,83 @@
+
+import os
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+from h2_transport import H2_MAX_STREAMS, H2Session, h2_available
+from http_pool import SessionPool
+from structured_logging import get_logger
+
+# http1: aiohttp baglanti havuzu; h2: ayni origin'e giden istekler tek baglantida coklanir
+TRANSPORTS = ("http1", "h2")
+DEFAULT_TRANSPORT = os.environ.get("DOWNLOADER_TRANSPORT", "http1")
+# virgulle ayrilmis host listesi, ornek: "cdn.example.com,127.0.0.1:8443"
+TRANSPORT_H2_HOSTS = os.environ.get("DOWNLOADER_H2_HOSTS", "")
+# h2 host'larinda es zamanli indirme siniri baglanti sayisiyla degil akis sayisiyla belirlenir
+H2_HOST_LIMIT = H2_MAX_STREAMS
+
+logger = get_logger("transport")
+
+
+def host_key(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+class TransportRouter:
+    # indirme hatti istegi hangi tasimanin yapacagini host'a gore buradan sorar
+    def __init__(self, http_pool: SessionPool, default: str = DEFAULT_TRANSPORT, h2_hosts: str = TRANSPORT_H2_HOSTS):
+        self.http_pool = http_pool
+        self.default = default if default in TRANSPORTS else "http1"
+        self.host_overrides: Dict[str, str] = {}
+        self.h2: Optional[H2Session] = None
+        self.requests: Dict[str, int] = {transport: 0 for transport in TRANSPORTS}
+        for host in filter(None, (host.strip().lower() for host in h2_hosts.split(","))):
+            self.host_overrides[host] = "h2"
+
+    async def start(self):
+        await self.http_pool.start()
+        if h2_available():
+            self.h2 = H2Session(self.http_pool.session)
+        elif self.default == "h2" or "h2" in self.host_overrides.values():
+            logger.warning("h2 paketi kurulu degil, tum istekler HTTP/1.1 ile yapilacak")
+
+    async def close(self):
+        if self.h2 is not None:
+            await self.h2.close()
+            self.h2 = None
+        await self.http_pool.close()
+
+    def transport_for(self, host: str) -> str:
+        transport = self.host_overrides.get(host)
+        if transport is None:
+            # port'suz kayit o host'un tum portlarina uyar
+            transport = self.host_overrides.get(host.rsplit(":", 1)[0], self.default)
+        return transport if transport == "http1" or self.h2 is not None else "http1"
+
+    def host_limit(self, host: str) -> Optional[int]:
+        if self.transport_for(host) != "h2" or host in self.h2.http1_hosts:
+            return None
+        return H2_HOST_LIMIT
+
+    def session_for(self, url: str):
+        transport = self.transport_for(host_key(url))
+        self.requests[transport] += 1
+        return self.h2 if transport == "h2" else self.http_pool.session
+
+    def configure(self, default: Optional[str]):
+        if default is not None:
+            self.default = default
+
+    def set_host(self, host: str, transport: Optional[str]):
+        if transport is None:
+            self.host_overrides.pop(host, None)
+        else:
+            self.host_overrides[host] = transport
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "default": self.default,
+            "h2_available": h2_available(),
+            "hosts": dict(self.host_overrides),
+            "requests": dict(self.requests),
+            "h2": self.h2.stats() if self.h2 is not None else None,
+        }
@@ -1,11 +1,14 @@
 
 import asyncio
 import aiohttp
-import aiofiles
 import os
 import json
 from typing import List, Dict, Any
 
+from file_writer import BufferedFileWriter, iter_adaptive_chunks
+from http_pool import SessionPool
+from scheduler import DownloadScheduler
+
 URL_LIST = [
     {'id': 'dosya_1', 'url': 'https://jsonplaceholder.typicode.com/posts/1'},
     {'id': 'dosya_2', 'url': 'https://jsonplaceholder.typicode.com/posts/2'},
@@ -17,36 +20,39 @@ URL_LIST = [
 
 DOWNLOAD_DIR = "downloads"
 CHECK_INTERVAL_SECONDS = 10
+MAX_CONCURRENCY = 20
 
 class FileDownloader:
-    def __init__(self, download_dir: str = DOWNLOAD_DIR):
+    def __init__(self, download_dir: str = DOWNLOAD_DIR, max_concurrency: int = MAX_CONCURRENCY):
         self.download_dir = download_dir
         os.makedirs(self.download_dir, exist_ok=True)
         self.download_tasks = {}
         self.file_sizes = {}
         self.download_status = {}
+        self.http_pool = SessionPool()
+        self.scheduler = DownloadScheduler(workers=max_concurrency, per_session_limit=max_concurrency)
         
     async def download_file(self, file_id: str, url: str) -> None:
         file_path = os.path.join(self.download_dir, f"{file_id}.tmp")
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        self.file_sizes[file_id] = 0
-                        self.download_status[file_id] = "downloading"
-                        
-                        async with aiofiles.open(file_path, 'wb') as f:
-                            async for chunk in response.content.iter_chunked(8192):
-                                await f.write(chunk)
-                                self.file_sizes[file_id] = os.path.getsize(file_path)
-                        
-                        self.download_status[file_id] = "completed"
-                        print(f"[OK] {file_id} basariyla indirildi")
-                        
-                    else:
-                        self.download_status[file_id] = "failed"
-                        print(f"[ERROR] {file_id} indirilemedi - HTTP {response.status}")
+            session = await self.http_pool.start()
+            async with session.get(url) as response:
+                if response.status == 200:
+                    self.file_sizes[file_id] = 0
+                    self.download_status[file_id] = "downloading"
+                    
+                    async with BufferedFileWriter(file_path, expected_size=response.content_length or 0) as writer:
+                        async for chunk in iter_adaptive_chunks(response.content):
+                            await writer.write(chunk)
+                            self.file_sizes[file_id] = writer.bytes_written
+                    
+                    self.download_status[file_id] = "completed"
+                    print(f"[OK] {file_id} basariyla indirildi")
+                    
+                else:
+                    self.download_status[file_id] = "failed"
+                    print(f"[ERROR] {file_id} indirilemedi - HTTP {response.status}")
                         
         except Exception as e:
             self.download_status[file_id] = "failed"
@@ -55,16 +61,23 @@ class FileDownloader:
     async def start_downloads(self, url_list: List[Dict[str, str]]) -> None:
         print("Indirme islemleri baslatiliyor...")
         
-        tasks = []
-        for file_info in url_list:
-            file_id = file_info['id']
-            url = file_info['url']
+        await self.http_pool.start()
+        await self.scheduler.start()
+        try:
+            for file_info in url_list:
+                file_id = file_info['id']
+                url = file_info['url']
+                
+                job = await self.scheduler.submit(
+                    "cli", file_id, url,
+                    lambda file_id=file_id, url=url: self.download_file(file_id, url)
+                )
+                self.download_tasks[file_id] = job
             
-            task = asyncio.create_task(self.download_file(file_id, url))
-            tasks.append(task)
-            self.download_tasks[file_id] = task
-        
-        await asyncio.gather(*tasks, return_exceptions=True)
+            await self.scheduler.wait_session("cli")
+        finally:
+            await self.scheduler.stop()
+            await self.http_pool.close()
     
     def check_file_status(self) -> Dict[str, List[str]]:
         print(f"\n{CHECK_INTERVAL_SECONDS} saniye sonra durum kontrolu yapiliyor...")